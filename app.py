@@ -1,10 +1,6 @@
 import streamlit as st
 import os
 import sys
-from transformers import pipeline
-import time
-from PIL import Image
-import numpy as np
 
 # Add current directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -14,7 +10,9 @@ from components.home import render_home
 from components.history import render_history
 from components.help import render_help
 from components.about import render_about
-from src.qa_app import load_qa_pipeline, process_question
+from src.model_manager import get_model_manager
+from src.advanced_qa import get_advanced_qa
+from src.instrumentation import configure_exporters_from_env
 
 # Available models
 MODELS = {
@@ -24,6 +22,15 @@ MODELS = {
     "ELECTRA Small (Lightweight)": "google/electra-small-discriminator"
 }
 
+# Model registry shared across sessions and reruns
+model_manager = get_model_manager()
+# Load and warm up the models marked preload once, in the background
+model_manager.preload()
+# Span exporters configured through QA_TRACE_JSONL / QA_METRICS_PORT
+configure_exporters_from_env()
+# Shared across reruns so follow-up questions reuse the preprocessed document
+advanced_qa = get_advanced_qa()
+
 # Page configuration
 st.set_page_config(
     page_title="Answerly",
@@ -46,8 +53,6 @@ st.markdown("""
 # Session state initialization
 if 'page' not in st.session_state:
     st.session_state.page = 'home'
-if 'history' not in st.session_state:
-    st.session_state.history = []
 if 'current_context' not in st.session_state:
     st.session_state.current_context = None
 if 'current_question' not in st.session_state:
@@ -81,6 +86,16 @@ with st.sidebar:
         navigate_to('about')
     
     st.markdown("---")
+    
+    # Warm-up status of the preloaded models
+    readiness = model_manager.readiness()
+    if readiness["ready"]:
+        warmup_ms = sum(status.get("warmup_ms", 0) for status in readiness["models"].values())
+        st.caption(f"🟢 Models ready (warm-up {warmup_ms:.0f} ms)")
+    else:
+        states = {status.get("state", "pending") for status in readiness["models"].values()}
+        st.caption("🔴 Model warm-up failed" if "failed" in states else "🟡 Warming up models...")
+    
     st.caption("© 2025 Answerly")
 
 # Check for query parameters to update page
@@ -101,18 +116,21 @@ if st.session_state.page in ['home', 'history']:
             label_visibility="visible"
         )
         st.markdown('</div>', unsafe_allow_html=True)
+        # Warm the selected model without blocking the page
+        model_manager.load_in_background(MODELS[model_name])
+        if not model_manager.is_loaded(MODELS[model_name]):
+            st.caption("Loading model in the background...")
+        else:
+            st.caption(f"Precision: {model_manager.choose_precision(MODELS[model_name])} · Backend: {model_manager.backend}")
 else:
     st.title({
         'help': "Help & Documentation",
         'about': "About Answerly"
     }.get(st.session_state.page, "Answerly"))
 
-# Load QA pipeline
-qa_pipeline = load_qa_pipeline(MODELS[model_name]) if 'model_name' in locals() else None
-
 # Render appropriate page
 if st.session_state.page == 'home':
-    render_home(model_name, qa_pipeline)
+    render_home(model_name, MODELS[model_name], advanced_qa)
 elif st.session_state.page == 'history':
     render_history()
 elif st.session_state.page == 'help':
@@ -0,0 +1,184 @@
+"""
+Compare the accuracy and latency of a model across load precisions.
+
+Answers every question of a local eval set with the model loaded in each
+precision and reports exact match, F1, agreement with the first precision,
+latency percentiles and model size:
+
+    python benchmarks/compare_precisions.py --model bert-large-uncased-whole-word-masking-finetuned-squad \\
+        --precisions fp32,bf16,int8 --eval-set data/eval_sample.jsonl
+
+The eval set is JSONL with 'question', 'answers' and either 'context' or a
+'context_file' path relative to the repository root.
+"""
+import argparse
+import collections
+import json
+import logging
+import os
+import re
+import string
+import sys
+import time
+from typing import Dict, List, Any
+
+# Add the repository root to the path for imports
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.run_benchmarks import environment_info, latency_stats, peak_rss_mb
+from src.model_manager import ModelManager
+from src.advanced_qa import AdvancedQA
+from src.batch_qa import read_requests
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def normalize_answer(text: str) -> str:
+    """Lowercase and strip punctuation, articles and extra whitespace, as in SQuAD."""
+    text = "".join(ch for ch in text.lower() if ch not in set(string.punctuation))
+    text = re.sub(r"\b(a|an|the)\b", " ", text)
+    return " ".join(text.split())
+
+
+def exact_match(prediction: str, answers: List[str]) -> float:
+    """1.0 if the prediction matches any reference answer after normalization."""
+    return float(any(normalize_answer(prediction) == normalize_answer(answer) for answer in answers))
+
+
+def f1_score(prediction: str, answers: List[str]) -> float:
+    """Best token-overlap F1 between the prediction and any reference answer."""
+    best = 0.0
+    prediction_tokens = normalize_answer(prediction).split()
+    for answer in answers:
+        answer_tokens = normalize_answer(answer).split()
+        common = collections.Counter(prediction_tokens) & collections.Counter(answer_tokens)
+        overlap = sum(common.values())
+        if overlap == 0:
+            continue
+        precision = overlap / len(prediction_tokens)
+        recall = overlap / len(answer_tokens)
+        best = max(best, 2 * precision * recall / (precision + recall))
+    return best
+
+
+def load_eval_set(path: str) -> List[Dict[str, Any]]:
+    """Read the eval set and resolve every example's context text."""
+    examples = list(read_requests(path))
+    contexts = {}
+    for example in examples:
+        context_file = example.get("context_file")
+        if context_file:
+            if not os.path.isabs(context_file):
+                context_file = os.path.join(REPO_ROOT, context_file)
+            if context_file not in contexts:
+                with open(context_file, "r", encoding="utf-8") as f:
+                    contexts[context_file] = f.read()
+            example["context"] = contexts[context_file]
+        if isinstance(example.get("answers"), str):
+            example["answers"] = [example["answers"]]  # CSV rows hold a single answer
+    return examples
+
+
+def evaluate_precision(
+    model_name: str,
+    precision: str,
+    examples: List[Dict[str, Any]],
+    strategy: str,
+    repeats: int
+) -> Dict[str, Any]:
+    """
+    Load a model in one precision and answer the whole eval set.
+
+    Returns:
+        Dictionary of accuracy, latency and size metrics plus predictions
+    """
+    manager = ModelManager(precision=precision)
+    advanced_qa = AdvancedQA(manager)
+    model_spec = manager.resolve_model(model_name)
+
+    start = time.perf_counter()
+    manager.get_pipeline(model_spec)
+    load_seconds = time.perf_counter() - start
+
+    # Prepare the documents and warm up the kernels before timing
+    advanced_qa.process_question(
+        examples[0]["question"],
+        examples[0]["context"],
+        model_name=model_spec,
+        strategy=strategy,
+        allow_ensemble=False
+    )
+
+    timings, predictions, em, f1 = [], [], [], []
+    for example in examples:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = advanced_qa.process_question(
+                example["question"],
+                example["context"],
+                model_name=model_spec,
+                strategy=strategy,
+                allow_ensemble=False
+            )
+            timings.append(time.perf_counter() - start)
+        prediction = result["answer"] if result else ""
+        predictions.append(prediction)
+        em.append(exact_match(prediction, example["answers"]))
+        f1.append(f1_score(prediction, example["answers"]))
+
+    return {
+        "precision": precision,
+        "model": model_spec,
+        "load_ms": load_seconds * 1000,
+        "model_size_mb": manager.model_sizes_mb.get(model_spec),
+        "exact_match": 100 * sum(em) / len(em),
+        "f1": 100 * sum(f1) / len(f1),
+        **latency_stats(timings),
+        "peak_rss_mb": peak_rss_mb(),
+        "predictions": predictions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare model load precisions on a local eval set")
+    parser.add_argument("--model", type=str, default="distilbert-base-uncased-distilled-squad", help="Model identifier or local checkpoint")
+    parser.add_argument("--precisions", type=str, default="fp32,bf16,int8", help="Comma-separated precisions to compare")
+    parser.add_argument("--eval-set", type=str, default=os.path.join(REPO_ROOT, "data", "eval_sample.jsonl"), help="JSONL or CSV eval set")
+    parser.add_argument("--strategy", type=str, default="auto", help="Strategy passed to AdvancedQA")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed repetitions per question")
+    parser.add_argument("--output", type=str, default="precision_results.json", help="JSON file results are written to")
+    parser.add_argument("--verbose", action="store_true", help="Keep INFO logs from the QA modules")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger("src").setLevel(logging.WARNING)
+
+    examples = load_eval_set(args.eval_set)
+    results = []
+    for precision in [precision for precision in args.precisions.split(",") if precision]:
+        logger.info(f"Evaluating {args.model} in {precision}")
+        results.append(evaluate_precision(args.model, precision, examples, args.strategy, args.repeats))
+
+    # How often each precision gives the same answer as the first one
+    reference = results[0]["predictions"] if results else []
+    for result in results:
+        same = sum(a == b for a, b in zip(result["predictions"], reference))
+        result["agreement"] = 100 * same / len(reference) if reference else 0.0
+
+    print(f"\n{'precision':<10} {'size MB':>9} {'load ms':>9} {'EM':>6} {'F1':>6} {'agree':>6} {'p50 ms':>9} {'p90 ms':>9}")
+    for result in results:
+        print(
+            f"{result['precision']:<10} {result['model_size_mb'] or 0:>9.1f} {result['load_ms']:>9.1f} "
+            f"{result['exact_match']:>6.1f} {result['f1']:>6.1f} {result['agreement']:>6.1f} "
+            f"{result['p50_ms']:>9.1f} {result['p90_ms']:>9.1f}"
+        )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment_info(), "model": args.model, "eval_set": args.eval_set, "results": results}, f, indent=2)
+    logger.info(f"Wrote results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
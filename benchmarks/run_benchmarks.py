@@ -0,0 +1,407 @@
+"""
+Offline benchmarks for the question answering hot paths.
+
+Measures model load time, chunking and sentence splitting throughput and
+per-strategy latency on synthetic contexts of growing size, and writes the
+results as JSON so runs can be compared across commits:
+
+    python benchmarks/run_benchmarks.py --output before.json
+    python benchmarks/run_benchmarks.py --output after.json --compare before.json
+
+By default a small randomly initialized BERT checkpoint is built in a
+temporary directory, so nothing is downloaded. Pass --model with local
+checkpoint directories to benchmark real models instead.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Any, Callable, Optional
+
+# Never reach out to the Hub while benchmarking
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+import numpy as np
+import torch
+import transformers
+
+# Add the repository root to the path for imports
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from src.model_manager import ModelManager
+from src.advanced_qa import AdvancedQA
+from src.document import DocumentCache
+from src.chunking import TextIndex, chunk_spans
+from src.improved_utils import chunk_text_by_sentences, group_sentences, preprocess_text, split_sentences
+from src.utils import chunk_text
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+STRATEGIES = ["direct", "chunked", "ensemble", "cascade"]
+
+# Facts planted in the synthetic contexts so questions have real answers
+FACTS = [
+    ("The capital of {place} is {name}.", "What is the capital of {place}?"),
+    ("The river {place} was mapped by {name}.", "Who mapped the river {place}?"),
+    ("The festival of {place} is held in {name}.", "Where is the festival of {place} held?"),
+    ("The mayor of {place} is {name}.", "Who is the mayor of {place}?"),
+]
+
+
+def make_vocabulary(size: int = 2000, seed: int = 0) -> List[str]:
+    """Generate pronounceable pseudo-words for synthetic contexts."""
+    rng = random.Random(seed)
+    syllables = [c + v for c in "bdfghklmnprstvz" for v in "aeiou"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(1, 3))))
+    return sorted(words)
+
+
+def synthetic_context(num_words: int, vocabulary: List[str], seed: int = 0):
+    """
+    Build a context of roughly num_words words with facts planted in it.
+
+    Args:
+        num_words: Target number of words
+        vocabulary: Words the filler sentences are drawn from
+        seed: Random seed, so every run sees the same text
+
+    Returns:
+        Tuple of (context text, list of questions about planted facts)
+    """
+    rng = random.Random(seed)
+    sentences, questions = [], []
+    fact_every = max(1, num_words // (12 * len(FACTS)))
+    words = 0
+    while words < num_words:
+        if len(sentences) % fact_every == fact_every // 2 and len(questions) < len(FACTS):
+            template, question = FACTS[len(questions)]
+            place, name = (rng.choice(vocabulary).capitalize() for _ in range(2))
+            sentences.append(template.format(place=place, name=name))
+            questions.append(question.format(place=place))
+        else:
+            length = rng.randint(8, 24)
+            sentence = " ".join(rng.choice(vocabulary) for _ in range(length))
+            sentences.append(sentence.capitalize() + ".")
+        words += len(sentences[-1].split())
+    return " ".join(sentences), questions or [FACTS[0][1].format(place=vocabulary[0].capitalize())]
+
+
+def build_random_checkpoint(
+    directory: str,
+    vocabulary: List[str],
+    seed: int = 0,
+    hidden_size: int = 128,
+    num_layers: int = 2,
+    num_heads: int = 2
+) -> str:
+    """
+    Save a randomly initialized BERT question answering checkpoint.
+
+    Answers are meaningless, but the shapes and code paths are the same as
+    for a fine-tuned model of this size.
+
+    Returns:
+        Path of the checkpoint directory
+    """
+    os.makedirs(directory, exist_ok=True)
+    vocab_file = os.path.join(directory, "vocab.txt")
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        tokens = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + list(".,?!") + vocabulary
+        f.write("\n".join(tokens) + "\n")
+
+    tokenizer = transformers.BertTokenizerFast(vocab_file=vocab_file, do_lower_case=True, model_max_length=512)
+    config = transformers.BertConfig(
+        vocab_size=tokenizer.vocab_size,
+        hidden_size=hidden_size,
+        num_hidden_layers=num_layers,
+        num_attention_heads=num_heads,
+        intermediate_size=hidden_size * 4,
+        max_position_embeddings=512
+    )
+    torch.manual_seed(seed)
+    model = transformers.BertForQuestionAnswering(config)
+    model.save_pretrained(directory)
+    tokenizer.save_pretrained(directory)
+    return directory
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def latency_stats(seconds: List[float]) -> Dict[str, float]:
+    """Summarize a list of latencies in milliseconds."""
+    ms = np.array(seconds) * 1000
+    return {
+        "runs": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "min_ms": float(ms.min()),
+    }
+
+
+def time_call(fn: Callable, repeats: int) -> List[float]:
+    """Time repeated calls of fn, in seconds."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_model_load(model_names: List[str], repeats: int) -> List[Dict[str, Any]]:
+    """Time loading each model into a fresh ModelManager."""
+    results = []
+    for model_name in model_names:
+        timings, size_mb = [], None
+        for _ in range(repeats):
+            manager = ModelManager()
+            start = time.perf_counter()
+            manager.load_model(model_name)
+            timings.append(time.perf_counter() - start)
+            size_mb = manager.model_sizes_mb.get(manager.resolve_model(model_name))
+            manager.cleanup()
+        results.append({
+            "benchmark": "model_load",
+            "name": os.path.basename(model_name) if os.path.isdir(model_name) else model_name,
+            "first_load_ms": timings[0] * 1000,
+            **latency_stats(timings),
+            "model_size_mb": size_mb,
+            "peak_rss_mb": peak_rss_mb(),
+        })
+    return results
+
+
+def bench_chunking(contexts: Dict[int, str], repeats: int) -> List[Dict[str, Any]]:
+    """
+    Measure the throughput of every chunker on every context size.
+
+    The chunkers take raw text and include preprocessing; the splitters
+    take already preprocessed text, isolating sentence splitting and
+    grouping, which is where the chunkers differ.
+    """
+    chunkers = {
+        "chunk_text_by_sentences": chunk_text_by_sentences,
+        "chunk_spans": lambda text: chunk_spans(preprocess_text(text)),
+        "chunk_text": chunk_text,
+    }
+    splitters = {
+        "split_sentences+group": lambda text: group_sentences(split_sentences(text)),
+        "text_index": lambda text: TextIndex(text).chunk_spans(),
+    }
+    results = []
+    for size, context in contexts.items():
+        preprocessed = preprocess_text(context)
+        runs = [(name, chunker, context) for name, chunker in chunkers.items()]
+        runs += [(name, splitter, preprocessed) for name, splitter in splitters.items()]
+        for name, chunker, text in runs:
+            num_chunks = len(chunker(text))
+            timings = time_call(lambda: chunker(text), repeats)
+            results.append({
+                "benchmark": "chunking",
+                "name": name,
+                "words": size,
+                "megabytes": len(text.encode("utf-8")) / (1024 * 1024),
+                **latency_stats(timings),
+                "words_per_sec": size / float(np.median(timings)),
+                "chunks": num_chunks,
+                "peak_rss_mb": peak_rss_mb(),
+            })
+    return results
+
+
+def bench_strategies(
+    model_names: List[str],
+    contexts: Dict[int, str],
+    questions: Dict[int, List[str]],
+    strategies: List[str],
+    repeats: int,
+    max_words: int
+) -> List[Dict[str, Any]]:
+    """
+    Measure end-to-end latency of each AdvancedQA strategy.
+
+    The first question on a context pays for preparing the document and is
+    reported separately as cold_ms; the percentiles cover the follow-up
+    questions, which is what interactive use looks like.
+    """
+    manager = ModelManager()
+    advanced_qa = AdvancedQA(manager)
+    advanced_qa.ensemble_models = model_names[:2]
+    advanced_qa.cascade_models = model_names[:2]
+    model_name = model_names[0]
+    _, tokenizer = manager.load_model(model_name)
+
+    results = []
+    for size, context in contexts.items():
+        if size > max_words:
+            logger.info(f"Skipping strategies for {size} words (above --max-qa-words)")
+            continue
+        context_tokens = len(tokenizer(context, add_special_tokens=False)["input_ids"])
+        for strategy in strategies:
+            # A fresh document cache per strategy so cold_ms is really cold
+            advanced_qa.documents = DocumentCache()
+            run = lambda question: advanced_qa.process_question(question, context, model_name=model_name, strategy=strategy)
+
+            start = time.perf_counter()
+            result = run(questions[size][0])
+            cold = time.perf_counter() - start
+
+            timings = []
+            for i in range(repeats):
+                start = time.perf_counter()
+                run(questions[size][i % len(questions[size])])
+                timings.append(time.perf_counter() - start)
+
+            results.append({
+                "benchmark": "strategy",
+                "name": strategy,
+                "words": size,
+                "cold_ms": cold * 1000,
+                **latency_stats(timings),
+                "tokens_per_sec": context_tokens / float(np.median(timings)),
+                "context_tokens": context_tokens,
+                "strategy_used": (result or {}).get("strategy_used"),
+                "cascade_tier": (result or {}).get("cascade_tier"),
+                "peak_rss_mb": peak_rss_mb(),
+            })
+            logger.info(f"{strategy} on {size} words: p50 {results[-1]['p50_ms']:.1f} ms")
+    return results
+
+
+def environment_info() -> Dict[str, Any]:
+    """Describe the commit and environment the results were produced on."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "transformers": transformers.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any]):
+    """Print how every shared metric changed relative to a baseline run."""
+    def index(run):
+        return {(r["benchmark"], r["name"], r.get("words")): r for r in run["results"]}
+
+    baseline_index = index(baseline)
+    print(f"\nComparison against {baseline['environment'].get('commit')}")
+    print(f"{'benchmark':<12} {'name':<26} {'words':>9} {'metric':<16} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key, record in index(current).items():
+        old = baseline_index.get(key)
+        if old is None:
+            continue
+        for metric in ("p50_ms", "p99_ms", "cold_ms", "first_load_ms", "words_per_sec", "tokens_per_sec", "peak_rss_mb"):
+            if not old.get(metric) or record.get(metric) is None:
+                continue
+            change = (record[metric] - old[metric]) / old[metric] * 100
+            print(
+                f"{key[0]:<12} {key[1]:<26} {key[2] or '':>9} {metric:<16} "
+                f"{old[metric]:>12.2f} {record[metric]:>12.2f} {change:>+7.1f}%"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the question answering hot paths")
+    parser.add_argument("--model", action="append", help="Local checkpoint to benchmark (repeat for ensemble members); defaults to a random tiny BERT")
+    parser.add_argument("--sizes", type=str, default=",".join(str(size) for size in DEFAULT_SIZES), help="Comma-separated context sizes in words")
+    parser.add_argument("--strategies", type=str, default=",".join(STRATEGIES), help="Comma-separated strategies to time")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed repetitions per measurement")
+    parser.add_argument("--max-qa-words", type=int, default=100_000, help="Largest context run through the model")
+    parser.add_argument("--skip", type=str, default="", help="Comma-separated benchmarks to skip: model_load, chunking, strategy")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for synthetic contexts and random weights")
+    parser.add_argument("--output", type=str, default="benchmark_results.json", help="JSON file results are written to")
+    parser.add_argument("--compare", type=str, help="Earlier results JSON to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Keep INFO logs from the QA modules")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        # Per-call INFO logging would be timed along with the work itself
+        logging.getLogger("src").setLevel(logging.WARNING)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    strategies = [strategy for strategy in args.strategies.split(",") if strategy]
+    skip = set(args.skip.split(","))
+    torch.manual_seed(args.seed)
+
+    vocabulary = make_vocabulary(seed=args.seed)
+    contexts, questions = {}, {}
+    for size in sizes:
+        contexts[size], questions[size] = synthetic_context(size, vocabulary, seed=args.seed + size)
+
+    with tempfile.TemporaryDirectory(prefix="qa-bench-") as workdir:
+        model_names = args.model or [
+            build_random_checkpoint(os.path.join(workdir, f"random-bert-{i}"), vocabulary, seed=args.seed + i)
+            for i in range(2)
+        ]
+
+        results = []
+        if "model_load" not in skip:
+            logger.info("Benchmarking model load")
+            results += bench_model_load(model_names, args.repeats)
+        if "chunking" not in skip:
+            logger.info("Benchmarking chunking")
+            results += bench_chunking(contexts, args.repeats)
+        if "strategy" not in skip:
+            logger.info("Benchmarking strategies")
+            results += bench_strategies(model_names, contexts, questions, strategies, args.repeats, args.max_qa_words)
+
+    run = {
+        "environment": environment_info(),
+        "config": {
+            "models": args.model or ["random-bert"],
+            "sizes": sizes,
+            "strategies": strategies,
+            "repeats": args.repeats,
+            "max_qa_words": args.max_qa_words,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2)
+    logger.info(f"Wrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare_results(json.load(f), run)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,71 @@
+import os
 import streamlit as st
+from html import escape
+from src.history import HistoryStore, get_history_store
+
+# Entries rendered per history page
+PAGE_SIZE = 20
+
+def get_history():
+    """
+    Get the history store of this session.
+
+    Each session keeps a bounded in-memory history, unless QA_HISTORY_DB
+    points at a file that every session shares.
+    """
+    if os.environ.get("QA_HISTORY_DB"):
+        return get_history_store()
+    if not isinstance(st.session_state.get('history'), HistoryStore):
+        st.session_state.history = HistoryStore(max_entries=int(os.environ.get("QA_HISTORY_MAX_ENTRIES", 500)))
+    return st.session_state.history
+
+def _render_entry(item):
+    """Render one entry as a single HTML block instead of a group of widgets"""
+    score = item['score'] or 0
+    level = 'high' if score >= 0.8 else 'medium' if score >= 0.5 else 'low'
+    return f"""
+    <div class="history-entry">
+        <h4>Question: {escape(item['question'] or '')}</h4>
+        <p><strong>Answer:</strong> {escape(item['answer'] or '')}</p>
+        <p>
+            <span class="confidence-indicator confidence-{level}"></span>
+            Confidence: {int(score * 100)}%
+        </p>
+        <p style="font-size: 12px; color: #6c757d;">Model: {escape(item['model'] or '')} · Time: {escape(item['timestamp'] or '')}</p>
+        <hr>
+    </div>
+    """
 
 def render_history():
-    if st.session_state.history:
+    history = get_history()
+    query = st.text_input("Search questions", placeholder="Search your questions...", label_visibility="collapsed")
+    total = history.count(query)
+
+    if total:
         st.markdown("#### Previous Questions & Answers")
-        
-        for i, item in enumerate(reversed(st.session_state.history)):
-            with st.container():
-                st.subheader(f"Question: {item['question']}")
-                st.markdown(f"**Answer:** {item['answer']}")
-                
-                score_percentage = int(item['score'] * 100)
-                st.progress(item['score'])
-                st.caption(f"Confidence: {score_percentage}%")
-                
-                cols = st.columns(2)
-                cols[0].caption(f"Model: {item['model']}")
-                cols[1].caption(f"Time: {item['timestamp']}")
-                
-                st.divider()
+
+        # Start over on the first page whenever the search changes
+        if st.session_state.get('history_query') != query:
+            st.session_state.history_query = query
+            st.session_state.history_page = 0
+        pages = -(-total // PAGE_SIZE)
+        page = min(st.session_state.get('history_page', 0), pages - 1)
+
+        # Only the current page is read and rendered
+        entries = history.page(page, PAGE_SIZE, query)
+        st.markdown("".join(_render_entry(item) for item in entries), unsafe_allow_html=True)
+
+        cols = st.columns([1, 2, 1])
+        if cols[0].button("← Newer", disabled=page == 0, use_container_width=True):
+            st.session_state.history_page = page - 1
+            st.rerun()
+        cols[1].caption(f"Page {page + 1} of {pages} · {total} entries")
+        if cols[2].button("Older →", disabled=page >= pages - 1, use_container_width=True):
+            st.session_state.history_page = page + 1
+            st.rerun()
+    elif query:
+        st.info("No questions match your search.")
     else:
         st.info("You haven't asked any questions yet.")
         if st.button("Go to Home", use_container_width=False):
-            st.session_state.page = 'home' 
\ No newline at end of file
+            st.session_state.page = 'home'
@@ -1,15 +1,24 @@
 import streamlit as st
 import time
-from .utils import process_context, display_results
+from .utils import process_context, display_results, display_batch_results
+from src.ingest import iter_chunks
 
-def render_home(model_name, qa_pipeline):
+def render_home(model_name, model_id, advanced_qa):
     # Question input with modern styling
     st.markdown('<div class="search-container">', unsafe_allow_html=True)
-    question = st.text_input(
-        "Ask a question", 
-        placeholder="Type your question here...",
-        label_visibility="collapsed"
-    )
+    multiple = st.toggle("Ask several questions at once")
+    if multiple:
+        question = st.text_area(
+            "Ask questions",
+            placeholder="One question per line...",
+            label_visibility="collapsed"
+        )
+    else:
+        question = st.text_input(
+            "Ask a question", 
+            placeholder="Type your question here...",
+            label_visibility="collapsed"
+        )
     st.markdown('</div>', unsafe_allow_html=True)
     
     # Main content
@@ -20,24 +29,68 @@ def render_home(model_name, qa_pipeline):
         
         # Process button
         process_button = st.button("Find Answer", type="primary", use_container_width=False)
+        
+        # Optional profiler capture for this request
+        profile = st.selectbox(
+            "Profile request",
+            [None, "cprofile", "torch"],
+            format_func=lambda option: "Off" if option is None else option
+        )
     
     with col2:
         # Results display
         if question and context and process_button:
-            # Store question in session state
-            st.session_state.current_question = question
-            
             # Show loading spinner
             with st.spinner("Finding your answer..."):
                 # Create placeholder for animated loading
                 results_placeholder = st.empty()
                 
-                # Process the question
-                result = qa_pipeline(question, context)
+                questions = [line.strip() for line in question.splitlines() if line.strip()] if multiple else [question]
+                if len(questions) > 1:
+                    if isinstance(context, str):
+                        # Answer every question in shared forward passes
+                        batch = advanced_qa.process_questions(questions, context, model_name=model_id, profile=profile)
+                        display_batch_results(batch, questions, context, model_name, advanced_qa.documents.get(context))
+                    else:
+                        # Streamed uploads are read once per question
+                        for current in questions:
+                            st.session_state.current_question = current
+                            context.seek(0)
+                            result = advanced_qa.process_stream(current, iter_chunks(context), model_name=model_id)
+                            st.markdown(f"**{current}**")
+                            if result:
+                                display_results(st.empty(), result, result["context_chunk"], model_name)
+                            else:
+                                st.caption("No answer found.")
+                    return
+                # Store question in session state
+                question = questions[0]
+                st.session_state.current_question = question
+                
+                if isinstance(context, str):
+                    # Let the strategy engine pick direct or batched chunked
+                    # execution based on the document size
+                    result = advanced_qa.process_question(
+                        question,
+                        context,
+                        model_name=model_id,
+                        strategy="auto",
+                        allow_ensemble=False,
+                        profile=profile
+                    )
+                    source_text = context
+                    document = advanced_qa.documents.get(context)
+                else:
+                    # Large upload: stream chunks from the file
+                    context.seek(0)
+                    result = advanced_qa.process_stream(question, iter_chunks(context), model_name=model_id, profile=profile)
+                    # Offsets of streamed answers are relative to their chunk
+                    source_text = result["context_chunk"] if result else None
+                    document = None
                 
                 # Display results
                 if result:
-                    display_results(results_placeholder, result, context, model_name)
+                    display_results(results_placeholder, result, source_text, model_name, document)
                 else:
                     results_placeholder.error("No answer found. Try reformulating your question.")
         else:
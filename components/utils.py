@@ -1,8 +1,18 @@
 import streamlit as st
 import time
+from html import escape
+from .history import get_history
+
+# Uploads above this size are streamed instead of decoded into one string
+STREAMING_THRESHOLD_BYTES = 5 * 1024 * 1024
 
 def process_context():
-    """Process and return the context based on user selection"""
+    """
+    Process and return the context based on user selection.
+    
+    Large uploads are returned as the uploaded file itself so they can be
+    streamed chunk by chunk instead of decoded in memory.
+    """
     st.markdown("#### Context Source")
     st.markdown('<div class="stRadio">', unsafe_allow_html=True)
     context_source = st.radio(
@@ -28,6 +38,14 @@ def process_context():
         </div>
         """, unsafe_allow_html=True)
         uploaded_file = st.file_uploader("Upload a text file", type=['txt'], label_visibility="collapsed")
+        if uploaded_file and uploaded_file.size > STREAMING_THRESHOLD_BYTES:
+            uploaded_file.seek(0)
+            preview = uploaded_file.read(2048).decode("utf-8", errors="ignore")
+            uploaded_file.seek(0)
+            st.caption(f"Large file ({uploaded_file.size / (1024 * 1024):.0f}MB), it will be processed in a stream")
+            with st.expander("Context Preview"):
+                st.text(preview[:500] + "...")
+            return uploaded_file
         if uploaded_file:
             context = uploaded_file.getvalue().decode("utf-8")
             with st.expander("Context Preview"):
@@ -47,25 +65,37 @@ def process_context():
     
     return None
 
-def display_results(placeholder, result, context, model_name):
-    """Display the QA results in a formatted way"""
-    # Get context window around answer
-    answer_start = max(0, result.get('start', 0) - 100)
-    answer_end = min(len(context), result.get('end', 0) + 100)
+def highlight_answer(result, context, document=None):
+    """
+    Get the context around an answer with exactly the answer's span highlighted.
+    
+    With the answer's Document, the window is widened to whole sentences
+    through its boundary index; otherwise 100 characters on either side
+    are shown.
+    """
+    start, end = result.get('start', 0), result.get('end', 0)
     
-    if answer_start > 0:
-        context_snippet = "..." + context[answer_start:answer_end]
+    # Get context window around answer
+    if document is not None:
+        window_start, window_end = document.context_window(start, end)
     else:
-        context_snippet = context[answer_start:answer_end]
-        
-    if answer_end < len(context):
-        context_snippet += "..."
+        window_start, window_end = max(0, start - 100), min(len(context), end + 100)
     
-    # Highlight the answer in context
-    highlighted_context = context_snippet.replace(
-        result['answer'],
-        f"<span class='answer-highlight'>{result['answer']}</span>"
+    # Highlight the answer's own span, not every occurrence of its text
+    context_snippet = (
+        escape(context[window_start:start])
+        + f"<span class='answer-highlight'>{escape(context[start:end])}</span>"
+        + escape(context[end:window_end])
     )
+    if window_start > 0:
+        context_snippet = "..." + context_snippet
+    if window_end < len(context):
+        context_snippet += "..."
+    return context_snippet
+
+def display_results(placeholder, result, context, model_name, document=None):
+    """Display the QA results in a formatted way"""
+    highlighted_context = highlight_answer(result, context, document)
     
     # Display model info and confidence
     st.markdown(
@@ -77,7 +107,8 @@ def display_results(placeholder, result, context, model_name):
                 <span class="confidence-indicator confidence-{'high' if result['score'] >= 0.8 else 'medium' if result['score'] >= 0.5 else 'low'}"></span>
                 {int(result['score']*100)}%
             </div>
-            <div><strong>Time:</strong> {result.get('processing_time', 0.5):.1f}s</div>
+            <div><strong>Time:</strong> {result['processing_time']:.2f}s</div>
+            <div><strong>Strategy:</strong> {result.get('strategy_used', 'direct')}</div>
         </div>
         """,
         unsafe_allow_html=True
@@ -94,11 +125,74 @@ def display_results(placeholder, result, context, model_name):
         unsafe_allow_html=True
     )
     
+    # Show where the time went
+    if result.get('timings'):
+        with st.expander("Timing breakdown"):
+            st.table({
+                "Stage": list(result['timings']),
+                "Time (ms)": [f"{ms:.1f}" for ms in result['timings'].values()]
+            })
+            if result.get('profile'):
+                st.code(result['profile'], language=None)
+    
     # Add to history
-    st.session_state.history.append({
+    get_history().add({
         "question": st.session_state.current_question,
         "answer": result['answer'],
         "score": result['score'],
         "model": model_name,
+        "strategy": result.get('strategy_used'),
+        "processing_time": result['processing_time'],
         "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-    }) 
\ No newline at end of file
+    }) 
+
+def display_batch_results(batch, questions, context, model_name, document=None):
+    """Display the answers to several questions about one context"""
+    answered = [result for result in batch['results'] if result]
+    st.markdown(
+        f"""
+        <div class="results-header">
+            <div><strong>Model:</strong> {model_name}</div>
+            <div><strong>Answered:</strong> {len(answered)} of {len(questions)}</div>
+            <div><strong>Time:</strong> {batch['processing_time']:.2f}s</div>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+    
+    for question, result in zip(questions, batch['results']):
+        if not result:
+            st.markdown(f"**{question}**")
+            st.caption("No answer found.")
+            continue
+        st.markdown(f"**{question}**")
+        st.markdown(
+            f"<div class='results-answer'>{result['answer']} "
+            f"<span style='font-size: 12px; color: #6c757d;'>{int(result['score']*100)}%</span></div>",
+            unsafe_allow_html=True
+        )
+        with st.expander("Source"):
+            st.markdown(
+                f"<div class='results-source'>{highlight_answer(result, context, document)}</div>",
+                unsafe_allow_html=True
+            )
+        
+        get_history().add({
+            "question": question,
+            "answer": result['answer'],
+            "score": result['score'],
+            "model": model_name,
+            "strategy": result.get('strategy_used'),
+            "processing_time": result['processing_time'],
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        })
+    
+    # The questions share one trace, so there is one breakdown for all of them
+    if batch.get('timings'):
+        with st.expander("Timing breakdown"):
+            st.table({
+                "Stage": list(batch['timings']),
+                "Time (ms)": [f"{ms:.1f}" for ms in batch['timings'].values()]
+            })
+            if batch.get('profile'):
+                st.code(batch['profile'], language=None)
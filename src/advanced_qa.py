@@ -1,7 +1,21 @@
 import logging
-from typing import Dict, List, Any, Optional, Union
+import os
+import threading
+from typing import Dict, List, Any, Optional, Union, Iterable
 import time
-from improved_utils import chunk_text_by_sentences, rank_answers
+import contextvars
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+from src.answer_cache import get_answer_cache
+from src.improved_utils import rank_answers
+from src.span_decoding import log_partition
+from src.chunk_engine import BatchedChunkEngine
+from src.document import DocumentCache, TokenChunks
+from src.instrumentation import span, trace_request
+from src.model_manager import get_model_manager
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -10,16 +24,78 @@ logger = logging.getLogger(__name__)
 class AdvancedQA:
     """Advanced question answering with multiple strategies for improved results."""
     
-    def __init__(self, model_manager):
-        """Initialize with a model manager instance."""
+    # Models run side by side by the ensemble strategy
+    ensemble_models = [
+        "google/electra-small-discriminator",  # Small, fast model
+        "deepset/roberta-base-squad2"  # More accurate model for verification
+    ]
+    
+    # Models tried in order by the cascade strategy, cheapest first. None
+    # starts with the requested model and escalates through the model
+    # manager's cascade models, see ModelManager.get_cascade_models
+    cascade_models = None
+    
+    # Question lengths are rounded up to this many tokens when sizing token
+    # chunks, so questions of similar length share the same chunks
+    question_length_bucket = 16
+    
+    def __init__(
+        self,
+        model_manager,
+        batch_size: int = 8,
+        max_seq_len: int = 384,
+        ensemble_timeout: float = 30.0,
+        answer_cache=None,
+        retrieval_top_k: Optional[int] = None,
+        token_chunking: bool = True,
+        chunk_stride: int = 64,
+        cascade_threshold: float = 0.5,
+        cascade_margin: float = 0.1,
+        cascade_chunks: Optional[int] = 3
+    ):
+        """
+        Initialize with a model manager instance.
+        
+        Args:
+            model_manager: ModelManager used to load models
+            batch_size: Number of chunk windows per forward pass
+            max_seq_len: Maximum tokens per window in chunked inference
+            ensemble_timeout: Seconds to wait for ensemble members
+            answer_cache: Optional AnswerCache consulted before answering
+            retrieval_top_k: If set, only the k chunks that score best
+                against the question with BM25 are read by the model
+            token_chunking: Pack chunks to the model's token budget instead
+                of a fixed number of words when the tokenizer is fast
+            chunk_stride: Tokens shared by consecutive token chunks
+            cascade_threshold: The cascade escalates to the next model when
+                the best score is below this
+            cascade_margin: The cascade also escalates when the two best
+                answers differ and their scores are closer than this
+            cascade_chunks: Number of best-scoring chunks the next cascade
+                model reads, None to read the whole context again
+        """
         self.model_manager = model_manager
+        self.batch_size = batch_size
+        self.max_seq_len = max_seq_len
+        self.ensemble_timeout = ensemble_timeout
+        self.answer_cache = answer_cache
+        self.retrieval_top_k = retrieval_top_k
+        self.token_chunking = token_chunking
+        self.chunk_stride = chunk_stride
+        self.cascade_threshold = cascade_threshold
+        self.cascade_margin = cascade_margin
+        self.cascade_chunks = cascade_chunks
+        # Preprocessed and tokenized contexts, reused by follow-up questions
+        self.documents = DocumentCache()
     
     def process_question(
         self, 
         question: str, 
         context: str, 
         model_name: str = "distilbert-base-uncased-distilled-squad",
-        strategy: str = "auto"
+        strategy: str = "auto",
+        allow_ensemble: bool = True,
+        profile: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Process a question with advanced strategies.
@@ -28,16 +104,56 @@ class AdvancedQA:
             question: The question to answer
             context: The context to search for answers
             model_name: Name of the model to use
-            strategy: Strategy to use ('auto', 'direct', 'chunked', 'ensemble')
+            strategy: Strategy to use ('auto', 'direct', 'chunked', 'ensemble',
+                'cascade')
+            allow_ensemble: Whether 'auto' may pick the ensemble strategy,
+                which uses its own models instead of model_name
+            profile: 'cprofile' or 'torch' to capture a profile of this
+                request in the result's 'profile' field
             
         Returns:
-            Dictionary with answer and metadata
+            Dictionary with answer and metadata, including a per-stage
+            'timings' breakdown in milliseconds
         """
+        with trace_request("process_question", profile=profile, model=model_name) as trace:
+            result = self._process_question(question, context, model_name, strategy, allow_ensemble)
+        
+        if result:
+            result["timings"] = trace.breakdown()
+            result["trace_id"] = trace.trace_id
+            if trace.profile:
+                result["profile"] = trace.profile
+        return result
+    
+    def _process_question(
+        self,
+        question: str,
+        context: str,
+        model_name: str,
+        strategy: str,
+        allow_ensemble: bool
+    ) -> Dict[str, Any]:
+        """Resolve the strategy, consult the answer cache and run the strategy."""
         start_time = time.time()
         
         # Determine best strategy if set to auto
         if strategy == "auto":
             strategy = self._determine_strategy(question, context)
+            if strategy == "ensemble" and not allow_ensemble:
+                strategy = "chunked"
+        
+        # Serve repeated questions from the answer cache
+        cache_key = None
+        if self.answer_cache is not None:
+            with span("cache_lookup"):
+                cache_key = self.answer_cache.make_key(
+                    self.model_manager.answer_cache_model(model_name), self._cache_strategy(strategy, model_name), question, context
+                )
+                cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                cached["processing_time"] = time.time() - start_time
+                cached["cache_hit"] = True
+                return cached
         
         # Apply the selected strategy
         if strategy == "direct":
@@ -46,6 +162,8 @@ class AdvancedQA:
             result = self._chunked_qa(question, context, model_name)
         elif strategy == "ensemble":
             result = self._ensemble_qa(question, context)
+        elif strategy == "cascade":
+            result = self._cascade_qa(question, context, model_name)
         else:
             logger.warning(f"Unknown strategy '{strategy}', falling back to direct")
             result = self._direct_qa(question, context, model_name)
@@ -54,10 +172,244 @@ class AdvancedQA:
         if result:
             result["processing_time"] = time.time() - start_time
             result["strategy_used"] = strategy
+            result.setdefault("model_used", model_name)
+            if cache_key is not None:
+                self.answer_cache.put(cache_key, result)
+        
+        return result
+    
+    def process_questions(
+        self,
+        questions: List[str],
+        context: str,
+        model_name: str = "distilbert-base-uncased-distilled-squad",
+        max_words: int = 300,
+        overlap: int = 50,
+        profile: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Answer several questions about one context in shared forward passes.
+        
+        The context is prepared and tokenized once, and the windows of every
+        (question, chunk) pair are packed into the same padded batches, so
+        a checklist of questions costs a few large forward passes instead
+        of one pass per question and chunk. Answers match the chunked
+        strategy and share its answer cache entries.
+        
+        Args:
+            questions: The questions to answer
+            context: The context all questions are about
+            model_name: Name of the model to use
+            max_words: Maximum words per chunk, when word chunks are used
+            overlap: Word overlap between chunks, when word chunks are used
+            profile: 'cprofile' or 'torch' to capture a profile of the
+                whole batch in the 'profile' field
+            
+        Returns:
+            Dictionary with 'results', the best answer dictionary (or None)
+            of every question in order, and the 'processing_time', 'timings'
+            and 'trace_id' the questions share
+        """
+        start_time = time.time()
+        with trace_request("process_questions", profile=profile, model=model_name, questions=len(questions)) as trace:
+            results = self._process_questions(questions, context, model_name, max_words, overlap)
+        
+        processing_time = time.time() - start_time
+        for result in results:
+            if result is not None:
+                result["processing_time"] = processing_time
+        batch = {
+            "results": results,
+            "processing_time": processing_time,
+            "timings": trace.breakdown(),
+            "trace_id": trace.trace_id
+        }
+        if trace.profile:
+            batch["profile"] = trace.profile
+        return batch
+    
+    def _process_questions(
+        self,
+        questions: List[str],
+        context: str,
+        model_name: str,
+        max_words: int,
+        overlap: int
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Answer the questions that are not cached in one answer_batch call."""
+        results = [None] * len(questions)
+        cache_strategy = self._cache_strategy("chunked")
+        cache_model = self.model_manager.answer_cache_model(model_name) if self.answer_cache is not None else None
+        
+        # Serve cached questions, and answer repeated questions once
+        pending = {}
+        for index, question in enumerate(questions):
+            if self.answer_cache is not None and question not in pending:
+                with span("cache_lookup"):
+                    cached = self.answer_cache.get(self.answer_cache.make_key(cache_model, cache_strategy, question, context))
+                if cached is not None:
+                    cached["cache_hit"] = True
+                    results[index] = cached
+                    continue
+            pending.setdefault(question, []).append(index)
+        if not pending:
+            return results
+        logger.info(f"Answering {len(pending)} questions about one context with model {model_name}")
+        
+        try:
+            document = self.documents.get(context)
+            engine = self.make_engine(model_name)
+            if engine is None:
+                # Slow tokenizers can't share windows, answer one question at a time
+                answers = [self._answer_chunks(question, document, model_name, max_words, overlap) for question in pending]
+            else:
+                requests, layouts = [], []
+                for question in pending:
+                    chunks, encoded, token_chunks = self._chunk_layout(question, document, model_name, engine, max_words, overlap)
+                    selected = self._select_chunks(question, document, len(chunks), token_chunks, max_words, overlap)
+                    requests.append((question, [chunks[idx] for idx in selected], [encoded[idx] for idx in selected]))
+                    layouts.append((selected, token_chunks))
+                
+                # Windows of all questions go through the model together
+                answers = engine.answer_batch(requests)
+                for chunk_results, (selected, token_chunks) in zip(answers, layouts):
+                    # Point chunk_index back at the full chunk list
+                    for chunk_result in chunk_results:
+                        chunk_result["chunk_index"] = selected[chunk_result["chunk_index"]]
+                    document.map_to_context(chunk_results, max_words, overlap, token_chunks)
+        except Exception as e:
+            logger.error(f"Error in multi-question QA: {e}")
+            return results
+        
+        for (question, indexes), chunk_results in zip(pending.items(), answers):
+            with span("ranking"):
+                ranked_results = rank_answers(chunk_results)
+            if not ranked_results:
+                continue
+            best_result = ranked_results[0]
+            best_result["alternate_answers"] = [
+                result["answer"] for result in ranked_results[1:]
+                if result["answer"] != best_result["answer"]
+            ]
+            best_result["strategy_used"] = "chunked"
+            best_result["model_used"] = model_name
+            if self.answer_cache is not None:
+                self.answer_cache.put(self.answer_cache.make_key(cache_model, cache_strategy, question, context), best_result)
+            for index in indexes:
+                results[index] = dict(best_result)
+        return results
+    
+    def process_stream(
+        self,
+        question: str,
+        chunks: Iterable[str],
+        model_name: str = "distilbert-base-uncased-distilled-squad",
+        window_chunks: int = 64,
+        profile: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Answer a question over chunks that are produced lazily.
+        
+        Chunks are pulled window_chunks at a time, e.g. from
+        src.ingest.iter_chunks, so only one window of chunks and the running
+        best answers are held in memory.
+        
+        Args:
+            question: The question to answer
+            chunks: Iterable of context chunks in document order
+            model_name: Name of the model to use
+            window_chunks: Number of chunks read and answered per step
+            profile: 'cprofile' or 'torch' to capture a profile of this
+                request in the result's 'profile' field
+            
+        Returns:
+            Best answer dictionary. Its start/end offsets are relative to
+            the 'context_chunk' it was found in.
+        """
+        with trace_request("process_stream", profile=profile, model=model_name) as trace:
+            result = self._process_stream(question, chunks, model_name, window_chunks)
+        
+        if result:
+            result["timings"] = trace.breakdown()
+            result["trace_id"] = trace.trace_id
+            if trace.profile:
+                result["profile"] = trace.profile
+        return result
+    
+    def _process_stream(
+        self,
+        question: str,
+        chunks: Iterable[str],
+        model_name: str,
+        window_chunks: int
+    ) -> Dict[str, Any]:
+        """Answer windows of chunks as they are read, keeping the running best."""
+        start_time = time.time()
+        logger.info(f"Using streamed QA approach with model {model_name}")
+        
+        try:
+            engine = self.make_engine(model_name)
+            
+            chunks = iter(chunks)
+            best_results = []
+            partition = None
+            chunk_offset = 0
+            while True:
+                with span("read_chunks"):
+                    window = list(islice(chunks, window_chunks))
+                if not window:
+                    break
+                
+                if engine is not None:
+                    window_results = engine.answer(question, window)
+                else:
+                    window_results = []
+                    for idx, chunk in enumerate(window):
+                        chunk_result = self._run_pipeline(model_name, question, chunk)
+                        chunk_result["chunk_index"] = idx
+                        window_results.append(chunk_result)
+                
+                for chunk_result in window_results:
+                    chunk_result["context_chunk"] = window[chunk_result["chunk_index"]]
+                    chunk_result["chunk_index"] += chunk_offset
+                chunk_offset += len(window)
+                
+                # Keep only the running best answers, scored against every chunk read so far
+                window_partition = log_partition(window_results)
+                if window_partition is not None:
+                    partition = window_partition if partition is None else tuple(np.logaddexp(partition, window_partition).tolist())
+                with span("ranking"):
+                    best_results = rank_answers(best_results + window_results, partition=partition, chunk_relative=True)
+        except Exception as e:
+            logger.error(f"Error in streamed QA: {e}")
+            return None
+        
+        logger.info(f"Streamed {chunk_offset} chunks")
+        result = best_results[0] if best_results else None
+        if result:
+            result["processing_time"] = time.time() - start_time
+            result["strategy_used"] = "streamed"
             result["model_used"] = model_name
+            result["chunks_processed"] = chunk_offset
         
         return result
     
+    def _cache_strategy(self, strategy: str, model_name: Optional[str] = None) -> str:
+        """
+        Describe a strategy and the settings its answers depend on, for cache keys.
+        
+        Changing the retrieval or cascade settings then misses the cache
+        instead of serving answers computed with the old ones.
+        """
+        if self.retrieval_top_k:
+            strategy = f"{strategy}-top{self.retrieval_top_k}"
+        if strategy.startswith("cascade"):
+            strategy += (
+                f"-{'+'.join(self._cascade_tiers(model_name))}"
+                f"-t{self.cascade_threshold}-m{self.cascade_margin}-c{self.cascade_chunks}"
+            )
+        return strategy
+    
     def _determine_strategy(self, question: str, context: str) -> str:
         """
         Automatically determine the best strategy based on question and context.
@@ -103,9 +455,16 @@ class AdvancedQA:
         logger.info(f"Using direct QA approach with model {model_name}")
         
         try:
-            qa_pipeline = self.model_manager.get_pipeline(model_name)
-            result = qa_pipeline(question=question, context=context)
-            return result
+            if self.model_manager.worker_pool is not None:
+                # The engine reproduces the pipeline's answers over the whole context
+                engine = self.make_engine(model_name)
+                if engine is not None:
+                    results = engine.answer(question, [context])
+                    if results:
+                        results[0].pop("chunk_index")
+                        return results[0]
+                    return None
+            return self._run_pipeline(model_name, question, context)
         except Exception as e:
             logger.error(f"Error in direct QA: {e}")
             return None
@@ -129,33 +488,212 @@ class AdvancedQA:
             overlap: Word overlap between chunks
             
         Returns:
-            Best answer dictionary
+            Best answer dictionary, with the other ranked answers in
+            'alternate_answers'
         """
         logger.info(f"Using chunked QA approach with model {model_name}")
         
         try:
             # Split text into chunks by sentence boundaries with overlap
-            chunks = chunk_text_by_sentences(context, max_words, overlap)
-            logger.info(f"Split context into {len(chunks)} chunks")
-            
-            qa_pipeline = self.model_manager.get_pipeline(model_name)
-            
-            # Process each chunk
-            all_results = []
-            for idx, chunk in enumerate(chunks):
-                chunk_result = qa_pipeline(question=question, context=chunk)
-                chunk_result["chunk_index"] = idx
-                all_results.append(chunk_result)
+            document = self.documents.get(context)
+            all_results = self._answer_chunks(question, document, model_name, max_words, overlap)
             
             # Find best result
-            ranked_results = rank_answers(all_results)
-            best_result = ranked_results[0] if ranked_results else None
+            with span("ranking"):
+                ranked_results = rank_answers(all_results)
+            if not ranked_results:
+                return None
+            best_result = ranked_results[0]
             
+            # Include alternate answers
+            best_result["alternate_answers"] = [
+                result["answer"] for result in ranked_results[1:]
+                if result["answer"] != best_result["answer"]
+            ]
             return best_result
         except Exception as e:
             logger.error(f"Error in chunked QA: {e}")
             return None
     
+    def _answer_chunks(
+        self,
+        question: str,
+        document,
+        model_name: str,
+        max_words: int = 300,
+        overlap: int = 50,
+        selected: Optional[List[int]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Find the best answer in every chunk of a document with one model.
+        
+        Args:
+            question: The question to answer
+            document: Document holding the memoized chunks
+            model_name: Model to use
+            max_words: Maximum words per chunk, when word chunks are used
+            overlap: Word overlap between chunks, when word chunks are used
+            selected: Indexes of the only chunks to read, instead of all
+                chunks or those chosen by retrieval
+            
+        Returns:
+            One answer dictionary per chunk, with offsets into the raw context
+        """
+        engine = self.make_engine(model_name)
+        chunks, encoded, token_chunks = self._chunk_layout(question, document, model_name, engine, max_words, overlap)
+        logger.info(f"Split context into {len(chunks)} chunks")
+        if selected is None:
+            selected = self._select_chunks(question, document, len(chunks), token_chunks, max_words, overlap)
+        
+        if engine is not None:
+            # Run the chunks through the model in padded batches
+            all_results = engine.answer(
+                question,
+                [chunks[idx] for idx in selected],
+                [encoded[idx] for idx in selected]
+            )
+        else:
+            # Slow tokenizers have no offset mapping, use the pipeline per chunk
+            all_results = []
+            for position, idx in enumerate(selected):
+                chunk_result = self._run_pipeline(model_name, question, chunks[idx])
+                chunk_result["chunk_index"] = position
+                all_results.append(chunk_result)
+        
+        # Point chunk_index back at the full chunk list
+        for chunk_result in all_results:
+            chunk_result["chunk_index"] = selected[chunk_result["chunk_index"]]
+        document.map_to_context(all_results, max_words, overlap, token_chunks)
+        return all_results
+    
+    def _select_chunks(
+        self,
+        question: str,
+        document,
+        num_chunks: int,
+        token_chunks: Optional[TokenChunks],
+        max_words: int = 300,
+        overlap: int = 50
+    ) -> List[int]:
+        """Indexes of the chunks to read, the BM25 top k when retrieval is enabled."""
+        if not self.retrieval_top_k:
+            return list(range(num_chunks))
+        # Read only the chunks that match the question lexically
+        index = document.bm25_index(max_words, overlap, token_chunks)
+        with span("retrieval"):
+            selected = index.top_k(question, self.retrieval_top_k)
+        if selected is None:
+            return list(range(num_chunks))
+        logger.info(f"Retrieval selected chunks {selected} of {num_chunks}")
+        return selected
+    
+    def _chunk_layout(
+        self,
+        question: str,
+        document,
+        model_name: str,
+        engine: Optional[BatchedChunkEngine],
+        max_words: int = 300,
+        overlap: int = 50
+    ) -> tuple:
+        """
+        Get the chunks one model reads for a question.
+        
+        Returns:
+            Tuple of (chunks, encodings or None, token chunks or None when
+            word chunks are used)
+        """
+        token_chunks = self.token_chunks_for(question, document, model_name, engine)
+        if token_chunks is not None:
+            return token_chunks.chunks, token_chunks.encoded, token_chunks
+        chunks = document.chunks(max_words, overlap)
+        # Reuse the document's tokenized chunks for this model
+        encoded = document.encoded_chunks(model_name, engine, max_words, overlap) if engine is not None else None
+        return chunks, encoded, None
+    
+    def _chunk_spans(
+        self,
+        question: str,
+        document,
+        model_name: str,
+        max_words: int = 300,
+        overlap: int = 50
+    ) -> np.ndarray:
+        """Character spans in the preprocessed text of the chunks one model reads."""
+        engine = self.make_engine(model_name)
+        chunks, _, token_chunks = self._chunk_layout(question, document, model_name, engine, max_words, overlap)
+        if token_chunks is None:
+            return document.chunk_spans(max_words, overlap)
+        starts = np.array(token_chunks.starts, dtype=np.int64)
+        return np.stack([starts, starts + np.array([len(chunk) for chunk in chunks], dtype=np.int64)], axis=1)
+    
+    def token_chunks_for(
+        self,
+        question: str,
+        document,
+        model_name: str,
+        engine: Optional[BatchedChunkEngine]
+    ) -> Optional[TokenChunks]:
+        """
+        Get the token chunks of a document that fit one window next to a question.
+        
+        Args:
+            question: The question to answer
+            document: Document to chunk
+            model_name: Model the engine runs
+            engine: The model's engine, None for slow tokenizers
+            
+        Returns:
+            The token chunks, or None if word chunks have to be used
+        """
+        if engine is None or not self.token_chunking:
+            return None
+        question_length = engine.question_length(question)
+        bucketed = -(-question_length // self.question_length_bucket) * self.question_length_bucket
+        max_tokens = engine.context_capacity(bucketed)
+        if max_tokens <= 0:
+            max_tokens = engine.context_capacity(question_length)
+        if max_tokens <= 0:
+            return None  # The question alone fills the window
+        return document.token_chunks(model_name, engine, max_tokens, self.chunk_stride)
+    
+    def _answer_member(self, question: str, document, model_name: str) -> List[Dict[str, Any]]:
+        """Run one ensemble member over the document's chunks."""
+        with span("ensemble_member", model=model_name):
+            return self._answer_chunks(question, document, model_name)
+    
+    def make_engine(self, model_name: str) -> Optional[BatchedChunkEngine]:
+        """
+        Build a batched chunk engine for a model.
+        
+        Returns:
+            The engine, or None if the model's tokenizer is not a fast
+            tokenizer and the pipeline has to be used instead
+        """
+        if self.model_manager.worker_pool is not None:
+            # Tokenize here, run the forward passes in the worker processes
+            engine = self.model_manager.worker_pool.engine(model_name, self.batch_size, self.max_seq_len)
+            if engine is not None:
+                return engine
+        model, tokenizer = self.model_manager.load_model(model_name)
+        if not getattr(tokenizer, "is_fast", False):
+            return None
+        return BatchedChunkEngine(
+            model,
+            tokenizer,
+            device=self.model_manager.device,
+            batch_size=self.batch_size,
+            max_seq_len=self.max_seq_len,
+            tokenizer_lock=self.model_manager.tokenizer_lock(model_name)
+        )
+    
+    def _run_pipeline(self, model_name: str, question: str, context: str) -> Dict[str, Any]:
+        """Run the model's cached pipeline on one context."""
+        qa_pipeline = self.model_manager.get_pipeline(model_name)
+        # The pipeline reconfigures the shared tokenizer on every call
+        with span("pipeline", model=model_name), self.model_manager.tokenizer_lock(model_name):
+            return qa_pipeline(question=question, context=context)
+    
     def _ensemble_qa(
         self, 
         question: str, 
@@ -164,6 +702,10 @@ class AdvancedQA:
         """
         Ensemble approach using multiple models and strategies.
         
+        The context is preprocessed once and every member model runs over
+        its chunks of the shared document concurrently. Members that miss
+        the deadline are left out of the vote.
+        
         Args:
             question: The question to answer
             context: The context text
@@ -174,31 +716,48 @@ class AdvancedQA:
         logger.info("Using ensemble QA approach with multiple models")
         
         try:
-            # Use different models
-            model_results = []
+            document = self.documents.get(context)
+            logger.info(f"Running {len(self.ensemble_models)} ensemble models")
             
-            # Small, fast model with chunking for initial pass
-            electra_result = self._chunked_qa(
-                question, 
-                context, 
-                "google/electra-small-discriminator"
+            executor = ThreadPoolExecutor(
+                max_workers=len(self.ensemble_models),
+                thread_name_prefix="ensemble"
             )
-            if electra_result:
-                model_results.append(electra_result)
+            # Each member runs in a copy of this context so its spans join the trace
+            futures = {
+                executor.submit(
+                    contextvars.copy_context().run,
+                    self._answer_member,
+                    question,
+                    document,
+                    model_name
+                ): model_name
+                for model_name in self.ensemble_models
+            }
+            done, not_done = wait(futures, timeout=self.ensemble_timeout)
+            # Don't block on members that missed the deadline
+            executor.shutdown(wait=False, cancel_futures=True)
+            for future in not_done:
+                logger.warning(f"Ensemble member {futures[future]} timed out after {self.ensemble_timeout}s")
             
-            # More accurate model for verification
-            roberta_result = self._chunked_qa(
-                question,
-                context,
-                "deepset/roberta-base-squad2"
-            )
-            if roberta_result:
-                model_results.append(roberta_result)
+            # Best answer of each member that finished in time
+            model_results = []
+            for future in done:
+                model_name = futures[future]
+                try:
+                    ranked_chunks = rank_answers(future.result())
+                except Exception as e:
+                    logger.error(f"Ensemble member {model_name} failed: {e}")
+                    continue
+                if ranked_chunks:
+                    ranked_chunks[0]["model_used"] = model_name
+                    model_results.append(ranked_chunks[0])
             
             # If results available, select best answer
             if model_results:
                 # Rank and get best answer
-                ranked_results = rank_answers(model_results)
+                with span("ranking"):
+                    ranked_results = rank_answers(model_results)
                 best_result = ranked_results[0]
                 
                 # Include alternate answers
@@ -206,6 +765,7 @@ class AdvancedQA:
                     result["answer"] for result in ranked_results[1:] 
                     if result["answer"] != best_result["answer"]
                 ]
+                best_result["ensemble_members"] = [result["model_used"] for result in model_results]
                 
                 return best_result
             else:
@@ -217,4 +777,128 @@ class AdvancedQA:
                 )
         except Exception as e:
             logger.error(f"Error in ensemble QA: {e}")
-            return None
\ No newline at end of file
+            return None
+    
+    def _cascade_tiers(self, model_name: Optional[str] = None) -> List[str]:
+        """Models the cascade tries for a requested model, cheapest first."""
+        if self.cascade_models:
+            return list(self.cascade_models)
+        return self.model_manager.get_cascade_models(model_name)
+    
+    def _needs_escalation(self, ranked_results: List[Dict[str, Any]]) -> bool:
+        """Whether a cascade tier's answer is too uncertain to return."""
+        best = ranked_results[0]
+        if best["score"] < self.cascade_threshold:
+            return True
+        # The two best spans disagree and neither is clearly ahead
+        for result in ranked_results[1:2]:
+            if (
+                result["answer"].strip().lower() != best["answer"].strip().lower()
+                and best["score"] - result["score"] < self.cascade_margin
+            ):
+                return True
+        return False
+    
+    def _cascade_qa(
+        self,
+        question: str,
+        context: str,
+        model_name: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Cascade approach that only runs larger models when smaller ones are unsure.
+        
+        Starting with model_name, each tier's model reads the context in
+        turn. A tier's best answer is returned unless its score is below
+        cascade_threshold or the two best answers disagree within
+        cascade_margin. Then the next model reads only the chunks
+        overlapping the cascade_chunks best-scoring chunks so far. When
+        every tier is unsure, the answer with the highest score wins.
+        
+        Args:
+            question: The question to answer
+            context: The context text
+            model_name: First model to try, see _cascade_tiers
+            
+        Returns:
+            Best answer dictionary with the answering tier in 'cascade_tier'
+            and every tier's model, best score and chunks read in 'cascade_path'
+        """
+        tiers = self._cascade_tiers(model_name)
+        logger.info(f"Using cascade QA approach with {len(tiers)} models")
+        
+        document = self.documents.get(context)
+        best_result = None
+        path = []
+        focus = None
+        for tier, model_name in enumerate(tiers):
+            try:
+                with span("cascade_tier", model=model_name, tier=tier):
+                    spans = self._chunk_spans(question, document, model_name)
+                    selected = None
+                    if focus is not None:
+                        # Only reread the chunks the previous tier found candidates in
+                        overlapping = (spans[:, None, 0] < focus[None, :, 1]) & (focus[None, :, 0] < spans[:, None, 1])
+                        selected = np.flatnonzero(overlapping.any(axis=1)).tolist()
+                    all_results = self._answer_chunks(question, document, model_name, selected=selected)
+                    with span("ranking"):
+                        ranked_results = rank_answers(all_results)
+            except Exception as e:
+                # A failing tier is skipped, the next model still gets a chance
+                logger.error(f"Cascade tier {tier} ({model_name}) failed: {e}")
+                path.append({"model": model_name, "error": str(e)})
+                continue
+            if not ranked_results:
+                path.append({"model": model_name, "score": None, "chunks": len(selected) if selected is not None else len(spans)})
+                continue
+            
+            tier_result = ranked_results[0]
+            tier_result["model_used"] = model_name
+            tier_result["cascade_tier"] = tier
+            path.append({
+                "model": model_name,
+                "score": tier_result["score"],
+                "chunks": len(selected) if selected is not None else len(spans)
+            })
+            # A larger model that is even less sure doesn't replace the answer
+            if best_result is None or tier_result["score"] > best_result["score"]:
+                best_result = tier_result
+            if not self._needs_escalation(ranked_results):
+                break
+            if tier + 1 < len(tiers):
+                logger.info(f"Escalating from {model_name}, best score {tier_result['score']:.3f}")
+                if self.cascade_chunks is not None:
+                    candidates = sorted(all_results, key=lambda result: result["score"], reverse=True)
+                    focus = spans[[result["chunk_index"] for result in candidates[:self.cascade_chunks]]]
+        
+        if best_result is not None:
+            best_result["cascade_path"] = path
+        return best_result
+
+
+_shared_qa = None
+_shared_qa_lock = threading.Lock()
+
+
+def get_advanced_qa() -> AdvancedQA:
+    """
+    Get the process-wide AdvancedQA, creating it on first use.
+    
+    Sharing it keeps the preprocessed and tokenized documents and their
+    BM25 indexes across Streamlit reruns and server requests. It uses the
+    shared ModelManager and AnswerCache, and the QA_RETRIEVAL_TOP_K
+    environment variable sets retrieval_top_k.
+    
+    Returns:
+        Shared AdvancedQA instance
+    """
+    global _shared_qa
+    with _shared_qa_lock:
+        if _shared_qa is None:
+            top_k = os.environ.get("QA_RETRIEVAL_TOP_K")
+            _shared_qa = AdvancedQA(
+                get_model_manager(),
+                answer_cache=get_answer_cache(),
+                retrieval_top_k=int(top_k) if top_k else None
+            )
+        return _shared_qa
@@ -0,0 +1,246 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def hash_context(context: str) -> str:
+    """
+    Compute a fast, stable hash of a context string.
+
+    Uses xxhash when installed and falls back to BLAKE2 otherwise.
+
+    Args:
+        context: The context text
+
+    Returns:
+        Hex digest of the context
+    """
+    data = context.encode("utf-8")
+    if xxhash is not None:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def normalize_question(question: str) -> str:
+    """
+    Collapse whitespace and trailing punctuation of a question.
+
+    Case is kept: cased models can answer "US" and "us" differently.
+    """
+    return re.sub(r'\s+', ' ', question).strip().rstrip('?.! ')
+
+
+class AnswerCache:
+    """
+    Two-tier cache for QA results.
+
+    Results are kept in an in-memory LRU and, when a database path is given,
+    in a SQLite table so they survive restarts and are shared between
+    processes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        db_path: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        max_disk_entries: Optional[int] = 100000
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of results held in memory
+            db_path: SQLite file for the disk tier, None keeps the cache in memory
+            ttl_seconds: Age after which results expire, None for no expiry
+            max_disk_entries: Maximum rows kept in the disk tier, None for no cap
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "puts": 0, "expired": 0}
+
+        # Values are (created_at, result) in least-recently-used order
+        self._memory = OrderedDict()
+        self._lock = threading.RLock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed_at)")
+            self._db.commit()
+            logger.info(f"Answer cache persisted to {db_path}")
+
+    @staticmethod
+    def make_key(model_name: str, strategy: str, question: str, context: str) -> str:
+        """
+        Build the cache key for a question.
+
+        Args:
+            model_name: Model used to answer
+            strategy: Strategy used to answer
+            question: The question text
+            context: The context text
+
+        Returns:
+            Cache key string
+        """
+        return "|".join([model_name, strategy, normalize_question(question), hash_context(context)])
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result.
+
+        Args:
+            key: Key from make_key
+
+        Returns:
+            A copy of the cached result, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if self._is_expired(entry[0], now):
+                    del self._memory[key]
+                    self.stats["expired"] += 1
+                else:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return copy.deepcopy(entry[1])
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT result, created_at FROM answers WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if self._is_expired(row[1], now):
+                        self._db.execute("DELETE FROM answers WHERE key = ?", (key,))
+                        self._db.commit()
+                        self.stats["expired"] += 1
+                    else:
+                        self._db.execute("UPDATE answers SET accessed_at = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        result = json.loads(row[0])
+                        self._remember(key, row[1], result)
+                        self.stats["disk_hits"] += 1
+                        return copy.deepcopy(result)
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """
+        Store a result in both tiers.
+
+        Args:
+            key: Key from make_key
+            result: Answer dictionary to cache
+        """
+        now = time.time()
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._remember(key, now, result)
+            self.stats["puts"] += 1
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO answers (key, result, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(result, default=_to_json), now, now)
+                )
+                if self.max_disk_entries is not None:
+                    # Trim the least recently accessed rows beyond the cap
+                    self._db.execute(
+                        "DELETE FROM answers WHERE key IN ("
+                        "SELECT key FROM answers ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_disk_entries,)
+                    )
+                self._db.commit()
+
+    def clear(self):
+        """Drop every cached result from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM answers")
+                self._db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get hit/miss counters and tier sizes.
+
+        Returns:
+            Dictionary of cache metrics
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+            stats["memory_entries"] = len(self._memory)
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            return stats
+
+    def _remember(self, key: str, created_at: float, result: Dict[str, Any]):
+        """Insert into the memory tier, evicting the least recently used entry."""
+        self._memory[key] = (created_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        """Check an entry's age against the TTL."""
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+
+def _to_json(value: Any) -> Any:
+    """Convert NumPy scalars and other stragglers for json.dumps."""
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """
+    Get the process-wide AnswerCache, creating it on first use.
+
+    The disk tier is enabled by the QA_ANSWER_CACHE_DB environment variable
+    and QA_ANSWER_CACHE_TTL sets the expiry in seconds.
+
+    Returns:
+        Shared AnswerCache instance
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            ttl = os.environ.get("QA_ANSWER_CACHE_TTL")
+            _shared_cache = AnswerCache(
+                db_path=os.environ.get("QA_ANSWER_CACHE_DB"),
+                ttl_seconds=float(ttl) if ttl else None
+            )
+        return _shared_cache
@@ -0,0 +1,255 @@
+import csv
+import itertools
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Set
+
+from src.advanced_qa import AdvancedQA
+from src.answer_cache import hash_context
+from src.model_manager import get_model_manager
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Strategies whose questions about one document are answered together by
+# AdvancedQA.process_questions, which matches the chunked strategy
+BATCHED_STRATEGIES = ("auto", "chunked")
+
+
+def read_requests(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read batch requests from a JSONL or CSV file, one at a time.
+
+    Every request needs a 'question' and either a 'context' text or a
+    'context_file' path. 'id' and 'model' are optional.
+
+    Args:
+        path: Input file, CSV if it ends in .csv and JSONL otherwise
+
+    Yields:
+        Request dictionaries, each tagged with its input 'offset'
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for offset, record in enumerate(records):
+            record["offset"] = offset
+            yield record
+
+
+def completed_offsets(path: str) -> Set[int]:
+    """
+    Collect the input offsets already answered in an output JSONL file.
+
+    Records with an 'error' are left out, so resuming retries them.
+    """
+    offsets = set()
+    if not os.path.exists(path):
+        return offsets
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "offset" in record and "error" not in record:
+                offsets.add(record["offset"])
+    return offsets
+
+
+def truncate_partial_line(path: str):
+    """
+    Cut an output file back to its last complete line.
+
+    A run that was interrupted mid-write leaves a partial last line, which
+    the next appended record would otherwise be glued to.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        # Read backwards until the last newline
+        while position > 0:
+            block_start = max(0, position - 65536)
+            f.seek(block_start)
+            block = f.read(position - block_start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                position = block_start + newline + 1
+                break
+            position = block_start
+        if position < end:
+            logger.warning(f"Dropping {end - position} bytes of a partial last line in {path}")
+            f.truncate(position)
+
+
+def group_by_document(records: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Group requests that share a context, keeping first-seen order.
+
+    Args:
+        records: Request dictionaries
+
+    Returns:
+        List of request groups, one per distinct document
+    """
+    groups = OrderedDict()
+    for record in records:
+        if record.get("context_file"):
+            key = ("file", record["context_file"])
+        else:
+            key = ("text", hash_context(record.get("context", "")))
+        groups.setdefault(key, []).append(record)
+    return list(groups.values())
+
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    model_name: str = "distilbert-base-uncased-distilled-squad",
+    strategy: str = "auto",
+    batch_size: int = 8,
+    workers: int = 1,
+    resume_from: int = 0,
+    resume: bool = False,
+    answer_cache=None,
+    retrieval_top_k: Optional[int] = None,
+    block_size: int = 1000
+) -> int:
+    """
+    Answer many (document, question) pairs in one process.
+
+    Models are loaded once and results are appended to the output JSONL
+    as soon as they are ready. The input is streamed in blocks of
+    block_size requests, and the questions of a block are grouped by
+    document so each document is preprocessed and tokenized once. With
+    the 'auto' or 'chunked' strategy, the questions about a document
+    share batched forward passes. Requests that fail get an 'error'
+    line instead of stopping the run.
+
+    Args:
+        input_path: JSONL or CSV file of requests
+        output_path: JSONL file results are appended to
+        model_name: Model for requests that don't name one
+        strategy: Strategy passed to AdvancedQA.process_question
+        batch_size: Number of chunk windows per forward pass
+        workers: Number of documents processed concurrently
+        resume_from: Skip requests whose input offset is below this
+        resume: Skip requests already answered in the output file,
+            retrying those that failed
+        answer_cache: Optional AnswerCache shared by all requests
+        retrieval_top_k: Only read the k chunks of each document that
+            score best with BM25
+        block_size: Requests read and grouped at a time
+
+    Returns:
+        Number of results written
+    """
+    truncate_partial_line(output_path)
+    done = completed_offsets(output_path) if resume else set()
+    records = (
+        record for record in read_requests(input_path)
+        if record["offset"] >= resume_from and record["offset"] not in done
+    )
+
+    advanced_qa = AdvancedQA(
+        get_model_manager(),
+        batch_size=batch_size,
+        answer_cache=answer_cache,
+        retrieval_top_k=retrieval_top_k
+    )
+    write_lock = threading.Lock()
+    written = [0]
+
+    with open(output_path, "a", encoding="utf-8") as output:
+
+        def write(record: Dict[str, Any], result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+            output_record = {"offset": record["offset"], "id": record.get("id"), "question": record.get("question")}
+            if result:
+                output_record.update({
+                    key: result.get(key)
+                    for key in ("answer", "score", "start", "end", "model_used", "strategy_used", "processing_time")
+                })
+                if "cascade_tier" in result:
+                    output_record["cascade_tier"] = result["cascade_tier"]
+            else:
+                output_record["error"] = error or "No answer found"
+
+            with write_lock:
+                output.write(json.dumps(output_record) + "\n")
+                output.flush()
+                written[0] += 1
+
+        def process_group(group: List[Dict[str, Any]]):
+            context = _load_context(group[0])
+            batched = OrderedDict()
+            for record in group:
+                if not record.get("question"):
+                    write(record, error="Missing question")
+                elif context is None:
+                    write(record, error="Could not read context")
+                elif strategy in BATCHED_STRATEGIES:
+                    batched.setdefault(record.get("model") or model_name, []).append(record)
+                else:
+                    try:
+                        result = advanced_qa.process_question(
+                            record["question"],
+                            context,
+                            model_name=record.get("model") or model_name,
+                            strategy=strategy,
+                            allow_ensemble=False
+                        )
+                    except Exception as e:
+                        logger.error(f"Error answering request {record['offset']}: {e}")
+                        write(record, error=str(e))
+                        continue
+                    write(record, result)
+
+            # The questions of each model share its forward passes
+            for record_model, model_records in batched.items():
+                try:
+                    results = advanced_qa.process_questions(
+                        [record["question"] for record in model_records],
+                        context,
+                        model_name=record_model
+                    )["results"]
+                except Exception as e:
+                    logger.error(f"Error answering {len(model_records)} requests with {record_model}: {e}")
+                    for record in model_records:
+                        write(record, error=str(e))
+                    continue
+                for record, result in zip(model_records, results):
+                    write(record, result)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as executor:
+            while True:
+                block = list(itertools.islice(records, block_size))
+                if not block:
+                    break
+                groups = group_by_document(block)
+                logger.info(f"Answering {len(block)} questions over {len(groups)} documents with {workers} workers")
+                for future in [executor.submit(process_group, group) for group in groups]:
+                    future.result()
+
+    logger.info(f"Wrote {written[0]} results to {output_path}")
+    return written[0]
+
+
+def _load_context(record: Dict[str, Any]) -> Optional[str]:
+    """Get a request's context text, reading its context_file if given."""
+    if not record.get("context_file"):
+        return record.get("context", "")
+    try:
+        with open(record["context_file"], "r", encoding="utf-8") as f:
+            return f.read()
+    except Exception as e:
+        logger.error(f"Error reading context file {record['context_file']}: {e}")
+        return None
@@ -0,0 +1,373 @@
+import logging
+from contextlib import nullcontext
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.instrumentation import span
+from src.span_decoding import decode_windows, dedupe_spans
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class EncodedContext(NamedTuple):
+    """Token ids of one context chunk, tokenized without special tokens."""
+    input_ids: np.ndarray
+    offsets: np.ndarray  # (tokens, 2) character spans within the chunk
+    word_ids: np.ndarray  # word index per token, -1 where there is none
+
+
+class BatchedChunkEngine:
+    """Answers one question over many context chunks with batched forward passes."""
+
+    def __init__(
+        self,
+        model: Any,
+        tokenizer: Any,
+        device: str = "cpu",
+        batch_size: int = 8,
+        max_seq_len: int = 384,
+        doc_stride: int = 128,
+        max_answer_len: int = 15,
+        top_k: int = 3,
+        tokenizer_lock: Optional[Any] = None
+    ):
+        """
+        Initialize the engine with an already loaded model and fast tokenizer.
+
+        Args:
+            model: HuggingFace question answering model
+            tokenizer: Matching fast tokenizer (offset mapping is required)
+            device: Device the model lives on
+            batch_size: Number of token windows per forward pass
+            max_seq_len: Maximum tokens per window (question + context),
+                capped at the tokenizer's model_max_length
+            doc_stride: Token overlap when a chunk overflows one window
+            max_answer_len: Maximum answer length in tokens
+            top_k: Candidate spans kept per chunk for ranking across chunks
+            tokenizer_lock: Lock guarding the tokenizer when it is shared
+                between threads (fast tokenizers are not thread-safe)
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.batch_size = batch_size
+        self.max_seq_len = min(max_seq_len, getattr(tokenizer, "model_max_length", max_seq_len) or max_seq_len)
+        self.doc_stride = min(doc_stride, self.max_seq_len // 2)
+        self.max_answer_len = max_answer_len
+        self.top_k = top_k
+        self.tokenizer_lock = tokenizer_lock or nullcontext()
+
+    def encode_contexts(self, chunks: List[str]) -> List[EncodedContext]:
+        """
+        Tokenize context chunks once so they can be reused across questions.
+
+        Args:
+            chunks: Context chunks to tokenize
+
+        Returns:
+            One EncodedContext per chunk
+        """
+        if not chunks:
+            return []
+
+        with span("tokenize_context", chunks=len(chunks)), self.tokenizer_lock:
+            encodings = self.tokenizer(
+                chunks,
+                add_special_tokens=False,
+                return_offsets_mapping=True,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+                verbose=False  # Whole documents are longer than the model limit on purpose
+            )
+        return [
+            EncodedContext(
+                input_ids=np.array(encodings["input_ids"][i], dtype=np.int64),
+                offsets=np.array(encodings["offset_mapping"][i], dtype=np.int64).reshape(-1, 2),
+                word_ids=np.array(
+                    [-1 if word is None else word for word in encodings.word_ids(i)],
+                    dtype=np.int64
+                )
+            )
+            for i in range(len(chunks))
+        ]
+
+    def question_length(self, question: str) -> int:
+        """Number of tokens of a question, without special tokens."""
+        with self.tokenizer_lock:
+            return len(self.tokenizer(question, add_special_tokens=False)["input_ids"])
+
+    def context_capacity(self, question_length: int) -> int:
+        """
+        Number of context tokens that fit in one window next to a question.
+
+        Args:
+            question_length: Question tokens, without special tokens
+
+        Returns:
+            Context tokens per window, at most 0 if the question alone
+            does not fit
+        """
+        return self._template(question_length)[1]
+
+    def _template(self, question_length: int) -> Tuple[int, int]:
+        """Where the context starts in a window and how many tokens it can take."""
+        # Locate the context inside the special-token template with a sentinel
+        template = self.tokenizer.build_inputs_with_special_tokens([0] * question_length, [-1])
+        return template.index(-1), self.max_seq_len - (len(template) - 1)
+
+    def answer(
+        self,
+        question: str,
+        chunks: List[str],
+        encoded: Optional[List[EncodedContext]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Find the best answer span in every chunk.
+
+        Only the question is tokenized here when pre-encoded chunks are
+        given; its ids are joined with each cached context window and the
+        windows are run through the model once per fixed-size batch.
+
+        Args:
+            question: The question to answer
+            chunks: Context chunks to search
+            encoded: Output of encode_contexts for these chunks, if cached
+
+        Returns:
+            One answer dictionary per chunk with score, chunk-relative
+            start/end character offsets, answer text and chunk_index, plus
+            the chunk's top_k 'candidates', the best span's 'span_logit'
+            and the chunk's log partitions 'start_lse' and 'end_lse', which
+            rank_answers uses to compare spans across chunks
+        """
+        return self.answer_batch([(question, chunks, encoded)])[0]
+
+    def answer_batch(
+        self,
+        requests: Sequence[Tuple[str, List[str], Optional[List[EncodedContext]]]]
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Answer several (question, chunks) requests in shared forward passes.
+
+        Windows of all requests are packed into the same fixed-size batches,
+        so many small requests cost about as much as one large one.
+
+        Args:
+            requests: (question, chunks, encoded) tuples, encoded being the
+                output of encode_contexts for the chunks or None
+
+        Returns:
+            For every request, one answer dictionary per chunk as returned
+            by answer()
+        """
+        requests = [
+            (question, chunks, self.encode_contexts(chunks) if encoded is None else encoded)
+            for question, chunks, encoded in requests
+        ]
+
+        # Tokenize every distinct question once
+        question_ids = {}
+        with span("tokenize_question"), self.tokenizer_lock:
+            for question, _, _ in requests:
+                if question not in question_ids:
+                    question_ids[question] = self.tokenizer(question, add_special_tokens=False)["input_ids"]
+
+        windows = [
+            (request_index,) + window
+            for request_index, (question, _, encoded) in enumerate(requests)
+            for window in self._plan_windows(question_ids[question], encoded)
+        ]
+        logger.info(
+            f"Running {len(windows)} windows for {sum(len(chunks) for _, chunks, _ in requests)} chunks "
+            f"of {len(requests)} requests in batches of {self.batch_size}"
+        )
+
+        # Forward pass per batch, keeping the best window for each chunk
+        results = [[None] * len(chunks) for _, chunks, _ in requests]
+        for batch_start in range(0, len(windows), self.batch_size):
+            batch = windows[batch_start:batch_start + self.batch_size]
+            with span("build_batch"):
+                inputs, context_mask, cls_mask = self._build_batch(
+                    [question_ids[requests[window[0]][0]] for window in batch],
+                    [requests[window[0]][2] for window in batch],
+                    [window[1:] for window in batch]
+                )
+            with span("forward", windows=len(batch)):
+                start_logits, end_logits = self._forward(inputs)
+            with span("decode_spans"):
+                decoded = decode_windows(start_logits, end_logits, context_mask, cls_mask, self.max_answer_len, self.top_k)
+
+            for row, window in enumerate(batch):
+                request_index, chunk_index, token_start, token_end, position = window
+                if token_end == token_start:
+                    continue  # Chunk without any tokens
+                _, chunks, encoded = requests[request_index]
+                chunk_result = results[request_index][chunk_index]
+                if chunk_result is None:
+                    chunk_result = results[request_index][chunk_index] = {
+                        "score": -1.0,
+                        "chunk_index": chunk_index,
+                        "candidates": [],
+                        "start_lse": -np.inf,
+                        "end_lse": -np.inf
+                    }
+                # The windows of a chunk share one partition
+                chunk_result["start_lse"] = float(np.logaddexp(chunk_result["start_lse"], decoded.start_lse[row]))
+                chunk_result["end_lse"] = float(np.logaddexp(chunk_result["end_lse"], decoded.end_lse[row]))
+
+                window_candidates = []
+                for start, end, span_logit, score in zip(
+                    decoded.starts[row].tolist(),
+                    decoded.ends[row].tolist(),
+                    decoded.span_logits[row].tolist(),
+                    decoded.scores[row].tolist()
+                ):
+                    if span_logit == -np.inf:
+                        break  # Fewer valid spans than top_k
+                    # Window positions back to token indices within the chunk
+                    char_start, char_end = self._char_span(
+                        encoded[chunk_index],
+                        token_start + start - position,
+                        token_start + end - position
+                    )
+                    window_candidates.append({
+                        "score": score,
+                        "start": char_start,
+                        "end": char_end,
+                        "answer": chunks[chunk_index][char_start:char_end],
+                        "span_logit": span_logit
+                    })
+                chunk_result["candidates"] += window_candidates
+                # Like the pipeline, a chunk's answer is its best window's best span
+                if window_candidates and window_candidates[0]["score"] > chunk_result["score"]:
+                    chunk_result.update(window_candidates[0])
+
+        return [
+            [self._dedupe_candidates(result) for result in chunk_results if result is not None]
+            for chunk_results in results
+        ]
+
+    def _dedupe_candidates(self, chunk_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep a chunk's top_k candidates, dropping spans found again in overlapping windows."""
+        candidates = sorted(chunk_result["candidates"], key=lambda candidate: candidate["span_logit"], reverse=True)
+        picked = dedupe_spans(
+            np.array([candidate["start"] for candidate in candidates], dtype=np.int64),
+            np.array([candidate["end"] for candidate in candidates], dtype=np.int64),
+            self.top_k
+        )
+        chunk_result["candidates"] = [candidates[index] for index in picked.tolist()]
+        return chunk_result
+
+    def _plan_windows(self, question_ids: List[int], encoded: List[EncodedContext]):
+        """
+        Split every chunk's tokens into windows that fit max_seq_len.
+
+        Long chunks overflow into several windows overlapping by doc_stride
+        tokens, the same way the tokenizer's return_overflowing_tokens does.
+
+        Returns:
+            List of (chunk_index, token_start, token_end, context_position)
+            tuples, where context_position is where the context tokens begin
+            in the model input
+        """
+        position, capacity = self._template(len(question_ids))
+        if capacity <= 0:
+            raise ValueError(f"Question is too long for max_seq_len={self.max_seq_len}")
+        step = max(1, capacity - min(self.doc_stride, capacity - 1))
+
+        windows = []
+        for chunk_index, context in enumerate(encoded):
+            token_start = 0
+            while True:
+                token_end = min(token_start + capacity, len(context.input_ids))
+                windows.append((chunk_index, token_start, token_end, position))
+                if token_end >= len(context.input_ids):
+                    break
+                token_start += step
+        return windows
+
+    def _build_batch(
+        self,
+        question_ids: List[List[int]],
+        encoded: List[List[EncodedContext]],
+        batch
+    ):
+        """
+        Assemble padded model inputs for a batch of windows.
+
+        Args:
+            question_ids: Question token ids of every window
+            encoded: Encoded chunks of the request every window belongs to
+            batch: (chunk_index, token_start, token_end, position) windows
+
+        Returns:
+            Tuple of (model inputs, context token mask, CLS token mask)
+        """
+        sequences, type_ids = [], []
+        for ids, contexts, (chunk_index, token_start, token_end, _) in zip(question_ids, encoded, batch):
+            context_ids = contexts[chunk_index].input_ids[token_start:token_end].tolist()
+            sequences.append(self.tokenizer.build_inputs_with_special_tokens(list(ids), context_ids))
+            type_ids.append(self.tokenizer.create_token_type_ids_from_sequences(list(ids), context_ids))
+
+        width = max(len(sequence) for sequence in sequences)
+        pad_id = self.tokenizer.pad_token_id or 0
+        input_ids = np.full((len(batch), width), pad_id, dtype=np.int64)
+        token_type_ids = np.zeros((len(batch), width), dtype=np.int64)
+        attention_mask = np.zeros((len(batch), width), dtype=np.int64)
+        context_mask = np.zeros((len(batch), width), dtype=bool)
+        for row, (sequence, types, (_, token_start, token_end, position)) in enumerate(zip(sequences, type_ids, batch)):
+            input_ids[row, :len(sequence)] = sequence
+            token_type_ids[row, :len(types)] = types
+            attention_mask[row, :len(sequence)] = 1
+            context_mask[row, position:position + token_end - token_start] = True
+
+        # Like the pipeline, CLS takes part in the softmax but is never an answer
+        cls_mask = np.zeros_like(context_mask)
+        if self.tokenizer.cls_token_id is not None:
+            cls_mask[:, 0] = input_ids[:, 0] == self.tokenizer.cls_token_id
+
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.tokenizer.model_input_names:
+            inputs["token_type_ids"] = token_type_ids
+        return inputs, context_mask, cls_mask
+
+    def _char_span(self, context: EncodedContext, start_token: int, end_token: int):
+        """
+        Convert a token span to chunk character offsets, widened to whole
+        words the same way the pipeline's align_to_words does.
+
+        Returns:
+            Tuple of (start, end) character offsets within the chunk
+        """
+        word_ids = context.word_ids
+        if word_ids[start_token] >= 0:
+            while start_token > 0 and word_ids[start_token - 1] == word_ids[start_token]:
+                start_token -= 1
+        if word_ids[end_token] >= 0:
+            while end_token + 1 < len(word_ids) and word_ids[end_token + 1] == word_ids[end_token]:
+                end_token += 1
+        return int(context.offsets[start_token, 0]), int(context.offsets[end_token, 1])
+
+    def _forward(self, inputs: Dict[str, np.ndarray]):
+        """
+        Run one padded batch through the model.
+
+        Returns:
+            Tuple of (start_logits, end_logits) as float32 NumPy arrays
+        """
+        if hasattr(self.model, "run_numpy"):
+            # ONNX Runtime sessions take and return NumPy arrays directly
+            return self.model.run_numpy(inputs)
+
+        import torch
+
+        tensors = {name: torch.from_numpy(values).to(self.device) for name, values in inputs.items()}
+        with torch.inference_mode():
+            outputs = self.model(**tensors)
+        return (
+            outputs.start_logits.float().cpu().numpy(),
+            outputs.end_logits.float().cpu().numpy()
+        )
@@ -0,0 +1,305 @@
+import bisect
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Lookup table of str.isspace over every code point up to U+3000, the
+# largest whitespace character
+_SPACE_TABLE = np.array([chr(code).isspace() for code in range(0x3001)])
+
+
+def _ascii_table(chars: str) -> np.ndarray:
+    """Boolean lookup table over ASCII plus one catch-all entry for everything above."""
+    table = np.zeros(129, dtype=bool)
+    table[[ord(ch) for ch in chars]] = True
+    return table
+
+
+_TERMINATORS = _ascii_table(".!?")
+_CLOSERS = _ascii_table("\"')]`")
+_OPENERS = _ascii_table("\"'([`")
+_LOWERCASE = _ascii_table("abcdefghijklmnopqrstuvwxyz")
+
+# Words that end in a period without ending a sentence
+ABBREVIATIONS = frozenset(
+    "mr mrs ms dr prof sr jr st mt vs etc fig figs no nos vol vols ed eds "
+    "inc ltd co corp dept univ jan feb mar apr jun jul aug sep sept oct nov dec "
+    "approx est gen col lt sgt capt rev hon al cf ca".split()
+)
+_MAX_ABBREVIATION = max(len(word) for word in ABBREVIATIONS)
+
+
+def _word_key(word: str) -> int:
+    """Pack a short lowercase ASCII word into an integer, five bits per letter."""
+    key = 0
+    for ch in word:
+        key = key * 32 + ord(ch) - ord("a") + 1
+    return key
+
+
+_ABBREVIATION_KEYS = np.array(sorted(_word_key(word) for word in ABBREVIATIONS))
+
+
+def _word_keys(codes: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Vectorized _word_key of the case-folded words at starts, 0 for words
+    that are longer than any abbreviation or contain non-letters.
+    """
+    keys = np.zeros(len(starts), dtype=np.int64)
+    valid = (lengths > 0) & (lengths <= _MAX_ABBREVIATION)
+    for k in range(_MAX_ABBREVIATION):
+        present = valid & (k < lengths)
+        chars = codes[np.where(present, starts + k, 0)] | 0x20  # ASCII lowercase
+        letters = (chars >= ord("a")) & (chars <= ord("z"))
+        valid &= letters | ~present
+        keys = np.where(present, keys * 32 + chars.astype(np.int64) - ord("a") + 1, keys)
+    return np.where(valid, keys, 0)
+
+
+def _char_codes(text: str) -> np.ndarray:
+    """Code point of every character, as a NumPy view over one UTF-32 copy of the text."""
+    return np.frombuffer(text.encode("utf-32-le"), dtype="<u4")
+
+
+class TextIndex:
+    """
+    Word and sentence offsets of a text, computed in one vectorized pass.
+
+    Words are the same as str.split() produces. Sentences end at '.', '!'
+    or '?' (optionally followed by closing quotes or brackets) when the next
+    word does not start in lowercase, except after common abbreviations and
+    initials. Sentences are stored as the index of their first word, so
+    chunking is index arithmetic over the word offset arrays and never
+    copies or re-splits text.
+    """
+
+    def __init__(self, text: str):
+        """
+        Index a text.
+
+        Args:
+            text (str): Text to index, usually the output of preprocess_text
+        """
+        self.text = text
+        codes = _char_codes(text)
+        # Besides the space, only control characters and a few non-ASCII
+        # code points can be whitespace
+        is_word = codes > 0x20
+        special = np.flatnonzero((codes < 0x20) | ((codes > 0x7f) & (codes < len(_SPACE_TABLE))))
+        is_word[special] = ~_SPACE_TABLE[codes[special]]
+        edges = np.diff(is_word.astype(np.int8), prepend=np.int8(0), append=np.int8(0))
+        self.word_starts = np.flatnonzero(edges == 1)
+        self.word_ends = np.flatnonzero(edges == -1)
+        self.sentence_starts = self._find_sentence_starts(codes)
+
+    @property
+    def num_words(self) -> int:
+        """Number of words in the text."""
+        return len(self.word_starts)
+
+    def _find_sentence_starts(self, codes: np.ndarray) -> np.ndarray:
+        """Find the index of the first word of every sentence."""
+        if self.num_words == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        # Last character of every word, skipping up to two closing quotes or brackets
+        last = self.word_ends[:-1] - 1
+        starts = self.word_starts[:-1]
+        for _ in range(2):
+            last = last - (_CLOSERS[np.minimum(codes[last], 128)] & (last > starts))
+        candidates = np.flatnonzero(_TERMINATORS[np.minimum(codes[last], 128)])
+        last = last[candidates]
+
+        # First character of the following word, skipping opening quotes or brackets
+        first = self.word_starts[candidates + 1]
+        first_ends = self.word_ends[candidates + 1]
+        for _ in range(2):
+            first = first + (_OPENERS[np.minimum(codes[first], 128)] & (first < first_ends - 1))
+        next_codes = codes[first]
+        keep = ~_LOWERCASE[np.minimum(next_codes, 128)]
+        for i in np.flatnonzero(keep & (next_codes > 127)).tolist():
+            keep[i] = not chr(next_codes[i]).islower()
+
+        # A period after an initial or a known abbreviation does not end the sentence
+        periods = keep & (codes[last] == ord("."))
+        token_starts = self.word_starts[candidates]
+        for _ in range(2):
+            token_starts = token_starts + (_OPENERS[np.minimum(codes[token_starts], 128)] & (token_starts < last))
+        lengths = last - token_starts
+        keys = _word_keys(codes, token_starts, lengths)
+        initials = (lengths == 1) & (keys > 0)
+        keep &= ~(periods & (initials | np.isin(keys, _ABBREVIATION_KEYS)))
+
+        # Words with inner periods like "U.S." or "e.g." are rare enough to check one by one
+        dots = np.flatnonzero(codes == ord("."))
+        inner_dots = np.searchsorted(dots, last) - np.searchsorted(dots, token_starts)
+        for i in np.flatnonzero(periods & keep & (lengths > 1) & (inner_dots > 0)).tolist():
+            token = self.text[token_starts[i]:last[i]]
+            keep[i] = max(len(part) for part in token.split(".")) > 2
+        return np.concatenate([[0], candidates[keep] + 1]).astype(np.int64)
+
+    def sentence_spans(self) -> np.ndarray:
+        """
+        Character spans of all sentences.
+
+        Returns:
+            np.ndarray: Array of shape (num_sentences, 2) with end-exclusive
+                (start, end) offsets into the text
+        """
+        if self.num_words == 0:
+            return np.zeros((0, 2), dtype=np.int64)
+        last_words = np.append(self.sentence_starts[1:], self.num_words) - 1
+        return np.stack([self.word_starts[self.sentence_starts], self.word_ends[last_words]], axis=1)
+
+    def chunk_word_ranges(self, max_words: int = 300, overlap: int = 50) -> np.ndarray:
+        """
+        Word index ranges of overlapping sentence-aligned chunks.
+
+        Args:
+            max_words (int): Maximum words per chunk
+            overlap (int): Number of words shared by consecutive chunks
+
+        Returns:
+            np.ndarray: Array of shape (num_chunks, 2) with end-exclusive
+                (first word, last word + 1) indexes
+        """
+        return pack_ranges(self.num_words, self.sentence_starts, max_words, overlap)
+
+    def chunk_spans(self, max_words: int = 300, overlap: int = 50) -> np.ndarray:
+        """
+        Character spans of overlapping sentence-aligned chunks.
+
+        Args:
+            max_words (int): Maximum words per chunk
+            overlap (int): Number of words shared by consecutive chunks
+
+        Returns:
+            np.ndarray: Array of shape (num_chunks, 2) with end-exclusive
+                (start, end) offsets into the text
+        """
+        ranges = self.chunk_word_ranges(max_words, overlap)
+        return np.stack([self.word_starts[ranges[:, 0]], self.word_ends[ranges[:, 1] - 1]], axis=1)
+
+    def slice(self, spans: np.ndarray) -> List[str]:
+        """
+        Copy out the text of a set of spans.
+
+        Args:
+            spans (np.ndarray): Spans as returned by chunk_spans or sentence_spans
+
+        Returns:
+            List[str]: Text of every span
+        """
+        return [self.text[start:end] for start, end in spans.tolist()]
+
+
+def pack_ranges(
+    total: int,
+    boundaries: np.ndarray,
+    max_size: int,
+    overlap: int,
+    cut_points: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Pack a sequence of units into overlapping ranges aligned to boundaries.
+
+    Every range starts overlap units before the end of the previous one
+    and is extended up to the last boundary that keeps it within max_size
+    units. When no boundary fits, the range is cut at the last cut point
+    that does.
+
+    Args:
+        total (int): Number of units (words or tokens)
+        boundaries (np.ndarray): Sorted unit indexes where sentences start
+        max_size (int): Maximum units per range
+        overlap (int): Number of units shared by consecutive ranges
+        cut_points (Optional[np.ndarray]): Sorted unit indexes a range may
+            start or end at besides boundaries, every unit if None
+
+    Returns:
+        np.ndarray: Array of shape (num_ranges, 2) with end-exclusive
+            (first unit, last unit + 1) indexes
+    """
+    max_size = max(1, max_size)
+    overlap = min(max(0, overlap), max_size - 1)
+    boundaries = np.asarray(boundaries).tolist() + [total]
+    cuts = None if cut_points is None else np.asarray(cut_points).tolist() + [total]
+
+    def snap(position: int, floor: int) -> int:
+        """Move a position back to the closest cut point above floor."""
+        if cuts is None:
+            return position
+        snapped = cuts[bisect.bisect_right(cuts, position) - 1]
+        return snapped if snapped > floor else position
+
+    ranges = []
+    start, previous_end = 0, 0
+    while start < total:
+        limit = min(start + max_size, total)
+        end = boundaries[bisect.bisect_right(boundaries, limit) - 1]
+        if end <= previous_end or end <= start:
+            end = snap(limit, max(start, previous_end))
+        ranges.append((start, end))
+        if end >= total:
+            break
+        start, previous_end = snap(max(end - overlap, start + 1), start), end
+    return np.array(ranges, dtype=np.int64).reshape(-1, 2)
+
+
+def token_chunk_ranges(
+    token_offsets: np.ndarray,
+    token_word_ids: np.ndarray,
+    sentence_offsets: np.ndarray,
+    max_tokens: int,
+    stride: int
+) -> np.ndarray:
+    """
+    Token index ranges of sentence-aligned chunks that fit a token budget.
+
+    Works on one tokenization of the whole text, so the chunks' token ids
+    can be sliced out of it instead of tokenizing every chunk again.
+
+    Args:
+        token_offsets (np.ndarray): (tokens, 2) character spans of the tokens
+        token_word_ids (np.ndarray): Word index per token, -1 where there is none
+        sentence_offsets (np.ndarray): Character offsets where sentences start
+        max_tokens (int): Maximum tokens per chunk
+        stride (int): Number of tokens shared by consecutive chunks
+
+    Returns:
+        np.ndarray: Array of shape (num_chunks, 2) with end-exclusive
+            (first token, last token + 1) indexes
+    """
+    total = len(token_offsets)
+    if total == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    boundaries = np.unique(np.searchsorted(token_offsets[:, 0], sentence_offsets))
+    boundaries = boundaries[(boundaries > 0) & (boundaries < total)]
+    # Chunks are only cut between tokens of different words
+    word_starts = np.flatnonzero(np.diff(token_word_ids, prepend=-2) != 0)
+    return pack_ranges(total, np.concatenate([[0], boundaries]), max_tokens, stride, word_starts)
+
+
+def chunk_spans(text: str, max_words: int = 300, overlap: int = 50, index: Optional[TextIndex] = None) -> np.ndarray:
+    """
+    Split text into overlapping sentence-aligned chunks without copying it.
+
+    Args:
+        text (str): Input text, usually the output of preprocess_text
+        max_words (int): Maximum words per chunk
+        overlap (int): Number of words shared by consecutive chunks
+        index (Optional[TextIndex]): Prebuilt index of the text, if any
+
+    Returns:
+        np.ndarray: Array of shape (num_chunks, 2) with end-exclusive
+            (start, end) character offsets into the text
+    """
+    index = index or TextIndex(text)
+    spans = index.chunk_spans(max_words, overlap)
+    logger.info(f"Split text into {len(spans)} chunks with max {max_words} words each")
+    return spans
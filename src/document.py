@@ -0,0 +1,388 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from src.answer_cache import hash_context
+from src.chunking import TextIndex, token_chunk_ranges
+from src.improved_utils import OffsetMap
+from src.instrumentation import span
+from src.retrieval import BM25Index
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TokenChunks(NamedTuple):
+    """Chunks packed to one model's token budget, with their encodings."""
+    key: Tuple  # (model_name, max_tokens, stride)
+    chunks: List[str]
+    starts: List[int]  # chunk start offsets in the preprocessed text
+    encoded: List[Any]  # EncodedContext per chunk
+
+
+class BoundaryIndex:
+    """
+    Sentence and paragraph boundaries of a raw context.
+
+    Built once per document, so finding the sentence or paragraph around
+    an answer is a binary search instead of a scan of the text.
+    """
+
+    def __init__(self, text: str, sentence_spans: np.ndarray):
+        """
+        Index a raw context.
+
+        Args:
+            text: The raw context text
+            sentence_spans: (sentences, 2) end-exclusive sentence spans in
+                raw text offsets
+        """
+        self.text = text
+        self.sentence_starts = sentence_spans[:, 0]
+        self.sentence_ends = sentence_spans[:, 1]
+        # Paragraphs are separated by blank lines
+        breaks = np.array([match.span() for match in re.finditer(r"\n\s*\n", text)], dtype=np.int64).reshape(-1, 2)
+        self.paragraph_starts = np.concatenate([[0], breaks[:, 1]])
+        self.paragraph_ends = np.concatenate([breaks[:, 0], [len(text)]])
+
+    @staticmethod
+    def _covering(starts: np.ndarray, ends: np.ndarray, start: int, end: int) -> Tuple[int, int]:
+        """Span from the unit containing start to the unit containing end - 1."""
+        if len(starts) == 0:
+            return start, end
+        first = max(0, int(np.searchsorted(starts, start, side="right")) - 1)
+        last = max(first, int(np.searchsorted(starts, max(start, end - 1), side="right")) - 1)
+        return min(int(starts[first]), start), max(int(ends[last]), end)
+
+    def sentence_bounds(self, start: int, end: int) -> Tuple[int, int]:
+        """Raw offsets of the sentences a span falls in."""
+        return self._covering(self.sentence_starts, self.sentence_ends, start, end)
+
+    def paragraph_bounds(self, start: int, end: int) -> Tuple[int, int]:
+        """Raw offsets of the paragraphs a span falls in."""
+        return self._covering(self.paragraph_starts, self.paragraph_ends, start, end)
+
+    def window(self, start: int, end: int, unit: str = "sentence", max_chars: int = 300) -> Tuple[int, int]:
+        """
+        Get the context to show around a span.
+
+        Args:
+            start: Span start in the raw text
+            end: Span end (exclusive) in the raw text
+            unit: 'sentence' or 'paragraph' to widen the span to
+            max_chars: Maximum characters shown on either side of the span
+
+        Returns:
+            End-exclusive raw offsets of the window
+        """
+        bounds = self.paragraph_bounds if unit == "paragraph" else self.sentence_bounds
+        window_start, window_end = bounds(start, end)
+        return max(window_start, start - max_chars), min(window_end, end + max_chars)
+
+
+class Document:
+    """
+    A context prepared once and reused for every question asked about it.
+
+    Preprocessing, sentence splitting, chunking and per-model tokenization
+    all happen lazily on first use and are memoized, so follow-up
+    questions only need to tokenize the question itself.
+    """
+
+    def __init__(self, text: str, doc_id: Optional[str] = None):
+        """
+        Initialize a document from raw context text.
+
+        Args:
+            text: The raw context text
+            doc_id: Precomputed hash_context of the text, if known
+        """
+        self.text = text
+        self.doc_id = doc_id or hash_context(text)
+        self._lock = threading.RLock()
+        self._offset_map = None
+        self._text_index = None
+        self._boundaries = None
+        self._sentences = None
+        self._chunk_spans = {}
+        self._chunks = {}
+        self._encoded = {}
+        self._encoded_text = {}
+        self._token_chunks = {}
+        self._indexes = {}
+
+    @property
+    def offset_map(self) -> OffsetMap:
+        """Preprocessed text and its mapping back to the raw text."""
+        with self._lock:
+            if self._offset_map is None:
+                with span("preprocess"):
+                    self._offset_map = OffsetMap(self.text)
+            return self._offset_map
+
+    @property
+    def text_index(self) -> TextIndex:
+        """Word and sentence offsets of the preprocessed text."""
+        with self._lock:
+            if self._text_index is None:
+                text = self.offset_map.text
+                with span("sentence_split"):
+                    self._text_index = TextIndex(text)
+            return self._text_index
+
+    @property
+    def boundaries(self) -> BoundaryIndex:
+        """Sentence and paragraph boundaries in raw text offsets."""
+        with self._lock:
+            if self._boundaries is None:
+                spans = self.text_index.sentence_spans()
+                with span("boundary_index"):
+                    raw_spans = self.offset_map.spans_to_original(spans) if len(spans) else spans
+                    self._boundaries = BoundaryIndex(self.text, raw_spans)
+            return self._boundaries
+
+    def context_window(self, start: int, end: int, unit: str = "sentence", max_chars: int = 300) -> Tuple[int, int]:
+        """
+        Get the raw offsets of the context to show around an answer.
+
+        Args:
+            start: Answer start in the raw text
+            end: Answer end (exclusive) in the raw text
+            unit: 'sentence' or 'paragraph' to widen the answer to
+            max_chars: Maximum characters shown on either side of the answer
+
+        Returns:
+            End-exclusive raw offsets of the window
+        """
+        return self.boundaries.window(start, end, unit, max_chars)
+
+    @property
+    def sentences(self) -> List[str]:
+        """Sentences of the preprocessed text."""
+        with self._lock:
+            if self._sentences is None:
+                self._sentences = self.text_index.slice(self.text_index.sentence_spans())
+            return self._sentences
+
+    @property
+    def sentence_starts(self) -> List[Optional[int]]:
+        """Start offset of every sentence in the preprocessed text."""
+        return self.text_index.sentence_spans()[:, 0].tolist()
+
+    def chunk_spans(self, max_words: int = 300, overlap: int = 50) -> np.ndarray:
+        """
+        Get the character spans of the document's chunks.
+
+        Args:
+            max_words: Maximum words per chunk
+            overlap: Number of words shared by consecutive chunks
+
+        Returns:
+            Array of end-exclusive (start, end) offsets into the preprocessed text
+        """
+        key = (max_words, overlap)
+        with self._lock:
+            if key not in self._chunk_spans:
+                text_index = self.text_index
+                with span("chunking"):
+                    self._chunk_spans[key] = text_index.chunk_spans(max_words, overlap)
+                logger.info(f"Split document {self.doc_id[:8]} into {len(self._chunk_spans[key])} chunks")
+            return self._chunk_spans[key]
+
+    def chunks(self, max_words: int = 300, overlap: int = 50) -> List[str]:
+        """
+        Get the sentence-aligned chunks of the document.
+
+        Args:
+            max_words: Maximum words per chunk
+            overlap: Number of words shared by consecutive chunks
+
+        Returns:
+            List of text chunks, the text of chunk_spans
+        """
+        key = (max_words, overlap)
+        with self._lock:
+            if key not in self._chunks:
+                self._chunks[key] = self.text_index.slice(self.chunk_spans(max_words, overlap))
+            return self._chunks[key]
+
+    def chunk_starts(self, max_words: int = 300, overlap: int = 50) -> List[Optional[int]]:
+        """Start offset of every chunk in the preprocessed text."""
+        return self.chunk_spans(max_words, overlap)[:, 0].tolist()
+
+    def encoded_chunks(
+        self,
+        model_name: str,
+        engine: Any,
+        max_words: int = 300,
+        overlap: int = 50
+    ) -> List[Any]:
+        """
+        Get the chunks tokenized for one model, tokenizing on first use.
+
+        Args:
+            model_name: Model whose tokenizer the engine uses
+            engine: BatchedChunkEngine for that model
+            max_words: Maximum words per chunk
+            overlap: Number of words to overlap between chunks
+
+        Returns:
+            List of EncodedContext, one per chunk
+        """
+        key = (model_name, max_words, overlap)
+        with self._lock:
+            if key not in self._encoded:
+                self._encoded[key] = engine.encode_contexts(self.chunks(max_words, overlap))
+            return self._encoded[key]
+
+    def encoded_text(self, model_name: str, engine: Any) -> Any:
+        """
+        Get the whole preprocessed text tokenized for one model.
+
+        Args:
+            model_name: Model whose tokenizer the engine uses
+            engine: BatchedChunkEngine for that model
+
+        Returns:
+            EncodedContext of the whole text
+        """
+        with self._lock:
+            if model_name not in self._encoded_text:
+                self._encoded_text[model_name] = engine.encode_contexts([self.offset_map.text])[0]
+            return self._encoded_text[model_name]
+
+    def token_chunks(self, model_name: str, engine: Any, max_tokens: int, stride: int = 64) -> TokenChunks:
+        """
+        Get sentence-aligned chunks of at most max_tokens tokens for one model.
+
+        The text is tokenized once and every chunk's encoding is a slice of
+        that tokenization, so each chunk fills exactly one model window.
+
+        Args:
+            model_name: Model whose tokenizer the engine uses
+            engine: BatchedChunkEngine for that model
+            max_tokens: Maximum context tokens per chunk
+            stride: Number of tokens shared by consecutive chunks
+
+        Returns:
+            The chunks, their start offsets and their encodings
+        """
+        key = (model_name, max_tokens, stride)
+        with self._lock:
+            if key not in self._token_chunks:
+                encoded = self.encoded_text(model_name, engine)
+                text = self.offset_map.text
+                with span("chunking", max_tokens=max_tokens):
+                    ranges = token_chunk_ranges(
+                        encoded.offsets,
+                        encoded.word_ids,
+                        self.text_index.sentence_spans()[:, 0],
+                        max_tokens,
+                        stride
+                    )
+                    chunks, starts, chunk_encodings = [], [], []
+                    for token_start, token_end in ranges.tolist():
+                        start = int(encoded.offsets[token_start, 0])
+                        end = int(encoded.offsets[token_end - 1, 1])
+                        chunks.append(text[start:end])
+                        starts.append(start)
+                        chunk_encodings.append(encoded._replace(
+                            input_ids=encoded.input_ids[token_start:token_end],
+                            offsets=encoded.offsets[token_start:token_end] - start,
+                            word_ids=encoded.word_ids[token_start:token_end]
+                        ))
+                self._token_chunks[key] = TokenChunks(key, chunks, starts, chunk_encodings)
+                logger.info(f"Packed document {self.doc_id[:8]} into {len(chunks)} chunks of at most {max_tokens} tokens")
+            return self._token_chunks[key]
+
+    def bm25_index(
+        self,
+        max_words: int = 300,
+        overlap: int = 50,
+        token_chunks: Optional[TokenChunks] = None
+    ) -> BM25Index:
+        """Get the lexical index over the document's chunks, building it on first use."""
+        key = token_chunks.key if token_chunks is not None else (max_words, overlap)
+        with self._lock:
+            if key not in self._indexes:
+                chunks = token_chunks.chunks if token_chunks is not None else self.chunks(max_words, overlap)
+                with span("bm25_index"):
+                    self._indexes[key] = BM25Index(chunks)
+            return self._indexes[key]
+
+    def map_to_context(
+        self,
+        results: List[Dict[str, Any]],
+        max_words: int = 300,
+        overlap: int = 50,
+        token_chunks: Optional[TokenChunks] = None
+    ):
+        """
+        Map chunk-relative answer offsets back to the raw text in place.
+
+        Args:
+            results: Answer dictionaries with chunk_index, start and end
+            max_words: Chunk size the answers were found with
+            overlap: Chunk overlap the answers were found with
+            token_chunks: Token chunks the answers were found in, instead
+                of the word chunks
+        """
+        if token_chunks is not None:
+            chunk_starts = token_chunks.starts
+        else:
+            chunk_starts = self.chunk_starts(max_words, overlap)
+        with span("map_offsets"):
+            self._map_results(results, chunk_starts)
+
+    def _map_results(self, results: List[Dict[str, Any]], chunk_starts: List[Optional[int]]):
+        """Shift chunk-relative offsets by their chunk start and map them to the raw text."""
+        for result in results:
+            chunk_start = chunk_starts[result["chunk_index"]]
+            if chunk_start is not None:
+                # The chunk's candidate spans move with it
+                for answer in [result] + result.get("candidates", []):
+                    answer["start"], answer["end"] = self.offset_map.span_to_original(
+                        chunk_start + answer["start"],
+                        chunk_start + answer["end"]
+                    )
+
+
+class DocumentCache:
+    """Keeps the most recently used documents so repeated contexts are prepared once."""
+
+    def __init__(self, max_documents: int = 8):
+        """
+        Initialize the cache.
+
+        Args:
+            max_documents: Number of documents kept in memory
+        """
+        self.max_documents = max_documents
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, text: str) -> Document:
+        """
+        Get the document for a context, creating it if needed.
+
+        Args:
+            text: The raw context text
+
+        Returns:
+            The cached or newly created Document
+        """
+        doc_id = hash_context(text)
+        with self._lock:
+            document = self._documents.get(doc_id)
+            if document is None:
+                document = Document(text, doc_id)
+                self._documents[doc_id] = document
+                while len(self._documents) > self.max_documents:
+                    self._documents.popitem(last=False)
+            self._documents.move_to_end(doc_id)
+            return document
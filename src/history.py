@@ -0,0 +1,269 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque, defaultdict
+from typing import Dict, Any, List, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Fields every history entry has
+HISTORY_FIELDS = ("question", "answer", "score", "model", "strategy", "processing_time", "timestamp")
+
+
+def question_tokens(text: str) -> List[str]:
+    """Lowercase word tokens of a question, as used by the search index."""
+    return re.findall(r"\w+", text.lower())
+
+
+class HistoryStore:
+    """
+    Question and answer history with bounded memory.
+
+    Without a backend, the newest max_entries entries are kept in a ring
+    buffer. With a path, every entry is appended to a SQLite database (or
+    a JSONL file when the path ends in .jsonl) shared by every session and
+    process using it, and pages are read from there on demand. Questions
+    are searchable through a word index in every mode.
+    """
+
+    def __init__(self, max_entries: int = 500, path: Optional[str] = None):
+        """
+        Initialize the store.
+
+        Args:
+            max_entries: Entries kept in memory when there is no backend
+            path: SQLite file, or .jsonl file, to persist entries to
+        """
+        self.max_entries = max_entries
+        self.path = path
+        self._lock = threading.RLock()
+
+        # In-memory ring buffer, oldest first, and its word index
+        self._entries = deque()
+        self._index = defaultdict(set)
+        self._next_id = 1
+
+        self._db = None
+        self._fts = False
+        self._jsonl = None
+        self._offsets = []  # byte offset of every JSONL line
+        if path and path.endswith(".jsonl"):
+            self._open_jsonl(path)
+        elif path:
+            self._open_db(path)
+
+    def _open_db(self, path: str):
+        """Create the history table and, when SQLite has FTS5, its full-text index."""
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT NOT NULL, answer TEXT, "
+            "score REAL, model TEXT, strategy TEXT, processing_time REAL, timestamp TEXT, created_at REAL NOT NULL)"
+        )
+        try:
+            self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(question, content='history', content_rowid='id')")
+            self._fts = True
+        except sqlite3.OperationalError:
+            logger.warning("SQLite has no FTS5, history search falls back to LIKE")
+        self._db.commit()
+        logger.info(f"History persisted to {path}")
+
+    def _open_jsonl(self, path: str):
+        """Index the lines of an existing JSONL log and open it for appending."""
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                offset = 0
+                for line_number, line in enumerate(f):
+                    self._offsets.append(offset)
+                    offset += len(line)
+                    try:
+                        question = json.loads(line).get("question", "")
+                    except ValueError:
+                        continue
+                    for token in question_tokens(question):
+                        self._index[token].add(line_number)
+        self._jsonl = open(path, "ab")
+        logger.info(f"History appended to {path} ({len(self._offsets)} entries)")
+
+    def add(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Record a question and its answer.
+
+        Args:
+            entry: Dictionary with the HISTORY_FIELDS, timestamp is filled
+                in when missing
+
+        Returns:
+            The stored entry, with its 'id'
+        """
+        entry = {field: entry.get(field) for field in HISTORY_FIELDS}
+        entry["timestamp"] = entry["timestamp"] or time.strftime("%Y-%m-%d %H:%M:%S")
+        tokens = question_tokens(entry["question"] or "")
+        with self._lock:
+            if self._db is not None:
+                cursor = self._db.execute(
+                    "INSERT INTO history (question, answer, score, model, strategy, processing_time, timestamp, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    tuple(entry[field] for field in HISTORY_FIELDS) + (time.time(),)
+                )
+                entry["id"] = cursor.lastrowid
+                if self._fts:
+                    self._db.execute("INSERT INTO history_fts (rowid, question) VALUES (?, ?)", (entry["id"], entry["question"]))
+                self._db.commit()
+            elif self._jsonl is not None:
+                entry["id"] = len(self._offsets)
+                self._offsets.append(self._jsonl.seek(0, os.SEEK_END))
+                self._jsonl.write((json.dumps(entry) + "\n").encode("utf-8"))
+                self._jsonl.flush()
+                for token in tokens:
+                    self._index[token].add(entry["id"])
+            else:
+                entry["id"] = self._next_id
+                self._next_id += 1
+                self._entries.append(entry)
+                for token in tokens:
+                    self._index[token].add(entry["id"])
+                # Drop the oldest entry and its index postings
+                while len(self._entries) > self.max_entries:
+                    evicted = self._entries.popleft()
+                    for token in question_tokens(evicted["question"] or ""):
+                        self._index[token].discard(evicted["id"])
+                        if not self._index[token]:
+                            del self._index[token]
+        return entry
+
+    def count(self, query: Optional[str] = None) -> int:
+        """
+        Count the entries, or those whose question contains every word of query.
+
+        Args:
+            query: Words to search for, None or empty for all entries
+
+        Returns:
+            Number of matching entries
+        """
+        with self._lock:
+            if self._db is not None:
+                where, params = self._db_filter(query)
+                return self._db.execute(f"SELECT COUNT(*) FROM history{where}", params).fetchone()[0]
+            ids = self._matching_ids(query)
+            if ids is not None:
+                return len(ids)
+            return len(self._offsets) if self._jsonl is not None else len(self._entries)
+
+    def page(self, page: int = 0, page_size: int = 20, query: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get one page of entries, newest first.
+
+        Only the requested page is read, so rendering cost does not grow
+        with the size of the history.
+
+        Args:
+            page: Zero-based page number
+            page_size: Entries per page
+            query: Only entries whose question contains every word of query
+
+        Returns:
+            The page's entries
+        """
+        offset = max(0, page) * page_size
+        with self._lock:
+            if self._db is not None:
+                where, params = self._db_filter(query)
+                rows = self._db.execute(
+                    f"SELECT id, {', '.join(HISTORY_FIELDS)} FROM history{where} ORDER BY id DESC LIMIT ? OFFSET ?",
+                    params + [page_size, offset]
+                ).fetchall()
+                return [dict(zip(("id",) + HISTORY_FIELDS, row)) for row in rows]
+
+            ids = self._matching_ids(query)
+            if self._jsonl is not None:
+                line_numbers = sorted(ids, reverse=True) if ids is not None else range(len(self._offsets) - 1, -1, -1)
+                return self._read_lines(line_numbers[offset:offset + page_size])
+
+            if ids is None:
+                entries = list(reversed(self._entries))
+            else:
+                entries = [entry for entry in reversed(self._entries) if entry["id"] in ids]
+            return entries[offset:offset + page_size]
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Get the newest entries whose question contains every word of query."""
+        return self.page(0, limit, query)
+
+    def clear(self):
+        """Delete every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM history")
+                if self._fts:
+                    self._db.execute("INSERT INTO history_fts (history_fts) VALUES ('delete-all')")
+                self._db.commit()
+            elif self._jsonl is not None:
+                self._jsonl.truncate(0)
+                self._offsets.clear()
+
+    def _matching_ids(self, query: Optional[str]) -> Optional[set]:
+        """Ids (or JSONL line numbers) whose question has every query word, None without a query."""
+        tokens = question_tokens(query or "")
+        if not tokens:
+            return None
+        postings = sorted((self._index.get(token, set()) for token in tokens), key=len)
+        return set.intersection(*postings) if postings[0] else set()
+
+    def _db_filter(self, query: Optional[str]):
+        """WHERE clause and parameters selecting the rows that match query."""
+        tokens = question_tokens(query or "")
+        if not tokens:
+            return "", []
+        if self._fts:
+            match = " ".join(f'"{token}"' for token in tokens)
+            return " WHERE id IN (SELECT rowid FROM history_fts WHERE history_fts MATCH ?)", [match]
+        return " WHERE " + " AND ".join(["LOWER(question) LIKE ?"] * len(tokens)), [f"%{token}%" for token in tokens]
+
+    def _read_lines(self, line_numbers) -> List[Dict[str, Any]]:
+        """Read the given JSONL lines by seeking to their offsets."""
+        self._jsonl.flush()
+        entries = []
+        with open(self.path, "rb") as f:
+            for line_number in line_numbers:
+                f.seek(self._offsets[line_number])
+                try:
+                    entry = json.loads(f.readline())
+                except ValueError:
+                    continue
+                entry["id"] = line_number
+                entries.append(entry)
+        return entries
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    """
+    Get the process-wide HistoryStore, creating it on first use.
+
+    QA_HISTORY_DB sets the SQLite or .jsonl file history is persisted to
+    and QA_HISTORY_MAX_ENTRIES the size of the in-memory ring buffer.
+
+    Returns:
+        Shared HistoryStore instance
+    """
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = HistoryStore(
+                max_entries=int(os.environ.get("QA_HISTORY_MAX_ENTRIES", 500)),
+                path=os.environ.get("QA_HISTORY_DB")
+            )
+        return _shared_store
@@ -1,30 +1,53 @@
 import re
-import nltk
-from nltk.tokenize import sent_tokenize
+import bisect
 import logging
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, Iterable, Iterator
+
+import numpy as np
+
+from src.instrumentation import span
+from src.span_decoding import log_partition, top_k_answers
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Download NLTK data (if not already present)
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt', quiet=True)
+# Whether the NLTK punkt data is installed, found out on first use
+_punkt_available = None
 
 
-def preprocess_text(text: str) -> str:
+def split_sentences(text: str) -> List[str]:
     """
-    Clean and preprocess text for better QA performance.
+    Split text into sentences with NLTK punkt.
+    
+    Nothing is ever downloaded here: when NLTK or its punkt data is not installed
+    (see `python -m src.startup --download-nltk`), the rule-based splitter
+    of src.chunking is used instead.
     
     Args:
-        text (str): Raw text input
+        text (str): Text to split
         
     Returns:
-        str: Preprocessed text
+        List[str]: Sentences in document order
     """
+    global _punkt_available
+    if _punkt_available is not False:
+        try:
+            from nltk.tokenize import sent_tokenize
+            sentences = sent_tokenize(text)
+            _punkt_available = True
+            return sentences
+        except (ImportError, LookupError):
+            _punkt_available = False
+            logger.warning("NLTK or its punkt data is not installed, using the rule-based sentence splitter")
+    
+    from src.chunking import TextIndex
+    index = TextIndex(text)
+    return index.slice(index.sentence_spans())
+
+
+def _normalize_text(text: str) -> str:
+    """Apply the preprocess_text substitutions without stripping the ends."""
     # Convert multiple whitespaces to single space
     text = re.sub(r'\s+', ' ', text)
     
@@ -35,7 +58,127 @@ def preprocess_text(text: str) -> str:
     text = re.sub(r'[\u201c\u201d\u0022]', '"', text)
     text = re.sub(r'[\u2018\u2019\u0027]', "'", text)
     
-    return text.strip()
+    return text
+
+
+def preprocess_text(text: str) -> str:
+    """
+    Clean and preprocess text for better QA performance.
+    
+    Args:
+        text (str): Raw text input
+        
+    Returns:
+        str: Preprocessed text
+    """
+    with span("preprocess"):
+        return _normalize_text(text).strip()
+
+
+class OffsetMap:
+    """
+    Preprocesses text like preprocess_text while remembering how to map
+    positions in the cleaned text back to the raw input.
+
+    Only whitespace collapsing and stripping change the text length, so the
+    mapping is stored as breakpoints after every collapsed whitespace run
+    rather than one entry per character.
+    """
+
+    def __init__(self, text: str):
+        """
+        Build the cleaned text and its position breakpoints.
+
+        Args:
+            text (str): Raw text input
+        """
+        self.breakpoints = [0]
+        self.shifts = [0]
+        removed = 0
+        for match in re.finditer(r'\s{2,}', text):
+            removed += len(match.group()) - 1
+            self.breakpoints.append(match.end() - removed)
+            self.shifts.append(removed)
+
+        collapsed = _normalize_text(text)
+        self.leading = len(collapsed) - len(collapsed.lstrip())
+        self.text = collapsed.strip()
+
+    def to_original(self, pos: int) -> int:
+        """
+        Map a position in the cleaned text to the raw input.
+
+        Args:
+            pos (int): Character offset in the cleaned text
+
+        Returns:
+            int: Character offset in the raw text
+        """
+        pos += self.leading
+        index = bisect.bisect_right(self.breakpoints, pos) - 1
+        return pos + self.shifts[index]
+
+    def span_to_original(self, start: int, end: int) -> Tuple[int, int]:
+        """
+        Map an end-exclusive span in the cleaned text to the raw input.
+
+        Args:
+            start (int): Span start in the cleaned text
+            end (int): Span end (exclusive) in the cleaned text
+
+        Returns:
+            Tuple[int, int]: The span in raw text offsets
+        """
+        if end <= start:
+            original = self.to_original(start)
+            return original, original
+        return self.to_original(start), self.to_original(end - 1) + 1
+
+    def spans_to_original(self, spans: np.ndarray) -> np.ndarray:
+        """
+        Vectorized span_to_original for many non-empty spans at once.
+
+        Args:
+            spans (np.ndarray): (n, 2) end-exclusive spans in the cleaned text
+
+        Returns:
+            np.ndarray: (n, 2) spans in raw text offsets
+        """
+        breakpoints = np.array(self.breakpoints)
+        shifts = np.array(self.shifts)
+        positions = np.asarray(spans, dtype=np.int64).reshape(-1, 2) + self.leading
+        positions[:, 1] -= 1
+        original = positions + shifts[np.searchsorted(breakpoints, positions, side="right") - 1]
+        original[:, 1] += 1
+        return original
+
+
+def locate_chunks(text: str, chunks: List[str]) -> List[Optional[int]]:
+    """
+    Find where each chunk starts in the text it was cut from.
+
+    Chunks are expected in document order, so every search resumes from the
+    previous hit instead of scanning the whole text again.
+
+    Args:
+        text (str): Preprocessed text the chunks were taken from
+        chunks (List[str]): Chunks in document order
+
+    Returns:
+        List[Optional[int]]: Start offset of each chunk, None if not found
+    """
+    starts = []
+    cursor = 0
+    for chunk in chunks:
+        pos = text.find(chunk, cursor)
+        if pos == -1:
+            pos = text.find(chunk)
+        if pos == -1:
+            starts.append(None)
+        else:
+            starts.append(pos)
+            cursor = pos + 1
+    return starts
 
 
 def chunk_text_by_sentences(text: str, max_words: int = 300, overlap: int = 50) -> List[str]:
@@ -54,45 +197,79 @@ def chunk_text_by_sentences(text: str, max_words: int = 300, overlap: int = 50)
     # Preprocess text
     text = preprocess_text(text)
     
-    # Tokenize into sentences and words
-    sentences = sent_tokenize(text)
-    chunks = []
-    current_chunk = []
-    current_length = 0
+    # Tokenize into sentences and group them into chunks
+    with span("sentence_split"):
+        sentences = split_sentences(text)
+    with span("chunking"):
+        chunks = group_sentences(sentences, max_words, overlap)
+    
+    logger.info(f"Split text into {len(chunks)} chunks with max {max_words} words each")
+    return chunks
+
+
+def group_sentences(sentences: List[str], max_words: int = 300, overlap: int = 50) -> List[str]:
+    """
+    Group consecutive sentences into overlapping chunks of at most max_words.
+    
+    Args:
+        sentences (List[str]): Sentences in document order
+        max_words (int): Maximum words per chunk
+        overlap (int): Number of words to overlap between chunks
+        
+    Returns:
+        List[str]: List of text chunks
+    """
+    return list(iter_sentence_groups(sentences, max_words, overlap))
+
+
+def iter_sentence_groups(sentences: Iterable[str], max_words: int = 300, overlap: int = 50) -> Iterator[str]:
+    """
+    Lazily group sentences into chunks, see group_sentences.
+    
+    Only the chunk being built is held in memory, so sentences can come
+    from a stream. Chunks are packed like TextIndex.chunk_spans does:
+    consecutive chunks share their last and first overlap words, and a
+    sentence too long for one chunk is cut at max_words.
+    
+    Args:
+        sentences (Iterable[str]): Sentences in document order
+        max_words (int): Maximum words per chunk
+        overlap (int): Number of words to overlap between chunks
+        
+    Yields:
+        str: Text chunks in document order
+    """
+    max_words = max(1, max_words)
+    overlap = min(max(0, overlap), max_words - 1)
+    current_words = []
+    new_words = 0  # Words of current_words not in the previous chunk
     
     for sentence in sentences:
-        # Count words in this sentence
-        sentence_words = len(sentence.split())
+        sentence_words = sentence.split()
         
-        # If adding this sentence exceeds max_words and we already have content,
-        # finalize the current chunk and start a new one
-        if current_length + sentence_words > max_words and current_chunk:
-            chunk_text = " ".join(current_chunk)
-            chunks.append(chunk_text)
-            
-            # Start new chunk with overlap
-            overlap_words = " ".join(current_chunk[-overlap:]) if overlap > 0 and len(current_chunk) > overlap else ""
-            current_chunk = []
-            if overlap_words:
-                current_chunk = [overlap_words]
-                current_length = len(overlap_words.split())
-            else:
-                current_length = 0
+        # If adding this sentence exceeds max_words and the chunk has new
+        # content, finalize it and start the next one with its last words
+        if new_words and len(current_words) + len(sentence_words) > max_words:
+            yield " ".join(current_words)
+            current_words = current_words[len(current_words) - min(overlap, len(current_words) - 1):]
+            new_words = 0
         
         # Add the sentence to the current chunk
-        current_chunk.append(sentence)
-        current_length += sentence_words
+        current_words += sentence_words
+        new_words += len(sentence_words)
+        
+        # Cut sentences that don't fit in one chunk
+        while len(current_words) > max_words:
+            yield " ".join(current_words[:max_words])
+            current_words = current_words[max_words - overlap:]
+            new_words = len(current_words) - overlap
     
     # Don't forget the last chunk
-    if current_chunk:
-        chunk_text = " ".join(current_chunk)
-        chunks.append(chunk_text)
-    
-    logger.info(f"Split text into {len(chunks)} chunks with max {max_words} words each")
-    return chunks
+    if new_words > 0:
+        yield " ".join(current_words)
 
 
-def get_context_window(text: str, answer: str, window_size: int = 200) -> str:
+def get_context_window(text: str, answer: str, window_size: int = 200, answer_pos: Optional[int] = None) -> str:
     """
     Extract a window of text around the answer for better context display.
     
@@ -100,12 +277,15 @@ def get_context_window(text: str, answer: str, window_size: int = 200) -> str:
         text (str): Full text context
         answer (str): The answer string
         window_size (int): Number of characters before and after answer
+        answer_pos (Optional[int]): Start offset of the answer in text, as
+            returned with every answer; searched for when not given
         
     Returns:
         str: Text window with highlighted answer
     """
     # Find the answer in the text
-    answer_pos = text.find(answer)
+    if answer_pos is None:
+        answer_pos = text.find(answer)
     if answer_pos == -1:
         return text
     
@@ -125,18 +305,38 @@ def get_context_window(text: str, answer: str, window_size: int = 200) -> str:
     return window
 
 
-def rank_answers(answers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def rank_answers(
+    answers: List[Dict[str, Any]],
+    top_k: int = 3,
+    partition: Optional[Tuple[float, float]] = None,
+    chunk_relative: bool = False
+) -> List[Dict[str, Any]]:
     """
     Rank a list of potential answers based on multiple factors.
     
+    Chunk results of the batched engine carry several candidate spans and
+    their logits, so they are ranked by top_k_answers on one calibrated
+    scale with overlapping spans removed. Other answers, e.g. from the
+    pipeline or from different models, are sorted by score.
+    
     Args:
         answers (List[Dict]): List of answer dictionaries from the QA pipeline
+        top_k (int): Number of answers returned
+        partition (Optional[Tuple[float, float]]): Log partitions of every
+            chunk read so far, when answers only holds the best of them
+        chunk_relative (bool): Whether offsets are still relative to each
+            chunk, so spans of different chunks are never duplicates
         
     Returns:
         List[Dict]: Ranked list of answers
     """
+    if answers and all("span_logit" in answer for answer in answers):
+        partition = partition or log_partition(answers)
+        if partition is not None:
+            return top_k_answers(answers, top_k, partition, chunk_relative)
+    
     # First sort by score
     sorted_answers = sorted(answers, key=lambda x: x.get('score', 0), reverse=True)
     
-    # Return top 3 answers
-    return sorted_answers[:3]
\ No newline at end of file
+    # Return top answers
+    return sorted_answers[:top_k]
@@ -0,0 +1,110 @@
+import codecs
+import logging
+from typing import BinaryIO, Iterable, Iterator
+
+from src.improved_utils import _normalize_text, iter_sentence_groups, split_sentences
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def iter_text_blocks(
+    fileobj: BinaryIO,
+    block_size: int = 1 << 20,
+    encoding: str = "utf-8"
+) -> Iterator[str]:
+    """
+    Read and decode a binary file incrementally.
+
+    Multi-byte characters split across blocks are decoded correctly and
+    undecodable bytes are replaced rather than raising.
+
+    Args:
+        fileobj: Binary file-like object, e.g. a Streamlit UploadedFile
+        block_size: Bytes read per block
+        encoding: Text encoding of the file
+
+    Yields:
+        str: Decoded text blocks
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    while True:
+        data = fileobj.read(block_size)
+        if not data:
+            break
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_sentences(blocks: Iterable[str], max_carry: int = 1 << 20) -> Iterator[str]:
+    """
+    Normalize streamed text like preprocess_text and split it into sentences.
+
+    The last, possibly incomplete, sentence of every block is carried over
+    and re-split together with the next block.
+
+    Args:
+        blocks: Raw text blocks in order
+        max_carry: Maximum characters carried over without a sentence break
+            before the carry is emitted as is
+
+    Yields:
+        str: Sentences in document order
+    """
+    carry = ""
+    raw_ended_in_space = True  # Strips leading whitespace of the stream
+    for block in blocks:
+        normalized = _normalize_text(block)
+        # A whitespace run spanning two blocks collapses to a single space
+        if raw_ended_in_space and block[:1].isspace():
+            normalized = normalized[1:]
+        raw_ended_in_space = block[-1:].isspace()
+
+        buffer = carry + normalized
+        sentences = split_sentences(buffer)
+        if not sentences:
+            carry = ""
+            continue
+        for sentence in sentences[:-1]:
+            yield sentence
+        # split_sentences drops the trailing spaces the next block relies on
+        carry = sentences[-1] + buffer[len(buffer.rstrip()):]
+        if len(carry) > max_carry:
+            yield carry.strip()
+            carry = ""
+
+    if carry.strip():
+        yield carry.strip()
+
+
+def iter_chunks(
+    fileobj: BinaryIO,
+    max_words: int = 300,
+    overlap: int = 50,
+    block_size: int = 1 << 20,
+    encoding: str = "utf-8"
+) -> Iterator[str]:
+    """
+    Stream sentence-based chunks out of a text file.
+
+    Peak memory stays proportional to block_size and the chunk being
+    built, whatever the size of the file.
+
+    Args:
+        fileobj: Binary file-like object
+        max_words: Maximum words per chunk
+        overlap: Number of words to overlap between chunks
+        block_size: Bytes read per block
+        encoding: Text encoding of the file
+
+    Yields:
+        str: Text chunks, the same as chunk_text_by_sentences would produce
+            for the whole file up to block boundary effects
+    """
+    blocks = iter_text_blocks(fileobj, block_size, encoding)
+    yield from iter_sentence_groups(iter_sentences(blocks), max_words, overlap)
@@ -0,0 +1,287 @@
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# (trace, parent span id) of the span currently open in this context
+_current = contextvars.ContextVar("qa_trace", default=None)
+
+
+class Trace:
+    """Timing spans recorded while answering one request."""
+
+    def __init__(self, name: str):
+        """
+        Start a trace.
+
+        Args:
+            name: Name of the root operation, e.g. 'process_question'
+        """
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.spans: List[Dict[str, Any]] = []
+        self.profile: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def breakdown(self) -> Dict[str, float]:
+        """
+        Total milliseconds per stage name, in order of first appearance.
+
+        Stages that run once per batch or per ensemble member are summed,
+        so concurrent stages can add up to more than the wall time.
+        """
+        totals = OrderedDict()
+        for span in sorted(self.spans, key=lambda span: span["start"]):
+            totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration_ms"]
+        return dict(totals)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a stage as a span nested under the currently open one.
+
+    Does nothing outside of a traced request, so library functions can be
+    instrumented unconditionally.
+
+    Args:
+        name: Stage name, e.g. 'forward'
+        **attributes: Extra fields stored with the span
+    """
+    current = _current.get()
+    if current is None:
+        yield
+        return
+
+    trace, parent = current
+    # Reserve the id up front so children can point at this span
+    with trace._lock:
+        span_id = len(trace.spans)
+        trace.spans.append(None)
+    token = _current.set((trace, span_id))
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        _current.reset(token)
+        with trace._lock:
+            trace.spans[span_id] = {
+                "trace_id": trace.trace_id,
+                "span_id": span_id,
+                "parent_id": parent,
+                "name": name,
+                "start": start,
+                "duration_ms": duration * 1000,
+                "thread": threading.current_thread().name,
+                **attributes
+            }
+
+
+@contextmanager
+def trace_request(name: str, profile: Optional[str] = None, **attributes):
+    """
+    Trace one request, optionally under a profiler.
+
+    Finished traces are handed to every registered exporter.
+
+    Args:
+        name: Name of the root span
+        profile: None, 'cprofile' or 'torch' to capture a profile of the
+            request in trace.profile
+        **attributes: Extra fields stored with the root span
+
+    Yields:
+        The Trace being recorded
+    """
+    trace = Trace(name)
+    token = _current.set((trace, None))
+    profiler = _start_profiler(profile)
+    try:
+        with span(name, **attributes):
+            yield trace
+    finally:
+        if profiler is not None:
+            trace.profile = _stop_profiler(profile, profiler)
+        _current.reset(token)
+        trace.spans = [recorded for recorded in trace.spans if recorded is not None]
+        for exporter in list(_exporters):
+            try:
+                exporter.export(trace)
+            except Exception as e:
+                logger.error(f"Error exporting trace {trace.trace_id}: {e}")
+
+
+def current_trace() -> Optional[Trace]:
+    """Get the trace of the request being answered in this context, if any."""
+    current = _current.get()
+    return current[0] if current else None
+
+
+def _start_profiler(profile: Optional[str]):
+    """Start the requested profiler, or return None."""
+    if profile is None:
+        return None
+    if profile == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another request is being profiled on a different thread
+            logger.warning("A profiler is already active, skipping cProfile capture")
+            return None
+        return profiler
+    if profile == "torch":
+        import torch
+        profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True)
+        profiler.__enter__()
+        return profiler
+    logger.warning(f"Unknown profiler '{profile}', ignoring")
+    return None
+
+
+def _stop_profiler(profile: str, profiler: Any, limit: int = 30) -> str:
+    """Stop a profiler and render its report as text."""
+    if profile == "cprofile":
+        profiler.disable()
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(limit)
+        return report.getvalue()
+    profiler.__exit__(None, None, None)
+    return profiler.key_averages().table(sort_by="cpu_time_total", row_limit=limit)
+
+
+class JsonLinesExporter:
+    """Appends every span of finished traces to a JSON lines file."""
+
+    def __init__(self, path: str):
+        """
+        Initialize the exporter.
+
+        Args:
+            path: File spans are appended to
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        """Write the spans of a finished trace."""
+        lines = "".join(json.dumps(recorded, default=str) + "\n" for recorded in trace.spans)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+
+class PrometheusExporter:
+    """
+    Aggregates span durations per stage into Prometheus summaries.
+
+    render() returns the text exposition format; serve() exposes it over
+    HTTP for scraping.
+    """
+
+    def __init__(self, prefix: str = "qa"):
+        """
+        Initialize the exporter.
+
+        Args:
+            prefix: Prefix of the exported metric names
+        """
+        self.prefix = prefix
+        self._counts: Dict[str, int] = {}
+        self._sums: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def export(self, trace: Trace):
+        """Add the spans of a finished trace to the totals."""
+        with self._lock:
+            for recorded in trace.spans:
+                stage = recorded["name"]
+                self._counts[stage] = self._counts.get(stage, 0) + 1
+                self._sums[stage] = self._sums.get(stage, 0.0) + recorded["duration_ms"] / 1000
+
+    def render(self) -> str:
+        """Render the totals in the Prometheus text format."""
+        metric = f"{self.prefix}_stage_duration_seconds"
+        lines = [
+            f"# HELP {metric} Time spent in each question answering stage.",
+            f"# TYPE {metric} summary"
+        ]
+        with self._lock:
+            for stage in sorted(self._counts):
+                lines.append(f'{metric}_count{{stage="{stage}"}} {self._counts[stage]}')
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {self._sums[stage]:.6f}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0"):
+        """
+        Serve render() at /metrics from a daemon thread.
+
+        Args:
+            port: Port to listen on
+            host: Interface to bind
+        """
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = exporter.render().encode("utf-8")
+                self.send_response(200 if self.path.startswith("/metrics") else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep scrapes out of the application log
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="qa-metrics").start()
+        logger.info(f"Serving stage metrics on http://{host}:{port}/metrics")
+
+
+# Exporters every finished trace is sent to
+_exporters: List[Any] = []
+_env_configured = False
+_env_lock = threading.Lock()
+
+
+def add_exporter(exporter: Any):
+    """Register an exporter with an export(trace) method."""
+    _exporters.append(exporter)
+
+
+def configure_exporters_from_env(environ: Optional[Dict[str, str]] = None):
+    """
+    Register exporters from environment variables, once per process.
+
+    QA_TRACE_JSONL names a JSON lines file for spans, QA_METRICS_PORT a
+    port to serve Prometheus metrics on.
+    """
+    global _env_configured
+    environ = os.environ if environ is None else environ
+    with _env_lock:
+        if _env_configured:
+            return
+        _env_configured = True
+        if environ.get("QA_TRACE_JSONL"):
+            add_exporter(JsonLinesExporter(environ["QA_TRACE_JSONL"]))
+        if environ.get("QA_METRICS_PORT"):
+            prometheus = PrometheusExporter()
+            prometheus.serve(int(environ["QA_METRICS_PORT"]))
+            add_exporter(prometheus)
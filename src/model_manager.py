@@ -1,52 +1,178 @@
-import torch
+import io
 import os
+import sys
 import logging
-from transformers import AutoTokenizer, AutoModelForQuestionAnswering, pipeline
+import threading
+from collections import OrderedDict
 from typing import Dict, Any, Optional, List, Tuple
 import time
 
+from src.instrumentation import span
+from src.onnx_backend import DEFAULT_OPSET
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Weight formats a model can be loaded in
+PRECISIONS = ("fp32", "fp16", "bf16", "int8")
+
+# Runtimes models can be run with
+BACKENDS = ("torch", "onnx")
+
+# Models at least this large are quantized by the 'auto' policy on CPU
+AUTO_INT8_MIN_SIZE_MB = 400
+
+# Sequence lengths of the dummy forward passes run by warm_up
+DEFAULT_WARMUP_SEQ_LENS = (128, 384)
+
+# Seconds before preload() retries a model whose warm-up failed
+PRELOAD_RETRY_SECONDS = 30
+
+
+def split_model_spec(model_spec: str) -> Tuple[str, str]:
+    """
+    Split a model spec such as 'deepset/roberta-base-squad2@int8'.
+    
+    Args:
+        model_spec: Model identifier, optionally suffixed with @precision
+        
+    Returns:
+        Tuple of (model identifier, precision), precision None if absent
+    """
+    model_name, _, precision = model_spec.rpartition("@")
+    if model_name and precision in PRECISIONS:
+        return model_name, precision
+    return model_spec, None
+
+
 class ModelManager:
     """Manages loading, caching, and optimizing models for question answering."""
     
-    def __init__(self):
-        """Initialize the model manager."""
-        self.models_cache = {}
+    def __init__(
+        self,
+        memory_budget_mb: Optional[float] = None,
+        precision: Optional[str] = None,
+        model_precisions: Optional[Dict[str, str]] = None,
+        backend: Optional[str] = None,
+        onnx_opset: Optional[int] = None,
+        onnx_cache_dir: Optional[str] = None
+    ):
+        """
+        Initialize the model manager.
+        
+        Args:
+            memory_budget_mb: Maximum combined size of cached models in MB.
+                Least recently used models are evicted once it is exceeded.
+                Defaults to the QA_MODEL_MEMORY_BUDGET_MB environment
+                variable, or no limit when unset.
+            precision: Default load mode, one of PRECISIONS or 'auto'.
+                Defaults to the QA_MODEL_PRECISION environment variable,
+                or fp32 when unset.
+            model_precisions: Load mode per model identifier, overriding
+                the default
+            backend: 'torch' for PyTorch eager mode or 'onnx' to export
+                models to ONNX and run them with ONNX Runtime on the CPU.
+                Defaults to the QA_MODEL_BACKEND environment variable, or
+                torch when unset.
+            onnx_opset: Opset ONNX graphs are exported with, defaults to
+                the QA_ONNX_OPSET environment variable or DEFAULT_OPSET
+            onnx_cache_dir: Directory exported graphs are cached in,
+                defaults to the QA_ONNX_CACHE_DIR environment variable
+        """
+        # Caches are kept in least-recently-used order (oldest first)
+        self.models_cache = OrderedDict()
         self.tokenizers_cache = {}
+        self.pipelines_cache = {}
+        self.model_sizes_mb = {}
+        
+        if memory_budget_mb is None and os.environ.get("QA_MODEL_MEMORY_BUDGET_MB"):
+            memory_budget_mb = float(os.environ["QA_MODEL_MEMORY_BUDGET_MB"])
+        self.memory_budget_mb = memory_budget_mb
+        self.precision = precision or os.environ.get("QA_MODEL_PRECISION", "fp32")
+        self.model_precisions = dict(model_precisions or {})
+        self.backend = backend or os.environ.get("QA_MODEL_BACKEND", "torch")
+        if self.backend not in BACKENDS:
+            logger.warning(f"Unknown backend '{self.backend}', using torch")
+            self.backend = "torch"
+        self.onnx_opset = onnx_opset or int(os.environ.get("QA_ONNX_OPSET", DEFAULT_OPSET))
+        self.onnx_cache_dir = onnx_cache_dir
+        self.cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+        
+        # One lock for the cache bookkeeping, one per model for loading
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        self._tokenizer_locks = {}
+        self._background_loads = {}
+        
+        # Warm-up state per model spec and the models readiness waits for
+        self._warmup_status = {}
+        self._preload_targets = []
         
-        # Check for MPS (Metal Performance Shaders) on Apple Silicon
-        self.device = self._get_optimal_device()
-        logger.info(f"Using device: {self.device}")
+        # Optional pool of inference processes, see start_worker_pool
+        self.worker_pool = None
         
-        # Model configurations
+        # Resolved on first use, see the device property
+        self._device = None
+        
+        # Model configurations. 'preload' models are loaded and warmed up
+        # by preload() with dummy inputs of 'warmup_seq_lens' tokens, and
+        # the cascade strategy escalates through the 'cascade' models
         self.available_models = {
             "distilbert-base-uncased-distilled-squad": {
                 "name": "DistilBERT",
                 "description": "Lightweight model, good balance of speed and accuracy",
-                "size_mb": 265
+                "size_mb": 265,
+                "preload": True,
+                "warmup_seq_lens": [128, 384],
+                "cascade": True
             },
             "deepset/roberta-base-squad2": {
                 "name": "RoBERTa Base",
                 "description": "Higher accuracy on SQuAD 2.0 dataset",
-                "size_mb": 480
+                "size_mb": 480,
+                "preload": False,
+                "warmup_seq_lens": [128, 384],
+                "cascade": True
             },
             "bert-large-uncased-whole-word-masking-finetuned-squad": {
                 "name": "BERT Large",
                 "description": "High accuracy but slower performance",
-                "size_mb": 1250
+                "size_mb": 1250,
+                "preload": False,
+                "warmup_seq_lens": [384],
+                "cascade": True
             },
             "google/electra-small-discriminator": {
                 "name": "ELECTRA Small",
                 "description": "Small and fast model",
-                "size_mb": 55
+                "size_mb": 55,
+                "preload": False,
+                "warmup_seq_lens": [128, 384],
+                "cascade": False
             }
         }
     
+    @property
+    def device(self) -> str:
+        """Device models run on, determined when first needed."""
+        if self._device is None:
+            self._device = self._get_optimal_device()
+            logger.info(f"Using device: {self._device}")
+        return self._device
+    
     def _get_optimal_device(self) -> str:
-        """Determine the best available device for inference."""
+        """
+        Determine the best available device for PyTorch inference.
+        
+        ONNX sessions always run on the CPU whatever this returns, so with
+        the ONNX backend it only matters for models that fell back to PyTorch.
+        """
+        # torch and transformers take seconds to import, so every method
+        # imports them on first use and pages or commands that never load
+        # a model don't pay for them
+        import torch
+        
         if torch.cuda.is_available():
             return "cuda"
         elif hasattr(torch, 'mps') and torch.backends.mps.is_available():
@@ -56,71 +182,606 @@ class ModelManager:
             return "cpu"
     
     def get_model_info(self) -> Dict[str, Dict[str, Any]]:
-        """Get information about all available models."""
-        return self.available_models
+        """
+        Get information about all available models.
+        
+        Every entry also reports the precision the model would be loaded
+        in and the precisions and measured sizes currently in the cache.
+        """
+        with self._lock:
+            loaded = {}
+            for model_key in self.models_cache:
+                model_id, precision = split_model_spec(model_key)
+                loaded.setdefault(model_id, {})[precision] = round(self.model_sizes_mb.get(model_key, 0.0), 1)
+        return {
+            model_id: {
+                **info,
+                "precision": self.choose_precision(model_id),
+                "backend": self.backend,
+                "loaded_precisions": loaded.get(model_id, {})
+            }
+            for model_id, info in self.available_models.items()
+        }
+    
+    def choose_precision(self, model_name: str) -> str:
+        """
+        Pick the load mode for a model.
+        
+        A per-model setting wins over the default. The 'auto' policy uses
+        fp16 on CUDA, int8 dynamic quantization for large models on CPU and
+        fp32 otherwise.
+        
+        Args:
+            model_name: HuggingFace model identifier without a precision suffix
+            
+        Returns:
+            One of PRECISIONS
+        """
+        precision = self.model_precisions.get(model_name, self.precision)
+        if precision == "auto":
+            if self.device == "cuda":
+                precision = "fp16"
+            elif self.device == "cpu" and self.available_models.get(model_name, {}).get("size_mb", 0) >= AUTO_INT8_MIN_SIZE_MB:
+                precision = "int8"
+            else:
+                precision = "fp32"
+        if precision not in PRECISIONS:
+            logger.warning(f"Unknown precision '{precision}' for {model_name}, using fp32")
+            precision = "fp32"
+        return precision
+    
+    def resolve_model(self, model_name: str) -> str:
+        """
+        Get the cache key of a model, e.g. 'bert-large-...@int8'.
+        
+        Explicit @precision suffixes are kept, otherwise choose_precision
+        decides. Keys always carry the suffix so resolving is idempotent.
+        
+        Args:
+            model_name: Model identifier, optionally suffixed with @precision
+            
+        Returns:
+            Model spec used as the key of every cache
+        """
+        model_id, precision = split_model_spec(model_name)
+        precision = precision or self.choose_precision(model_id)
+        return f"{model_id}@{precision}"
+    
+    def answer_cache_model(self, model_name: str) -> str:
+        """
+        Get the model part of answer cache keys.
+        
+        That is the resolved spec, plus the backend when it isn't PyTorch,
+        so answers computed at another precision or on another backend
+        are not served after either changes.
+        
+        Args:
+            model_name: Model identifier, optionally suffixed with @precision
+            
+        Returns:
+            Model identifier for AnswerCache.make_key
+        """
+        model_spec = self.resolve_model(model_name)
+        return model_spec if self.backend == "torch" else f"{model_spec}+{self.backend}"
     
     def load_model(self, model_name: str) -> Tuple[Any, Any]:
         """
         Load a model and tokenizer, with caching.
         
+        Each precision of a model is loaded and cached separately.
+        
         Args:
-            model_name: HuggingFace model identifier
+            model_name: HuggingFace model identifier, optionally suffixed
+                with @precision (e.g. '@int8') to force a load mode
             
         Returns:
             Tuple of (model, tokenizer)
         """
+        model_name = self.resolve_model(model_name)
+        
         # Check if already loaded
-        if model_name in self.models_cache:
+        cached = self._get_cached(model_name)
+        if cached:
             logger.info(f"Using cached model: {model_name}")
-            return self.models_cache[model_name], self.tokenizers_cache[model_name]
+            return cached
         
-        # Log loading start time
-        start_time = time.time()
-        logger.info(f"Loading model: {model_name}")
+        # Only one thread loads a given model, the others wait and reuse it
+        with self._load_lock(model_name):
+            cached = self._get_cached(model_name)
+            if cached:
+                logger.info(f"Using cached model: {model_name}")
+                return cached
+            
+            with self._lock:
+                self.cache_stats["misses"] += 1
+            
+            # Log loading start time
+            start_time = time.time()
+            logger.info(f"Loading model: {model_name}")
+            
+            model_id, precision = split_model_spec(model_name)
+            with span("model_load", model=model_name):
+                from transformers import AutoTokenizer
+                
+                # Load tokenizer
+                tokenizer = AutoTokenizer.from_pretrained(model_id)
+                model = self._load_weights(model_id, precision)
+            
+            # Cache the loaded model and tokenizer
+            with self._lock:
+                self.models_cache[model_name] = model
+                self.tokenizers_cache[model_name] = tokenizer
+                self.model_sizes_mb[model_name] = self._measure_size_mb(model_name, model)
+                self._evict_to_budget(keep=model_name)
+            
+            # Log load time
+            load_time = time.time() - start_time
+            logger.info(f"Model loaded in {load_time:.2f} seconds ({self.model_sizes_mb[model_name]:.0f} MB)")
+            
+            return model, tokenizer
+    
+    def _load_weights(self, model_id: str, precision: str) -> Any:
+        """
+        Load model weights in the requested precision on the manager's device.
         
-        # Load tokenizer
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        int8 applies dynamic quantization to the Linear layers, which only
+        runs on CPU; fp16 needs a GPU. Unsupported combinations fall back
+        to fp32. With the ONNX backend, the model's cached ONNX graph is
+        loaded instead, falling back to PyTorch when it can't be exported
+        or run.
+        """
+        if self.backend == "onnx":
+            try:
+                return self._load_onnx(model_id, precision)
+            except Exception as e:
+                # A missing onnxruntime, or a model the exporter can't trace
+                logger.warning(f"ONNX backend unavailable for {model_id} ({e!r}), loading it with PyTorch")
         
-        # Load model with appropriate device settings
-        if self.device == "mps":
-            # For MPS, load to CPU first then transfer
-            model = AutoModelForQuestionAnswering.from_pretrained(model_name)
-            model = model.to(self.device)
-        else:
-            model = AutoModelForQuestionAnswering.from_pretrained(model_name).to(self.device)
+        import torch
+        from transformers import AutoModelForQuestionAnswering
         
-        # Cache the loaded model and tokenizer
-        self.models_cache[model_name] = model
-        self.tokenizers_cache[model_name] = tokenizer
+        if precision == "int8" and self.device != "cpu":
+            logger.warning(f"int8 dynamic quantization needs the CPU, loading {model_id} in fp32 on {self.device}")
+            precision = "fp32"
+        elif precision == "fp16" and self.device == "cpu":
+            logger.warning(f"fp16 is slow or unsupported on CPU, loading {model_id} in fp32")
+            precision = "fp32"
         
-        # Log load time
-        load_time = time.time() - start_time
-        logger.info(f"Model loaded in {load_time:.2f} seconds")
+        dtype = {"fp16": torch.float16, "bf16": torch.bfloat16}.get(precision, torch.float32)
+        model = AutoModelForQuestionAnswering.from_pretrained(model_id, torch_dtype=dtype)
+        if precision == "int8":
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
         
-        return model, tokenizer
+        # For MPS the model is loaded on the CPU first then transferred
+        model = model.to(self.device)
+        model.eval()
+        return model
+    
+    def _load_onnx(self, model_id: str, precision: str) -> Any:
+        """
+        Export a model to ONNX on first use and open an optimized session.
+        
+        int8 runs the dynamically quantized graph; fp16 and bf16 have no
+        ONNX variant and run the fp32 graph.
+        """
+        # Raises ImportError before spending time on an export nothing can run
+        import onnxruntime
+        from src.onnx_backend import OnnxQAModel, export_onnx
+        
+        if precision not in ("fp32", "int8"):
+            logger.warning(f"No {precision} ONNX graph, running {model_id} in fp32")
+            precision = "fp32"
+        path = export_onnx(model_id, precision, self.onnx_opset, self.onnx_cache_dir)
+        return OnnxQAModel(path, name_or_path=model_id)
     
     def get_pipeline(self, model_name: str) -> Any:
         """
-        Create an optimized question-answering pipeline.
+        Get a question-answering pipeline, reusing the cached one if available.
         
         Args:
-            model_name: HuggingFace model identifier
+            model_name: HuggingFace model identifier, optionally suffixed
+                with @precision
             
         Returns:
             HuggingFace pipeline for question answering
         """
+        model_name = self.resolve_model(model_name)
+        with self._lock:
+            if model_name in self.pipelines_cache and model_name in self.models_cache:
+                self.models_cache.move_to_end(model_name)
+                self.cache_stats["hits"] += 1
+                return self.pipelines_cache[model_name]
+        
         model, tokenizer = self.load_model(model_name)
         
         # Create pipeline with loaded model and tokenizer
-        qa_pipeline = pipeline(
-            "question-answering",
-            model=model,
-            tokenizer=tokenizer,
-            device=0 if self.device == "cuda" else -1 if self.device == "cpu" else self.device
-        )
+        with span("pipeline_build", model=model_name):
+            if hasattr(model, "run_numpy"):
+                from src.onnx_backend import OnnxQAPipeline
+                
+                qa_pipeline = OnnxQAPipeline(model, tokenizer, tokenizer_lock=self.tokenizer_lock(model_name))
+            else:
+                from transformers import pipeline
+                
+                qa_pipeline = pipeline(
+                    "question-answering",
+                    model=model,
+                    tokenizer=tokenizer,
+                    device=0 if self.device == "cuda" else -1 if self.device == "cpu" else self.device
+                )
+        
+        with self._lock:
+            # The model may have been evicted while the pipeline was built
+            if model_name in self.models_cache:
+                self.pipelines_cache[model_name] = qa_pipeline
         
         return qa_pipeline
     
+    def load_in_background(self, model_name: str) -> Optional[threading.Thread]:
+        """
+        Start loading a model and its pipeline in a daemon thread.
+        
+        Args:
+            model_name: HuggingFace model identifier
+            
+        Returns:
+            The loading thread, or None if the model is already loaded or loading
+        """
+        model_name = self.resolve_model(model_name)
+        with self._lock:
+            if model_name in self.pipelines_cache or model_name in self._background_loads:
+                return None
+            thread = threading.Thread(
+                target=self._background_load,
+                args=(model_name,),
+                name=f"load-{model_name}",
+                daemon=True
+            )
+            self._background_loads[model_name] = thread
+        thread.start()
+        return thread
+    
+    def is_loaded(self, model_name: str) -> bool:
+        """Check whether a model's pipeline is cached and ready to use."""
+        model_name = self.resolve_model(model_name)
+        with self._lock:
+            return model_name in self.pipelines_cache
+    
+    def _background_load(self, model_name: str):
+        """Thread target for load_in_background."""
+        try:
+            self.get_pipeline(model_name)
+        except Exception as e:
+            logger.error(f"Background load of {model_name} failed: {e}")
+        finally:
+            with self._lock:
+                self._background_loads.pop(model_name, None)
+    
+    def preload_targets(self) -> List[str]:
+        """
+        Get the models preload() loads by default.
+        
+        The QA_PRELOAD_MODELS environment variable, a comma-separated list
+        of model specs (empty for none), overrides the 'preload' flags of
+        available_models.
+        """
+        if "QA_PRELOAD_MODELS" in os.environ:
+            return [name.strip() for name in os.environ["QA_PRELOAD_MODELS"].split(",") if name.strip()]
+        return [model_id for model_id, info in self.available_models.items() if info.get("preload")]
+    
+    def preload(
+        self,
+        model_names: Optional[List[str]] = None,
+        background: bool = True,
+        batch_size: int = 1
+    ) -> Optional[threading.Thread]:
+        """
+        Load and warm up models before the first request needs them.
+        
+        Models are warmed up one at a time. Calling this again, e.g. on a
+        Streamlit rerun, skips models that are warming up or ready, and
+        retries failed ones once PRELOAD_RETRY_SECONDS have passed.
+        
+        Args:
+            model_names: Models to preload, preload_targets() by default
+            background: Run in a daemon thread instead of blocking
+            batch_size: Batch size of the dummy forward passes
+            
+        Returns:
+            The preloading thread, or None if nothing was started in the background
+        """
+        names = self.preload_targets() if model_names is None else model_names
+        targets = []
+        with self._lock:
+            for model_name in (self.resolve_model(name) for name in names):
+                if model_name not in self._preload_targets:
+                    self._preload_targets.append(model_name)
+                status = self._warmup_status.get(model_name)
+                retry = (
+                    status is not None
+                    and status.get("state") == "failed"
+                    and time.time() - status.get("failed_at", 0) >= PRELOAD_RETRY_SECONDS
+                )
+                if status is None or retry:
+                    self._set_warmup_status(model_name, state="pending")
+                    targets.append(model_name)
+        if not targets:
+            return None
+        if not background:
+            self._preload(targets, batch_size)
+            return None
+        thread = threading.Thread(target=self._preload, args=(targets, batch_size), name="preload", daemon=True)
+        thread.start()
+        return thread
+    
+    def _preload(self, model_names: List[str], batch_size: int):
+        """Warm up models in order, logging failures instead of raising."""
+        for model_name in model_names:
+            try:
+                self.warm_up(model_name, batch_size=batch_size)
+            except Exception as e:
+                logger.error(f"Preloading {model_name} failed: {e}")
+    
+    def warm_up(
+        self,
+        model_name: str,
+        seq_lens: Optional[List[int]] = None,
+        batch_size: int = 1,
+        passes: int = 2
+    ) -> Dict[str, Any]:
+        """
+        Load a model and run dummy requests so real ones skip the cold start.
+        
+        Loads the tokenizer and weights and builds the pipeline, then runs
+        forward passes at each sequence length (the first pass pays for
+        kernel selection and allocator growth) and one pipeline call.
+        
+        Args:
+            model_name: Model identifier, optionally suffixed with @precision
+            seq_lens: Dummy input lengths in tokens, defaults to the model's
+                'warmup_seq_lens' or DEFAULT_WARMUP_SEQ_LENS
+            batch_size: Number of sequences per forward pass
+            passes: Forward passes per sequence length
+            
+        Returns:
+            The model's warm-up status with load and warm-up latencies
+        """
+        model_name = self.resolve_model(model_name)
+        model_id, _ = split_model_spec(model_name)
+        if seq_lens is None:
+            seq_lens = self.available_models.get(model_id, {}).get("warmup_seq_lens", DEFAULT_WARMUP_SEQ_LENS)
+        
+        self._set_warmup_status(model_name, state="loading")
+        try:
+            start = time.perf_counter()
+            qa_pipeline = self.get_pipeline(model_name)
+            load_ms = (time.perf_counter() - start) * 1000
+            self._set_warmup_status(model_name, state="warming", load_ms=load_ms)
+            
+            import torch
+            
+            model, tokenizer = self.load_model(model_name)
+            forward = []
+            with span("warm_up", model=model_name):
+                for seq_len in seq_lens:
+                    seq_len = min(seq_len, tokenizer.model_max_length)
+                    with self.tokenizer_lock(model_name):
+                        inputs = tokenizer(
+                            "What is being warmed up?",
+                            "warm up " * seq_len,
+                            truncation="only_second",
+                            max_length=seq_len,
+                            padding="max_length",
+                            return_tensors="pt"
+                        )
+                    inputs = {name: values.repeat(batch_size, 1).to(self.device) for name, values in inputs.items()}
+                    timings = []
+                    for _ in range(passes):
+                        pass_start = time.perf_counter()
+                        with torch.inference_mode():
+                            model(**inputs)
+                        timings.append((time.perf_counter() - pass_start) * 1000)
+                    forward.append({"seq_len": seq_len, "batch_size": batch_size, "first_ms": timings[0], "warm_ms": timings[-1]})
+                
+                pipeline_start = time.perf_counter()
+                with self.tokenizer_lock(model_name):
+                    qa_pipeline(question="What is being warmed up?", context="The model is being warmed up.")
+                pipeline_ms = (time.perf_counter() - pipeline_start) * 1000
+        except Exception as e:
+            self._set_warmup_status(model_name, state="failed", error=str(e), failed_at=time.time())
+            raise
+        
+        warmup_ms = sum(entry["first_ms"] + entry["warm_ms"] * (passes - 1) for entry in forward) + pipeline_ms
+        logger.info(f"Warmed up {model_name} in {warmup_ms:.0f} ms after loading for {load_ms:.0f} ms")
+        return self._set_warmup_status(
+            model_name,
+            state="ready",
+            warmup_ms=warmup_ms,
+            pipeline_ms=pipeline_ms,
+            forward=forward,
+            ready_at=time.time()
+        )
+    
+    def _set_warmup_status(self, model_name: str, **fields) -> Dict[str, Any]:
+        """Update a model's warm-up status and return a copy of it."""
+        with self._lock:
+            status = self._warmup_status.setdefault(model_name, {})
+            if fields.get("state") != "failed":
+                status.pop("error", None)
+            status.update(fields)
+            return dict(status)
+    
+    def is_ready(self) -> bool:
+        """Whether every preloaded model has been warmed up."""
+        return self.readiness()["ready"]
+    
+    def readiness(self) -> Dict[str, Any]:
+        """
+        Get the readiness flag and the warm-up status of every model.
+        
+        Readiness only depends on warm-up having completed: a preloaded
+        model evicted later is reloaded by the next request that needs it,
+        which doesn't make the process unfit to serve.
+        
+        Returns:
+            Dictionary with 'ready' and, per model spec, its warm-up state
+            ('pending', 'loading', 'warming', 'ready' or 'failed'),
+            latencies and whether it is still loaded
+        """
+        with self._lock:
+            models = {
+                model_name: {**status, "loaded": model_name in self.models_cache}
+                for model_name, status in self._warmup_status.items()
+            }
+            ready = all(
+                models.get(model_name, {}).get("state") == "ready"
+                for model_name in self._preload_targets
+            )
+        return {"ready": ready, "preload": list(self._preload_targets), "models": models}
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters and current memory usage.
+        
+        Returns:
+            Dictionary with hits, misses, evictions, cached models and sizes
+        """
+        with self._lock:
+            return {
+                **self.cache_stats,
+                "cached_models": list(self.models_cache.keys()),
+                "cached_size_mb": sum(self.model_sizes_mb.values()),
+                "memory_budget_mb": self.memory_budget_mb
+            }
+    
+    def unload_model(self, model_name: str) -> bool:
+        """
+        Drop a single model and its tokenizer and pipeline from the cache.
+        
+        Args:
+            model_name: HuggingFace model identifier
+            
+        Returns:
+            True if the model was cached
+        """
+        model_name = self.resolve_model(model_name)
+        with self._lock:
+            if model_name not in self.models_cache:
+                return False
+            del self.models_cache[model_name]
+            self.tokenizers_cache.pop(model_name, None)
+            self.pipelines_cache.pop(model_name, None)
+            self.model_sizes_mb.pop(model_name, None)
+        _empty_cuda_cache()
+        return True
+    
+    def tokenizer_lock(self, model_name: str) -> threading.RLock:
+        """
+        Get the lock that guards a model's tokenizer.
+        
+        Fast tokenizers are not thread-safe and cached models are shared
+        between threads, so tokenizer and pipeline calls take this lock.
+        """
+        model_name = self.resolve_model(model_name)
+        with self._lock:
+            return self._tokenizer_locks.setdefault(model_name, threading.RLock())
+    
+    def _get_cached(self, model_name: str) -> Optional[Tuple[Any, Any]]:
+        """Return a cached (model, tokenizer) pair and mark it recently used."""
+        with self._lock:
+            if model_name not in self.models_cache:
+                return None
+            self.models_cache.move_to_end(model_name)
+            self.cache_stats["hits"] += 1
+            return self.models_cache[model_name], self.tokenizers_cache[model_name]
+    
+    def _load_lock(self, model_name: str) -> threading.Lock:
+        """Get the lock that serializes loading of one model."""
+        with self._lock:
+            return self._load_locks.setdefault(model_name, threading.Lock())
+    
+    def _measure_size_mb(self, model_name: str, model: Any) -> float:
+        """
+        Measure the memory used by a model's parameters and buffers.
+        
+        Quantized layers keep their weights in packed parameters outside
+        of parameters(), so int8 models are measured by serializing their
+        state dict. Falls back to the configured size_mb when measuring fails.
+        """
+        model_id, precision = split_model_spec(model_name)
+        try:
+            if hasattr(model, "size_mb"):
+                return model.size_mb()
+            if precision == "int8":
+                import torch
+                
+                buffer = io.BytesIO()
+                torch.save(model.state_dict(), buffer)
+                return buffer.tell() / (1024 * 1024)
+            tensors = list(model.parameters()) + list(model.buffers())
+            return sum(t.numel() * t.element_size() for t in tensors) / (1024 * 1024)
+        except Exception:
+            return float(self.available_models.get(model_id, {}).get("size_mb", 0))
+    
+    def _evict_to_budget(self, keep: str):
+        """
+        Evict least recently used models until the cache fits the budget.
+        
+        Args:
+            keep: Model that must stay cached (usually the one just loaded)
+        """
+        if self.memory_budget_mb is None:
+            return
+        
+        for model_name in list(self.models_cache.keys()):
+            if sum(self.model_sizes_mb.values()) <= self.memory_budget_mb:
+                break
+            if model_name == keep:
+                continue
+            logger.info(f"Evicting model {model_name} to stay within {self.memory_budget_mb} MB")
+            self.unload_model(model_name)
+            self.cache_stats["evictions"] += 1
+    
+    def start_worker_pool(
+        self,
+        num_workers: Optional[int] = None,
+        cores_per_worker: Optional[int] = None,
+        **pool_options
+    ):
+        """
+        Run inference in a pool of worker processes from now on.
+        
+        Workers are pinned to separate cores and map the same safetensors
+        weight files read-only, so each added worker adds throughput but
+        not another copy of the weights. AdvancedQA dispatches its forward
+        passes to the pool once it is running.
+        
+        Args:
+            num_workers: Number of worker processes
+            cores_per_worker: Cores pinned per worker
+            **pool_options: Other InferencePool options
+            
+        Returns:
+            The running InferencePool
+        """
+        from src.worker_pool import InferencePool
+        
+        if self.backend == "onnx":
+            logger.warning("Worker processes run models with PyTorch, the ONNX backend is only used in-process")
+        with self._lock:
+            if self.worker_pool is None:
+                pool = InferencePool(self, num_workers=num_workers, cores_per_worker=cores_per_worker, **pool_options)
+                pool.start()
+                self.worker_pool = pool
+            return self.worker_pool
+    
+    def stop_worker_pool(self):
+        """Stop the worker pool, if any, and go back to in-process inference."""
+        with self._lock:
+            pool, self.worker_pool = self.worker_pool, None
+        if pool is not None:
+            pool.shutdown()
+    
     def get_best_model_for_context_size(self, context_size: int) -> str:
         """
         Recommend the best model based on context size.
@@ -139,9 +800,66 @@ class ModelManager:
         else:
             return "deepset/roberta-base-squad2"  # Better accuracy for smaller contexts
     
+    def get_cascade_models(self, model_name: Optional[str] = None) -> List[str]:
+        """
+        List the models the cascade strategy tries, cheapest first.
+        
+        The cascade starts with model_name and escalates through the
+        'cascade' models of available_models that are larger than it.
+        
+        Args:
+            model_name: First model to try, the smallest cascade model if None
+            
+        Returns:
+            Model names in the order they are tried
+        """
+        tiers = sorted(
+            (name for name, info in self.available_models.items() if info.get("cascade")),
+            key=lambda name: self.available_models[name]["size_mb"]
+        )
+        if model_name is None:
+            return tiers
+        
+        model_id, _ = split_model_spec(model_name)
+        size_mb = self.available_models.get(model_id, {}).get("size_mb", 0)
+        return [model_name] + [name for name in tiers if name != model_id and self.available_models[name]["size_mb"] > size_mb]
+    
     def cleanup(self):
-        """Free memory by clearing model cache."""
-        self.models_cache.clear()
-        self.tokenizers_cache.clear()
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
\ No newline at end of file
+        """Free memory by clearing model cache and stopping the worker pool."""
+        self.stop_worker_pool()
+        with self._lock:
+            self.models_cache.clear()
+            self.tokenizers_cache.clear()
+            self.pipelines_cache.clear()
+            self.model_sizes_mb.clear()
+        _empty_cuda_cache()
+
+
+def _empty_cuda_cache():
+    """Release cached GPU memory, without importing torch if no model was ever loaded."""
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+_shared_manager = None
+_shared_manager_lock = threading.Lock()
+
+
+def get_model_manager() -> ModelManager:
+    """
+    Get the process-wide ModelManager, creating it on first use.
+    
+    A worker pool is started when the QA_WORKER_PROCESSES environment
+    variable sets the number of workers.
+    
+    Returns:
+        Shared ModelManager instance
+    """
+    global _shared_manager
+    with _shared_manager_lock:
+        if _shared_manager is None:
+            _shared_manager = ModelManager()
+            if os.environ.get("QA_WORKER_PROCESSES"):
+                _shared_manager.start_worker_pool(num_workers=int(os.environ["QA_WORKER_PROCESSES"]))
+        return _shared_manager
@@ -0,0 +1,252 @@
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from src.instrumentation import span
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Exported graphs are cached here, per model and opset
+DEFAULT_ONNX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "hf-qa-ml", "onnx")
+
+# ONNX opset the models are exported with
+DEFAULT_OPSET = 17
+
+# Precisions with an ONNX variant, anything else runs the fp32 graph
+ONNX_PRECISIONS = ("fp32", "int8")
+
+# onnx and onnxruntime are optional, they are only imported when the
+# ONNX backend is selected
+
+_export_locks = {}
+_export_locks_lock = threading.Lock()
+
+
+def onnx_model_path(model_id: str, precision: str = "fp32", opset: int = DEFAULT_OPSET, cache_dir: Optional[str] = None) -> str:
+    """File the ONNX graph of a model, opset and precision is cached in."""
+    cache_dir = cache_dir or os.environ.get("QA_ONNX_CACHE_DIR", DEFAULT_ONNX_DIR)
+    filename = "model.int8.onnx" if precision == "int8" else "model.onnx"
+    return os.path.join(cache_dir, re.sub(r"[^\w.-]+", "--", model_id.strip("/")), f"opset{opset}", filename)
+
+
+def _export_lock(path: str) -> threading.Lock:
+    """Get the lock that serializes exporting one graph."""
+    with _export_locks_lock:
+        return _export_locks.setdefault(path, threading.Lock())
+
+
+def export_onnx(model_id: str, precision: str = "fp32", opset: int = DEFAULT_OPSET, cache_dir: Optional[str] = None) -> str:
+    """
+    Export a question answering model to ONNX, once.
+
+    The fp32 graph is traced from the PyTorch model with dynamic batch and
+    sequence axes. The int8 variant quantizes its MatMul weights with
+    ONNX Runtime's dynamic quantization, like the torch int8 mode does
+    for Linear layers. Both are written to a temporary file and renamed,
+    so readers never see a partial graph, and reused on later calls.
+
+    Args:
+        model_id: HuggingFace model identifier
+        precision: 'fp32' or 'int8'
+        opset: ONNX opset to export with
+        cache_dir: Directory of the graph cache, defaults to the
+            QA_ONNX_CACHE_DIR environment variable or ~/.cache
+
+    Returns:
+        Path of the cached graph
+    """
+    if precision not in ONNX_PRECISIONS:
+        raise ValueError(f"No ONNX variant for precision '{precision}', expected one of {ONNX_PRECISIONS}")
+    path = onnx_model_path(model_id, precision, opset, cache_dir)
+    if os.path.exists(path):
+        return path
+
+    with _export_lock(path):
+        if os.path.exists(path):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if precision == "int8":
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            fp32_path = export_onnx(model_id, "fp32", opset, cache_dir)
+            with span("onnx_quantize", model=model_id):
+                logger.info(f"Quantizing {fp32_path} to int8")
+                quantize_dynamic(fp32_path, path + ".tmp", weight_type=QuantType.QInt8)
+            os.replace(path + ".tmp", path)
+            return path
+
+        import torch
+        from transformers import AutoModelForQuestionAnswering, AutoTokenizer
+
+        with span("onnx_export", model=model_id, opset=opset):
+            logger.info(f"Exporting {model_id} to ONNX opset {opset} at {path}")
+            tokenizer = AutoTokenizer.from_pretrained(model_id)
+            model = AutoModelForQuestionAnswering.from_pretrained(model_id, torch_dtype=torch.float32)
+            model.eval()
+            inputs = tokenizer("What is exported?", "The model is exported.", return_tensors="pt")
+            input_names = [name for name in tokenizer.model_input_names if name in inputs]
+            output_names = ["start_logits", "end_logits"]
+            with torch.inference_mode():
+                torch.onnx.export(
+                    model,
+                    ({name: inputs[name] for name in input_names},),
+                    path + ".tmp",
+                    input_names=input_names,
+                    output_names=output_names,
+                    dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + output_names},
+                    opset_version=opset,
+                    do_constant_folding=True,
+                    dynamo=False
+                )
+            os.replace(path + ".tmp", path)
+        return path
+
+
+class OnnxQAModel:
+    """
+    An exported question answering model run by ONNX Runtime on the CPU.
+
+    Called like the PyTorch model it was exported from, so warm-up code
+    and BatchedChunkEngine use either one; run_numpy skips the tensor
+    conversions.
+    """
+
+    def __init__(self, path: str, name_or_path: str = "", intra_op_threads: Optional[int] = None):
+        """
+        Create an inference session with every graph optimization enabled.
+
+        Args:
+            path: ONNX graph file
+            name_or_path: Identifier of the source model
+            intra_op_threads: Threads per operator, ONNX Runtime's default
+                (one per physical core) if None
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.path = path
+        self.name_or_path = name_or_path
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def run_numpy(self, inputs: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run one batch.
+
+        Args:
+            inputs: int64 arrays by input name, inputs the graph does not
+                take are ignored
+
+        Returns:
+            Tuple of (start_logits, end_logits) as float32 NumPy arrays
+        """
+        feed = {name: np.asarray(inputs[name], dtype=np.int64) for name in self.input_names if name in inputs}
+        start_logits, end_logits = self.session.run(["start_logits", "end_logits"], feed)
+        return start_logits, end_logits
+
+    def __call__(self, **inputs) -> Any:
+        """Run torch tensors through the graph and return a transformers model output."""
+        import torch
+        from transformers.modeling_outputs import QuestionAnsweringModelOutput
+
+        start_logits, end_logits = self.run_numpy({
+            name: values.cpu().numpy() if isinstance(values, torch.Tensor) else values
+            for name, values in inputs.items()
+        })
+        return QuestionAnsweringModelOutput(
+            start_logits=torch.from_numpy(start_logits),
+            end_logits=torch.from_numpy(end_logits)
+        )
+
+    def size_mb(self) -> float:
+        """Size of the graph file, which holds all the weights."""
+        return os.path.getsize(self.path) / (1024 * 1024)
+
+
+class OnnxQAPipeline:
+    """
+    Question answering with the call interface of the transformers pipeline.
+
+    Contexts longer than one window are split into overlapping windows
+    and decoded by BatchedChunkEngine, as the pipeline does.
+    """
+
+    def __init__(
+        self,
+        model: OnnxQAModel,
+        tokenizer: Any,
+        max_seq_len: int = 384,
+        doc_stride: int = 128,
+        max_answer_len: int = 15,
+        tokenizer_lock: Optional[Any] = None
+    ):
+        """
+        Initialize the pipeline.
+
+        Args:
+            model: The ONNX model
+            tokenizer: Matching fast tokenizer
+            max_seq_len: Maximum tokens per window
+            doc_stride: Token overlap between windows
+            max_answer_len: Maximum answer length in tokens
+            tokenizer_lock: Lock guarding the shared tokenizer
+        """
+        from src.chunk_engine import BatchedChunkEngine
+
+        self.model = model
+        self.tokenizer = tokenizer
+        self._engine_options = {
+            "max_seq_len": max_seq_len,
+            "doc_stride": doc_stride,
+            "max_answer_len": max_answer_len,
+            "tokenizer_lock": tokenizer_lock
+        }
+        self._engine = BatchedChunkEngine(model, tokenizer, device="cpu", **self._engine_options)
+
+    def __call__(
+        self,
+        question: str,
+        context: str,
+        top_k: int = 1,
+        **kwargs
+    ) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Answer a question about a context.
+
+        Args:
+            question: The question to answer
+            context: The context text
+            top_k: Number of answers returned
+            **kwargs: max_answer_len, max_seq_len or doc_stride overrides
+
+        Returns:
+            Dictionary with score, start, end and answer, or a list of up
+            to top_k of them, best first, when top_k > 1
+        """
+        engine = self._engine
+        if kwargs or top_k > engine.top_k:
+            from src.chunk_engine import BatchedChunkEngine
+
+            options = {**self._engine_options, **{name: kwargs[name] for name in ("max_answer_len", "max_seq_len", "doc_stride") if name in kwargs}}
+            engine = BatchedChunkEngine(self.model, self.tokenizer, device="cpu", top_k=max(top_k, engine.top_k), **options)
+
+        results = engine.answer(question, [context])
+        if top_k == 1:
+            # Like the pipeline, the best span of the best scoring window
+            best = results[0] if results else {"score": 0.0, "start": 0, "end": 0, "answer": ""}
+            return {name: best[name] for name in ("score", "start", "end", "answer")}
+        candidates = results[0]["candidates"] if results else []
+        return [
+            {name: candidate[name] for name in ("score", "start", "end", "answer")}
+            for candidate in sorted(candidates, key=lambda candidate: candidate["score"], reverse=True)[:top_k]
+        ]
@@ -1,7 +1,11 @@
 import argparse
 import logging
-from transformers import pipeline
+import os
 from src.utils import chunk_text
+from src.model_manager import get_model_manager
+from src.answer_cache import AnswerCache
+from src.retrieval import BM25Index
+from src.batch_qa import run_batch
 
 # Set up logging for better visibility during execution.
 logging.basicConfig(level=logging.INFO)
@@ -10,9 +14,12 @@ logger = logging.getLogger(__name__)
 def load_qa_pipeline(model_name="distilbert-base-uncased-distilled-squad"):
     """
     Load the Hugging Face question-answering pipeline using the specified model.
+    
+    Pipelines come from the process-wide ModelManager, so each model is only
+    loaded once per process.
     """
     logger.info(f"Loading QA pipeline with model: {model_name}")
-    return pipeline("question-answering", model=model_name)
+    return get_model_manager().get_pipeline(model_name)
 
 def get_answer(qa_pipeline, question, context):
     """
@@ -28,23 +35,44 @@ def get_answer(qa_pipeline, question, context):
         logger.error(f"Error during QA inference: {e}")
         return None
 
-def process_question(qa_pipeline, question, context):
+def process_question(model_name, question, context, answer_cache=None, top_k=None):
     """
     Process the question by checking if the context needs chunking.
     
     If the context is long (more than 300 words), it splits it into chunks,
     runs the QA pipeline on each, and returns the answer with the highest score.
+    With top_k set, only the top_k chunks ranked by BM25 are read. When an
+    AnswerCache is given, repeated questions are served from it and the
+    model is only loaded on a miss.
     
     Returns:
         dict: The best result found.
     """
+    if answer_cache is None:
+        return _process_question(load_qa_pipeline(model_name), question, context, top_k)
+    
+    # Keyed by model, precision and backend, so the lookup needs no model
+    cache_key = answer_cache.make_key(get_model_manager().answer_cache_model(model_name), f"qa_app-top{top_k}", question, context)
+    result = answer_cache.get(cache_key)
+    if result is None:
+        result = _process_question(load_qa_pipeline(model_name), question, context, top_k)
+        if result:
+            answer_cache.put(cache_key, result)
+    return result
+
+def _process_question(qa_pipeline, question, context, top_k=None):
+    """Answer the question, chunking long contexts (see process_question)."""
     words = context.split()
     if len(words) > 300:
         logger.info("Context is long; splitting into chunks...")
         chunks = chunk_text(context, max_words=300)
+        selected = BM25Index(chunks).top_k(question, top_k) if top_k else None
+        if selected is None:
+            selected = range(len(chunks))
         best_result = None
         best_score = 0
-        for idx, chunk in enumerate(chunks):
+        for idx in selected:
+            chunk = chunks[idx]
             result = get_answer(qa_pipeline, question, chunk)
             if result and result["score"] > best_score:
                 best_score = result["score"]
@@ -54,13 +82,67 @@ def process_question(qa_pipeline, question, context):
     else:
         return get_answer(qa_pipeline, question, context)
 
+def answer_questions(questions, context, model_name, answer_cache=None, top_k=None):
+    """
+    Answer several questions about one context in shared forward passes
+    and print every answer.
+    """
+    from src.advanced_qa import AdvancedQA
+
+    advanced_qa = AdvancedQA(get_model_manager(), answer_cache=answer_cache, retrieval_top_k=top_k)
+    batch = advanced_qa.process_questions(questions, context, model_name=model_name)
+    for question, result in zip(questions, batch["results"]):
+        print(f"Question: {question}")
+        if result:
+            print(f"Answer: {result['answer']}")
+            print(f"Score: {result['score']:.4f}")
+        else:
+            print("No answer found.")
+        print()
+    print(f"Answered {len(questions)} questions in {batch['processing_time']:.2f}s")
+
 def main():
     parser = argparse.ArgumentParser(description="Advanced Question-Answering System")
     parser.add_argument("--context", type=str, help="Path to a text file with context")
-    parser.add_argument("--question", type=str, required=True, help="The question to ask")
+    parser.add_argument("--question", type=str, action="append", help="The question to ask (repeat to ask several about the same context)")
+    parser.add_argument("--questions-file", type=str, help="Text file with one question per line, all about the same context")
     parser.add_argument("--model", type=str, default="distilbert-base-uncased-distilled-squad", help="Name of the model to use")
+    parser.add_argument("--cache-db", type=str, default=os.environ.get("QA_ANSWER_CACHE_DB"), help="SQLite file for the persistent answer cache")
+    parser.add_argument("--cache-ttl", type=float, default=None, help="Seconds before cached answers expire")
+    parser.add_argument("--top-k", type=int, default=None, help="Only read the top K chunks ranked by BM25")
+    batch_group = parser.add_argument_group("batch mode")
+    batch_group.add_argument("--batch-input", type=str, help="JSONL or CSV file of questions (with context or context_file) to answer in one run")
+    batch_group.add_argument("--output", type=str, default="results.jsonl", help="JSONL file batch results are appended to")
+    batch_group.add_argument("--strategy", type=str, default="auto", help="Strategy for batch mode: auto, direct, chunked or cascade")
+    batch_group.add_argument("--batch-size", type=int, default=8, help="Chunk windows per forward pass in batch mode")
+    batch_group.add_argument("--workers", type=int, default=1, help="Documents processed concurrently in batch mode")
+    batch_group.add_argument("--resume-from", type=int, default=0, help="Skip batch requests before this input offset")
+    batch_group.add_argument("--resume", action="store_true", help="Skip batch requests already answered in the output file, retrying failed ones")
     args = parser.parse_args()
 
+    answer_cache = AnswerCache(db_path=args.cache_db, ttl_seconds=args.cache_ttl) if args.cache_db else None
+
+    if args.batch_input:
+        run_batch(
+            args.batch_input,
+            args.output,
+            model_name=args.model,
+            strategy=args.strategy,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            resume_from=args.resume_from,
+            resume=args.resume,
+            answer_cache=answer_cache,
+            retrieval_top_k=args.top_k
+        )
+        return
+    questions = list(args.question or [])
+    if args.questions_file:
+        with open(args.questions_file, "r", encoding="utf-8") as f:
+            questions.extend(line.strip() for line in f if line.strip())
+    if not questions:
+        parser.error("--question is required unless --batch-input is given")
+
     # Load context either from a file or use a default context.
     if args.context:
         try:
@@ -73,11 +155,14 @@ def main():
         context = ("Artificial intelligence (AI) is intelligence demonstrated by machines, "
                    "as opposed to natural intelligence displayed by humans.")
 
-    qa = load_qa_pipeline(args.model)
-    result = process_question(qa, args.question, context)
+    if len(questions) > 1:
+        answer_questions(questions, context, args.model, answer_cache, args.top_k)
+        return
+
+    result = process_question(args.model, questions[0], context, answer_cache, args.top_k)
 
     if result:
-        print(f"Question: {args.question}")
+        print(f"Question: {questions[0]}")
         print(f"Answer: {result['answer']}")
         print(f"Score: {result['score']:.4f}")
         if "chunk_index" in result:
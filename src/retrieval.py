@@ -0,0 +1,106 @@
+import logging
+import re
+from collections import Counter, defaultdict
+from typing import List, Optional
+
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Common words that carry no signal for picking a chunk
+STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from has have how in is it its "
+    "of on or that the their there this to was were what when where which who "
+    "whom whose why will with".split()
+)
+
+
+def tokenize_terms(text: str) -> List[str]:
+    """Lowercase a text and split it into index terms, dropping stopwords."""
+    return [term for term in re.findall(r'\w+', text.lower()) if term not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Lexical BM25 index over a list of chunks.
+
+    Postings are stored per term as NumPy arrays of chunk ids and term
+    frequencies, so scoring a question only touches the chunks that
+    contain its terms.
+    """
+
+    def __init__(self, chunks: List[str], k1: float = 1.5, b: float = 0.75):
+        """
+        Build the index.
+
+        Args:
+            chunks: Chunks to index, in document order
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        self.num_chunks = len(chunks)
+        self.k1 = k1
+        self.b = b
+
+        postings = defaultdict(lambda: ([], []))
+        lengths = np.zeros(self.num_chunks, dtype=np.float32)
+        for chunk_id, chunk in enumerate(chunks):
+            terms = tokenize_terms(chunk)
+            lengths[chunk_id] = len(terms)
+            for term, count in Counter(terms).items():
+                postings[term][0].append(chunk_id)
+                postings[term][1].append(count)
+
+        avg_length = lengths.mean() if self.num_chunks else 0.0
+        self._length_norm = k1 * (1 - b + b * lengths / avg_length) if avg_length else np.full(self.num_chunks, k1)
+        self._postings = {
+            term: (np.array(chunk_ids, dtype=np.int32), np.array(counts, dtype=np.float32))
+            for term, (chunk_ids, counts) in postings.items()
+        }
+
+    def score(self, question: str) -> np.ndarray:
+        """
+        Score every chunk against a question.
+
+        Args:
+            question: The question text
+
+        Returns:
+            Array of BM25 scores, one per chunk
+        """
+        scores = np.zeros(self.num_chunks, dtype=np.float32)
+        for term in set(tokenize_terms(question)):
+            if term not in self._postings:
+                continue
+            chunk_ids, counts = self._postings[term]
+            idf = np.log(1 + (self.num_chunks - len(chunk_ids) + 0.5) / (len(chunk_ids) + 0.5))
+            scores[chunk_ids] += idf * counts * (self.k1 + 1) / (counts + self._length_norm[chunk_ids])
+        return scores
+
+    def top_k(self, question: str, k: int, flat_ratio: float = 1.5) -> Optional[List[int]]:
+        """
+        Select the chunks most likely to contain the answer.
+
+        Args:
+            question: The question text
+            k: Number of chunks to keep
+            flat_ratio: The best score must be at least this many times the
+                mean score, otherwise the scores are considered flat
+
+        Returns:
+            Indices of the top-k chunks in document order, or None when the
+            scores are too flat to trust and every chunk should be read
+        """
+        if self.num_chunks <= k:
+            return None
+
+        scores = self.score(question)
+        best = float(scores.max())
+        if best <= 0 or best < flat_ratio * float(scores.mean()):
+            logger.info("Retrieval scores are flat, falling back to a full scan")
+            return None
+
+        selected = np.argpartition(-scores, k)[:k]
+        return sorted(int(index) for index in selected if scores[index] > 0)
@@ -0,0 +1,490 @@
+import argparse
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Any, Optional
+
+from aiohttp import web
+
+from src.advanced_qa import AdvancedQA, get_advanced_qa
+from src.improved_utils import rank_answers
+from src.model_manager import PRELOAD_RETRY_SECONDS
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the batch size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class ServerMetrics:
+    """Counters exported by the server's /metrics endpoint."""
+
+    def __init__(self):
+        self.requests = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.cache_hits = 0
+        self.request_seconds = 0.0
+        self.batches = 0
+        self.batch_items = 0
+        self.batch_seconds = 0.0
+        self.batch_size_buckets = {bound: 0 for bound in BATCH_SIZE_BUCKETS}
+
+    def observe_batch(self, size: int, seconds: float):
+        """Record one micro-batch run by an inference worker."""
+        self.batches += 1
+        self.batch_items += size
+        self.batch_seconds += seconds
+        for bound in BATCH_SIZE_BUCKETS:
+            if size <= bound:
+                self.batch_size_buckets[bound] += 1
+
+    def render(self, batchers: Dict[str, "MicroBatcher"]) -> str:
+        """Render the counters and current queue depths in the Prometheus text format."""
+        lines = [
+            "# TYPE qa_server_requests_total counter",
+            f"qa_server_requests_total {self.requests}",
+            "# TYPE qa_server_rejected_total counter",
+            f"qa_server_rejected_total {self.rejected}",
+            "# TYPE qa_server_timeouts_total counter",
+            f"qa_server_timeouts_total {self.timeouts}",
+            "# TYPE qa_server_cache_hits_total counter",
+            f"qa_server_cache_hits_total {self.cache_hits}",
+            "# TYPE qa_server_request_seconds_total counter",
+            f"qa_server_request_seconds_total {self.request_seconds:.6f}",
+            "# TYPE qa_server_batch_seconds_total counter",
+            f"qa_server_batch_seconds_total {self.batch_seconds:.6f}",
+            "# TYPE qa_server_batch_size histogram",
+        ]
+        for bound in BATCH_SIZE_BUCKETS:
+            lines.append(f'qa_server_batch_size_bucket{{le="{bound}"}} {self.batch_size_buckets[bound]}')
+        lines += [
+            f'qa_server_batch_size_bucket{{le="+Inf"}} {self.batches}',
+            f"qa_server_batch_size_sum {self.batch_items}",
+            f"qa_server_batch_size_count {self.batches}",
+            "# TYPE qa_server_queue_depth gauge",
+        ]
+        for model_name, batcher in batchers.items():
+            lines.append(f'qa_server_queue_depth{{model="{model_name}"}} {batcher.queue.qsize()}')
+        lines.append("# TYPE qa_server_pending_items gauge")
+        for model_name, batcher in batchers.items():
+            lines.append(f'qa_server_pending_items{{model="{model_name}"}} {batcher.pending}')
+        return "\n".join(lines) + "\n"
+
+
+class MicroBatcher:
+    """
+    Collects (question, chunk) items for one model and answers them in
+    shared forward passes on a dedicated inference thread.
+
+    A batch is closed once it holds max_batch_size items or max_wait_ms has
+    passed since its first item arrived, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        engine: Any,
+        metrics: ServerMetrics,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        max_queue: int = 1024
+    ):
+        """
+        Initialize the batcher. start() must be called from the event loop.
+
+        Args:
+            model_name: Model the items are answered with
+            engine: BatchedChunkEngine for that model
+            metrics: Server metrics to record batches in
+            max_batch_size: Maximum items per micro-batch
+            max_wait_ms: Maximum time the first item waits for company
+            max_queue: Maximum items queued or being answered before new
+                requests are rejected
+        """
+        self.model_name = model_name
+        self.engine = engine
+        self.metrics = metrics
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.pending = 0  # Items queued or in the running batch
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the batching loop on the running event loop."""
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop and the inference thread."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def try_submit(self, question: str, chunks: List[str], encoded: List[Any]) -> Optional[List[asyncio.Future]]:
+        """
+        Queue one item per chunk unless the queue is full.
+        
+        A document with more chunks than max_queue is still admitted when
+        nothing else is queued, so large documents are not rejected on
+        every retry.
+
+        Args:
+            question: The question to answer
+            chunks: Context chunks
+            encoded: Encoded chunks from the engine
+
+        Returns:
+            One future per chunk resolving to its answer dictionary (or
+            None), or None if the request was rejected for backpressure
+        """
+        if self.pending and self.pending + len(chunks) > self.max_queue:
+            return None
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for chunk, encoded_chunk in zip(chunks, encoded):
+            future = loop.create_future()
+            self.queue.put_nowait((question, chunk, encoded_chunk, future))
+            futures.append(future)
+        self.pending += len(chunks)
+        return futures
+
+    async def _run(self):
+        """Form micro-batches and hand them to the inference thread."""
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(items) < self.max_batch_size:
+                if not self.queue.empty():
+                    items.append(self.queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Requests that timed out meanwhile cancelled their futures
+            live = [item for item in items if not item[3].done()]
+            try:
+                if live:
+                    start = time.perf_counter()
+                    results = await loop.run_in_executor(
+                        self._executor,
+                        self.engine.answer_batch,
+                        [(question, [chunk], [encoded]) for question, chunk, encoded, _ in live]
+                    )
+                    self.metrics.observe_batch(len(live), time.perf_counter() - start)
+                    for (_, _, _, future), chunk_results in zip(live, results):
+                        if not future.done():
+                            future.set_result(chunk_results[0] if chunk_results else None)
+            except Exception as e:
+                logger.error(f"Batch of {len(live)} items for {self.model_name} failed: {e}")
+                for _, _, _, future in live:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                self.pending -= len(items)
+
+
+class QAServer:
+    """HTTP/JSON question answering server with dynamic request batching."""
+
+    def __init__(
+        self,
+        advanced_qa: AdvancedQA,
+        default_model: str = "distilbert-base-uncased-distilled-squad",
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        max_queue: int = 1024,
+        request_timeout: float = 30.0,
+        max_words: int = 300,
+        overlap: int = 50
+    ):
+        """
+        Initialize the server.
+
+        Args:
+            advanced_qa: AdvancedQA whose model manager, document cache and
+                answer cache are used
+            default_model: Model for requests that don't name one
+            max_batch_size: Maximum (question, chunk) items per forward pass
+            max_wait_ms: Maximum time an item waits for a batch to fill
+            max_queue: Items queued per model before requests get a 503
+            request_timeout: Seconds before a request gets a 504
+            max_words: Maximum words per chunk, unless advanced_qa packs
+                chunks by tokens
+            overlap: Word overlap between chunks, likewise
+        """
+        self.advanced_qa = advanced_qa
+        self.default_model = default_model
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue = max_queue
+        self.request_timeout = request_timeout
+        self.max_words = max_words
+        self.overlap = overlap
+        self.metrics = ServerMetrics()
+        self.batchers: Dict[str, MicroBatcher] = {}
+        self._batcher_lock: Optional[asyncio.Lock] = None
+        self._warmup_task: Optional[asyncio.Task] = None
+        self._warmed_up = False
+
+    def make_app(self) -> web.Application:
+        """Build the aiohttp application."""
+        app = web.Application()
+        app.add_routes([
+            web.post("/answer", self.handle_answer),
+            web.get("/health", self.handle_health),
+            web.get("/ready", self.handle_ready),
+            web.get("/metrics", self.handle_metrics),
+        ])
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def handle_answer(self, request: web.Request) -> web.Response:
+        """
+        Answer {"question": ..., "context": ..., "model": optional}.
+
+        Responds with the best answer, its character offsets in the context
+        and processing metadata.
+        """
+        start_time = time.time()
+        self.metrics.requests += 1
+        try:
+            body = await request.json()
+        except ValueError:
+            return web.json_response({"error": "Request body must be JSON"}, status=400)
+        question = body.get("question")
+        context = body.get("context")
+        if not isinstance(question, str) or not question.strip() or not isinstance(context, str) or not context.strip():
+            return web.json_response({"error": "'question' and 'context' must be non-empty strings"}, status=400)
+        model_name = body.get("model") or self.default_model
+
+        try:
+            result = await self._answer(question, context, model_name)
+        except asyncio.TimeoutError:
+            self.metrics.timeouts += 1
+            return web.json_response({"error": "Timed out waiting for the model"}, status=504)
+        except Exception as e:
+            logger.error(f"Error answering request: {e}")
+            return web.json_response({"error": str(e)}, status=500)
+        finally:
+            self.metrics.request_seconds += time.time() - start_time
+
+        if result is None:
+            self.metrics.rejected += 1
+            return web.json_response(
+                {"error": "Server is busy, retry later"},
+                status=503,
+                headers={"Retry-After": "1"}
+            )
+        result["processing_time"] = time.time() - start_time
+        return web.json_response(result)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """Report liveness and the models with a running batcher."""
+        return web.json_response({"status": "ok", "models": list(self.batchers)})
+
+    async def handle_ready(self, request: web.Request) -> web.Response:
+        """Report whether the preloaded models are warmed up, with a 503 until they are."""
+        readiness = self.advanced_qa.model_manager.readiness()
+        readiness["ready"] = readiness["ready"] and self._warmed_up
+        return web.json_response(readiness, status=200 if readiness["ready"] else 503)
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        """Expose request, batch and queue metrics for Prometheus."""
+        return web.Response(text=self.metrics.render(self.batchers), content_type="text/plain")
+
+    async def _answer(self, question: str, context: str, model_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Answer one request through the model's micro-batcher.
+
+        Returns:
+            Answer dictionary, or None if the request was rejected
+        """
+        answer_cache = self.advanced_qa.answer_cache
+        cache_key = None
+        if answer_cache is not None:
+            cache_key = answer_cache.make_key(
+                self.advanced_qa.model_manager.answer_cache_model(model_name),
+                self.advanced_qa._cache_strategy("served"),
+                question,
+                context
+            )
+            cached = answer_cache.get(cache_key)
+            if cached is not None:
+                self.metrics.cache_hits += 1
+                cached["cache_hit"] = True
+                return cached
+
+        loop = asyncio.get_running_loop()
+        batcher = await self._get_batcher(model_name)
+        if batcher is None:
+            # No fast tokenizer, so no batching: answer on a worker thread
+            result = await asyncio.wait_for(
+                loop.run_in_executor(
+                    None,
+                    partial(self.advanced_qa.process_question, question, context, model_name, allow_ensemble=False)
+                ),
+                self.request_timeout
+            )
+            return result or {"answer": "", "score": 0.0, "start": 0, "end": 0, "model_used": model_name}
+
+        # Preprocessing and tokenization are memoized per document
+        document = self.advanced_qa.documents.get(context)
+        chunks, encoded, token_chunks, selected = await loop.run_in_executor(None, self._prepare, question, document, batcher)
+        futures = batcher.try_submit(question, chunks, encoded)
+        if futures is None:
+            return None
+
+        try:
+            chunk_results = await asyncio.wait_for(asyncio.gather(*futures), self.request_timeout)
+        except asyncio.TimeoutError:
+            for future in futures:
+                future.cancel()
+            raise
+
+        all_results = []
+        for position, chunk_result in enumerate(chunk_results):
+            if chunk_result is not None:
+                # Point chunk_index back at the full chunk list
+                chunk_result["chunk_index"] = selected[position]
+                all_results.append(chunk_result)
+        document.map_to_context(all_results, self.max_words, self.overlap, token_chunks)
+        ranked = rank_answers(all_results)
+
+        result = dict(ranked[0]) if ranked else {"answer": "", "score": 0.0, "start": 0, "end": 0}
+        result.update({
+            "model_used": model_name,
+            "strategy_used": "batched",
+            "chunks_processed": len(chunks),
+        })
+        if cache_key is not None and ranked:
+            answer_cache.put(cache_key, result)
+        return result
+
+    def _prepare(self, question: str, document: Any, batcher: MicroBatcher):
+        """
+        Get the chunks of a document to read and their encodings for a batcher's model.
+
+        With retrieval enabled, only the chunks AdvancedQA selects for the
+        question are returned.
+
+        Returns:
+            Tuple of (chunks, encodings, token chunks or None when the
+            word chunks are used, indexes of the chunks in the full list)
+        """
+        token_chunks = self.advanced_qa.token_chunks_for(question, document, batcher.model_name, batcher.engine)
+        if token_chunks is not None:
+            chunks, encoded = token_chunks.chunks, token_chunks.encoded
+        else:
+            chunks = document.chunks(self.max_words, self.overlap)
+            encoded = document.encoded_chunks(batcher.model_name, batcher.engine, self.max_words, self.overlap)
+        selected = self.advanced_qa._select_chunks(question, document, len(chunks), token_chunks, self.max_words, self.overlap)
+        return [chunks[idx] for idx in selected], [encoded[idx] for idx in selected], token_chunks, selected
+
+    async def _get_batcher(self, model_name: str) -> Optional[MicroBatcher]:
+        """Get or start the micro-batcher of a model, loading it off the event loop."""
+        if model_name in self.batchers:
+            return self.batchers[model_name]
+        if self._batcher_lock is None:
+            self._batcher_lock = asyncio.Lock()
+        async with self._batcher_lock:
+            if model_name not in self.batchers:
+                loop = asyncio.get_running_loop()
+                engine = await loop.run_in_executor(None, self.advanced_qa.make_engine, model_name)
+                if engine is None:
+                    return None
+                # One micro-batch per forward pass
+                engine.batch_size = self.max_batch_size
+                batcher = MicroBatcher(
+                    model_name,
+                    engine,
+                    self.metrics,
+                    max_batch_size=self.max_batch_size,
+                    max_wait_ms=self.max_wait_ms,
+                    max_queue=self.max_queue
+                )
+                batcher.start()
+                self.batchers[model_name] = batcher
+                logger.info(f"Started micro-batcher for {model_name}")
+            return self.batchers[model_name]
+
+    async def _on_startup(self, app: web.Application):
+        """Start warming up in the background so /health answers while models load."""
+        self._warmup_task = asyncio.create_task(self._warm_up())
+
+    async def _warm_up(self):
+        """
+        Load and warm up the default and preloaded models, then start the default batcher.
+        
+        Models that fail to warm up are retried every PRELOAD_RETRY_SECONDS
+        until they are ready.
+        """
+        model_manager = self.advanced_qa.model_manager
+        model_names = [self.default_model] + model_manager.preload_targets()
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                # Warm up at the batch size the micro-batcher will run
+                await loop.run_in_executor(
+                    None,
+                    partial(model_manager.preload, model_names, background=False, batch_size=self.max_batch_size)
+                )
+                if not self._warmed_up:
+                    await self._get_batcher(self.default_model)
+                    self._warmed_up = True
+            except Exception as e:
+                logger.error(f"Warm-up failed: {e}")
+            if model_manager.is_ready():
+                return
+            await asyncio.sleep(PRELOAD_RETRY_SECONDS)
+
+    async def _on_cleanup(self, app: web.Application):
+        """Stop warming up and every batcher."""
+        if self._warmup_task is not None and not self._warmup_task.done():
+            self._warmup_task.cancel()
+        for batcher in self.batchers.values():
+            await batcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Question answering HTTP server with dynamic batching")
+    parser.add_argument("--host", type=str, default="0.0.0.0", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--model", type=str, default="distilbert-base-uncased-distilled-squad", help="Default model")
+    parser.add_argument("--max-batch-size", type=int, default=16, help="Maximum (question, chunk) items per forward pass")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Maximum time an item waits for a batch to fill")
+    parser.add_argument("--max-queue", type=int, default=1024, help="Queued items per model before requests are rejected")
+    parser.add_argument("--request-timeout", type=float, default=30.0, help="Seconds before a request times out")
+    args = parser.parse_args()
+
+    server = QAServer(
+        get_advanced_qa(),
+        default_model=args.model,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_queue=args.max_queue,
+        request_timeout=args.request_timeout
+    )
+    web.run_app(server.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
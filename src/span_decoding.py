@@ -0,0 +1,225 @@
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Logit given to tokens outside the context, as the pipeline does
+_MASKED_LOGIT = -10000.0
+
+
+class DecodedWindows(NamedTuple):
+    """Top-k answer spans of every window in a batch, best first."""
+    starts: np.ndarray  # (windows, k) start token positions
+    ends: np.ndarray  # (windows, k) end token positions, inclusive
+    span_logits: np.ndarray  # (windows, k) start + end logits, -inf where there is no span
+    scores: np.ndarray  # (windows, k) start * end probabilities within the window
+    start_lse: np.ndarray  # (windows,) log-sum-exp of the window's start logits
+    end_lse: np.ndarray  # (windows,) log-sum-exp of the window's end logits
+
+
+def _logsumexp(values: np.ndarray, axis: int) -> np.ndarray:
+    """Numerically stable log(sum(exp(values))) along an axis."""
+    peak = values.max(axis=axis, keepdims=True)
+    peak = np.where(np.isfinite(peak), peak, 0.0)
+    return np.log(np.exp(values - peak).sum(axis=axis)) + peak.squeeze(axis)
+
+
+def decode_windows(
+    start_logits: np.ndarray,
+    end_logits: np.ndarray,
+    context_mask: np.ndarray,
+    cls_mask: np.ndarray,
+    max_answer_len: int = 15,
+    top_k: int = 1
+) -> DecodedWindows:
+    """
+    Find the top-k valid answer spans of every window in one vectorized pass.
+
+    Scores follow the HuggingFace pipeline: logits outside the context are
+    masked, start and end logits are softmaxed per window with CLS taking
+    part, and a span scores the product of its start and end probabilities.
+    Only spans inside the context of at most max_answer_len tokens are
+    valid. Spans are scored along a (windows, start, length) band instead
+    of the full (windows, start, end) square.
+
+    Args:
+        start_logits (np.ndarray): (windows, tokens) start logits
+        end_logits (np.ndarray): (windows, tokens) end logits
+        context_mask (np.ndarray): (windows, tokens) True on context tokens
+        cls_mask (np.ndarray): (windows, tokens) True on the CLS token
+        max_answer_len (int): Maximum answer length in tokens
+        top_k (int): Number of spans kept per window
+
+    Returns:
+        DecodedWindows: The spans and the windows' log partitions, which
+            calibrate_scores uses to compare spans across windows
+    """
+    allowed = context_mask | cls_mask
+    start = np.where(allowed, start_logits, _MASKED_LOGIT).astype(np.float64)
+    end = np.where(allowed, end_logits, _MASKED_LOGIT).astype(np.float64)
+    start_lse = _logsumexp(start, axis=1)
+    end_lse = _logsumexp(end, axis=1)
+
+    # Span logits of every start position and length
+    num_windows, seq_len = start.shape
+    lengths = min(max_answer_len, seq_len)
+    end_positions = np.arange(seq_len)[:, None] + np.arange(lengths)[None, :]
+    inside = end_positions < seq_len
+    end_positions = np.minimum(end_positions, seq_len - 1)
+    valid = context_mask[:, :, None] & context_mask[:, end_positions] & inside
+    span_logits = np.where(valid, start[:, :, None] + end[:, end_positions], -np.inf).reshape(num_windows, -1)
+
+    # Unordered top k per window, then sorted best first
+    k = min(top_k, span_logits.shape[1])
+    top = np.argpartition(-span_logits, k - 1, axis=1)[:, :k]
+    top_logits = np.take_along_axis(span_logits, top, axis=1)
+    order = np.argsort(-top_logits, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_logits = np.take_along_axis(top_logits, order, axis=1)
+
+    starts, offsets = np.divmod(top, lengths)
+    scores = np.exp(top_logits - start_lse[:, None] - end_lse[:, None])
+    return DecodedWindows(starts, starts + offsets, top_logits, scores, start_lse, end_lse)
+
+
+def calibrate_scores(span_logits: np.ndarray, start_lse: float, end_lse: float) -> np.ndarray:
+    """
+    Turn span logits into probabilities over a shared partition.
+
+    Softmax scores of different windows each sum to one within their own
+    window, so they can't be compared. Normalizing by the start and end
+    partitions summed over every window (shared normalization) gives
+    probabilities over all spans of the document instead. For a single
+    window they are equal to the pipeline's scores, but they shrink with
+    the number of windows, so they only order spans and are not shown as
+    a confidence.
+
+    Args:
+        span_logits (np.ndarray): Start + end logits of the spans
+        start_lse (float): Log of the start partition of all windows
+        end_lse (float): Log of the end partition of all windows
+
+    Returns:
+        np.ndarray: Calibrated span probabilities
+    """
+    return np.exp(np.asarray(span_logits, dtype=np.float64) - start_lse - end_lse)
+
+
+def log_partition(results: List[Dict[str, Any]]) -> Optional[Tuple[float, float]]:
+    """
+    Combine the start and end log partitions of chunk results.
+
+    Args:
+        results (List[Dict]): Chunk results of BatchedChunkEngine
+
+    Returns:
+        Optional[Tuple[float, float]]: (start, end) log partitions, None if
+            no result has them
+    """
+    partitions = np.array([(result["start_lse"], result["end_lse"]) for result in results if "start_lse" in result])
+    if len(partitions) == 0:
+        return None
+    return float(np.logaddexp.reduce(partitions[:, 0])), float(np.logaddexp.reduce(partitions[:, 1]))
+
+
+def dedupe_spans(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    limit: Optional[int] = None,
+    groups: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Pick spans best first, dropping every span that overlaps a picked one.
+
+    Only the picked spans are compared against, so with a limit the scan
+    usually stops after a few spans however many there are.
+
+    Args:
+        starts (np.ndarray): Span start offsets, sorted best span first
+        ends (np.ndarray): End-exclusive span end offsets
+        limit (Optional[int]): Stop after picking this many spans
+        groups (Optional[np.ndarray]): Only spans of the same group can
+            overlap, for offsets relative to different texts
+
+    Returns:
+        np.ndarray: Indexes of the picked spans
+    """
+    # Empty spans overlap the spans around them
+    ends = np.maximum(ends, np.asarray(starts) + 1)
+    groups = np.zeros(len(ends), dtype=np.int64) if groups is None else np.asarray(groups)
+    picked = []
+    for index, (start, end, group) in enumerate(zip(np.asarray(starts).tolist(), ends.tolist(), groups.tolist())):
+        if limit is not None and len(picked) >= limit:
+            break
+        if not any(
+            group == picked_group and start < picked_end and picked_start < end
+            for picked_start, picked_end, picked_group, _ in picked
+        ):
+            picked.append((start, end, group, index))
+    return np.array([index for _, _, _, index in picked], dtype=np.int64)
+
+
+def top_k_answers(
+    answers: List[Dict[str, Any]],
+    top_k: int = 3,
+    partition: Optional[Tuple[float, float]] = None,
+    chunk_relative: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Rank answer spans of many chunks on one calibrated scale.
+
+    Every chunk's candidate spans are pooled, ordered by their probability
+    over the partition of all chunks and deduplicated, so spans found
+    twice in the overlap of neighbouring chunks or windows count once.
+    An answer without 'candidates' takes part as a single span, so it
+    still needs its 'span_logit'; plain pipeline results have none and
+    are sorted by rank_answers instead.
+
+    Args:
+        answers (List[Dict]): Chunk results of BatchedChunkEngine, with
+            'candidates', 'span_logit', 'start_lse' and 'end_lse'
+        top_k (int): Number of answers returned
+        partition (Optional[Tuple[float, float]]): (start, end) log
+            partitions to score against, log_partition(answers) if None
+        chunk_relative (bool): Whether offsets are relative to each chunk
+            instead of mapped to the whole context, so only spans of the
+            same chunk can be duplicates
+
+    Returns:
+        List[Dict]: Up to top_k answers, best first. 'score' stays the
+            within-window probability that confidence thresholds and the
+            UI use, the calibrated one that ordered them is 'doc_score'
+    """
+    pooled = []
+    for answer in answers:
+        for candidate in answer.get("candidates", [answer]):
+            pooled.append({
+                "score": candidate["score"],
+                "start": candidate["start"],
+                "end": candidate["end"],
+                "answer": candidate["answer"],
+                "span_logit": candidate["span_logit"],
+                "chunk_index": answer.get("chunk_index"),
+            })
+            if "context_chunk" in answer:
+                pooled[-1]["context_chunk"] = answer["context_chunk"]
+    if not pooled:
+        return []
+
+    partition = partition or log_partition(answers)
+    scores = calibrate_scores([candidate["span_logit"] for candidate in pooled], *partition)
+    order = np.argsort(-scores, kind="stable")
+    starts = np.array([pooled[index]["start"] for index in order])
+    ends = np.array([pooled[index]["end"] for index in order])
+    groups = np.array([pooled[index]["chunk_index"] for index in order]) if chunk_relative else None
+
+    ranked = []
+    for index in order[dedupe_spans(starts, ends, top_k, groups)].tolist():
+        answer = pooled[index]
+        answer["doc_score"] = float(scores[index])
+        ranked.append(answer)
+    return ranked
@@ -0,0 +1,176 @@
+"""
+Startup-time report for the application's entry points.
+
+Imports every entry point in a fresh interpreter with `-X importtime`,
+reports the wall time and the slowest imports, and fails when an
+entry point exceeds its budget or imports a dependency that should only be
+loaded with a model:
+
+    python -m src.startup
+    python -m src.startup --entry cli --budget-ms 800 --top 15
+
+Also installs the NLTK punkt data at build time, so nothing is downloaded
+while serving requests:
+
+    python -m src.startup --download-nltk
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+from typing import Dict, List, Any
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules each entry point imports before it can serve anything
+ENTRY_POINTS = {
+    "cli": ["src.qa_app"],
+    "server": ["src.server"],
+    "app": [
+        "streamlit",
+        "components.home",
+        "components.history",
+        "components.help",
+        "components.about",
+        "src.model_manager",
+        "src.advanced_qa",
+        "src.answer_cache",
+        "src.instrumentation",
+    ],
+}
+
+# Startup budget per entry point in milliseconds, overridable with --budget-ms
+DEFAULT_BUDGETS_MS = {"cli": 1000, "server": 1500, "app": 3000}
+
+# Dependencies that must not be imported until a model is loaded
+DEFERRED_MODULES = ("torch", "transformers", "safetensors", "nltk")
+
+NLTK_PACKAGES = ("punkt", "punkt_tab")
+
+
+def measure_imports(modules: List[str]) -> Dict[str, Any]:
+    """
+    Import modules in a fresh interpreter and collect its import times.
+
+    Args:
+        modules: Module names imported in order
+
+    Returns:
+        Dictionary with the wall time in ms, the -X importtime records and
+        the deferred modules that were imported anyway
+    """
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"for name in {modules!r}:\n"
+        "    __import__(name)\n"
+        "elapsed = (time.perf_counter() - start) * 1000\n"
+        f"loaded = [name for name in {list(DEFERRED_MODULES)!r} if name in sys.modules]\n"
+        "print(json.dumps({'wall_ms': elapsed, 'loaded': loaded}))\n"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        env=dict(os.environ, PYTHONPATH=REPO_ROOT)
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "import failed")
+
+    records = []
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        records.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    summary = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {"wall_ms": summary["wall_ms"], "deferred_loaded": summary["loaded"], "imports": records}
+
+
+def report(entry: str, budget_ms: float, top: int, interpreter_modules: frozenset = frozenset()) -> bool:
+    """
+    Print the startup report of one entry point.
+
+    Args:
+        entry: Name in ENTRY_POINTS
+        budget_ms: Maximum wall time of the imports
+        top: Number of slowest imports listed
+        interpreter_modules: Modules imported by a bare interpreter, left
+            out of the listing
+
+    Returns:
+        True if the entry point is within budget and defers heavy imports
+    """
+    try:
+        result = measure_imports(ENTRY_POINTS[entry])
+    except RuntimeError as e:
+        print(f"{entry}: could not be imported ({e})")
+        return False
+
+    within_budget = result["wall_ms"] <= budget_ms
+    status = "ok" if within_budget and not result["deferred_loaded"] else "FAIL"
+    print(f"\n{entry}: {result['wall_ms']:.0f} ms (budget {budget_ms:.0f} ms) {status}")
+    if result["deferred_loaded"]:
+        print(f"  imported at startup, should be deferred: {', '.join(result['deferred_loaded'])}")
+
+    # The entry modules and what they import directly, slowest first
+    slowest = sorted(
+        (
+            record for record in result["imports"]
+            if record["depth"] <= 1 and record["module"] not in interpreter_modules
+        ),
+        key=lambda record: record["cumulative_ms"],
+        reverse=True
+    )
+    print(f"  {'cumulative ms':>13} {'self ms':>9}  module")
+    for record in slowest[:top]:
+        indent = "  " * record["depth"]
+        print(f"  {record['cumulative_ms']:>13.1f} {record['self_ms']:>9.1f}  {indent}{record['module']}")
+    return status == "ok"
+
+
+def download_nltk_data():
+    """Install the NLTK sentence tokenizer data, for image builds."""
+    import nltk
+
+    for package in NLTK_PACKAGES:
+        if not nltk.download(package, quiet=True):
+            raise RuntimeError(f"Could not download NLTK package {package}")
+        logger.info(f"Installed NLTK package {package}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import times of the entry points")
+    parser.add_argument("--entry", action="append", choices=sorted(ENTRY_POINTS), help="Entry point to check (repeatable); defaults to all")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Startup budget in ms, instead of the per-entry defaults")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports shown")
+    parser.add_argument("--download-nltk", action="store_true", help="Install the NLTK punkt data and exit")
+    args = parser.parse_args()
+
+    if args.download_nltk:
+        download_nltk_data()
+        return
+
+    interpreter_modules = frozenset(record["module"] for record in measure_imports([])["imports"])
+    ok = True
+    for entry in args.entry or list(ENTRY_POINTS):
+        budget_ms = args.budget_ms if args.budget_ms is not None else DEFAULT_BUDGETS_MS[entry]
+        ok = report(entry, budget_ms, args.top, interpreter_modules) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,507 @@
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import re
+import struct
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+
+import torch
+from transformers import AutoConfig, AutoModelForQuestionAnswering, AutoTokenizer
+
+from src.chunk_engine import BatchedChunkEngine, EncodedContext
+from src.model_manager import split_model_spec
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Where shared weight files are written
+DEFAULT_SHARED_DIR = os.path.join(os.path.expanduser("~"), ".cache", "hf-qa-ml", "shared")
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+TORCH_DTYPES = {"fp16": torch.float16, "bf16": torch.bfloat16}
+
+# Seconds between checks that the workers are still alive
+HEALTH_CHECK_INTERVAL = 1.0
+
+
+def mmap_safetensors(path: str) -> Dict[str, torch.Tensor]:
+    """
+    Map a safetensors file into memory without copying it.
+
+    The file is mapped copy-on-write, so every process mapping it shares
+    the same page cache pages until it writes to a tensor.
+
+    Args:
+        path: Path of a .safetensors file
+
+    Returns:
+        Dictionary of tensors backed by the mapping
+    """
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    data_start = 8 + header_size
+
+    storage = torch.UntypedStorage.from_file(path, False, os.path.getsize(path))
+    raw = torch.empty(0, dtype=torch.uint8).set_(storage)
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        start, end = info["data_offsets"]
+        data = raw[data_start + start:data_start + end]
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        try:
+            tensor = data.view(dtype)
+        except RuntimeError:
+            tensor = data.clone().view(dtype)  # Misaligned offset, copy this one tensor
+        tensors[name] = tensor.reshape(info["shape"])
+    return tensors
+
+
+def worker_precision(precision: Optional[str]) -> str:
+    """
+    Precision workers load a model in.
+
+    Workers run on the CPU, so fp16 falls back to fp32 as it does in
+    ModelManager._load_weights.
+    """
+    return "fp32" if precision in (None, "fp16") else precision
+
+
+def shared_weights_path(model_spec: str, shared_dir: str) -> str:
+    """File the shared weights of a model spec are stored in."""
+    model_id, precision = split_model_spec(model_spec)
+    precision = worker_precision(precision)
+    # int8 workers quantize fp32 weights themselves
+    stored = "fp32" if precision == "int8" else precision
+    return os.path.join(shared_dir, re.sub(r"[^\w.-]+", "--", model_id.strip("/")) + f"@{stored}.safetensors")
+
+
+def load_shared_model(model_spec: str, weights_path: str) -> Any:
+    """
+    Build a model whose parameters live in a memory-mapped weights file.
+
+    int8 models are quantized from the mapped fp32 weights in every
+    worker, so their quantized weights are private to each worker and
+    only fp32, fp16 and bf16 weights are shared.
+
+    Args:
+        model_spec: Model identifier with @precision suffix
+        weights_path: File written by InferencePool.prepare_weights
+
+    Returns:
+        Model in eval mode
+    """
+    model_id, precision = split_model_spec(model_spec)
+    precision = worker_precision(precision)
+    config = AutoConfig.from_pretrained(model_id)
+    try:
+        from transformers.modeling_utils import no_init_weights
+    except ImportError:  # Older transformers, initialize and overwrite
+        from contextlib import nullcontext as no_init_weights
+    with no_init_weights():
+        model = AutoModelForQuestionAnswering.from_config(config, torch_dtype=TORCH_DTYPES.get(precision, torch.float32))
+
+    # assign=True makes the parameters views of the mapping instead of copies
+    missing, unexpected = model.load_state_dict(mmap_safetensors(weights_path), strict=False, assign=True)
+    if unexpected:
+        raise ValueError(f"Unexpected weights in {weights_path}: {unexpected[:5]}")
+    model.tie_weights()
+
+    # Without initialization, a weight missing from the file would be
+    # whatever was in memory. Only tied weights and buffers may be missing.
+    state = model.state_dict()
+    buffers = {name for name, _ in model.named_buffers()}
+    loaded = {state[name].data_ptr() for name in state if name not in missing}
+    untied = [name for name in missing if name not in buffers and state[name].data_ptr() not in loaded]
+    if untied:
+        raise ValueError(f"Weights missing from {weights_path}: {untied[:5]}")
+    model.eval()
+    if precision == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def _worker_main(
+    worker_id: int,
+    cores: List[int],
+    task_queue: Any,
+    result_queue: Any,
+    engine_options: Dict[str, Any]
+):
+    """Process target: answer tasks until a None task arrives."""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(max(1, len(cores)))
+
+    engines = {}
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, model_spec, weights_path, requests = task
+        # Lets the pool fail this task if the process dies while running it
+        result_queue.put((task_id, "started", worker_id))
+        try:
+            if model_spec not in engines:
+                model_id, _ = split_model_spec(model_spec)
+                engines[model_spec] = BatchedChunkEngine(
+                    load_shared_model(model_spec, weights_path),
+                    AutoTokenizer.from_pretrained(model_id),
+                    **engine_options
+                )
+            result_queue.put((task_id, "ok", engines[model_spec].answer_batch(requests)))
+        except Exception as e:
+            result_queue.put((task_id, "error", f"Worker {worker_id} failed on {model_spec}: {e!r}"))
+
+
+class InferencePool:
+    """
+    Pool of inference processes sharing memory-mapped model weights.
+
+    Every worker is pinned to its own slice of cores and sets its torch
+    thread count to match, so workers don't compete for the same cores.
+    Weights are written once to a safetensors file and mapped by every
+    worker, so the weights are in RAM once however many workers run
+    (except for int8, which every worker quantizes into its own memory).
+
+    A worker that dies, e.g. when it is OOM-killed, fails the task it was
+    running and is restarted, up to max_restarts times.
+    """
+
+    def __init__(
+        self,
+        model_manager: Any,
+        num_workers: Optional[int] = None,
+        cores_per_worker: Optional[int] = None,
+        shared_dir: Optional[str] = None,
+        batch_size: int = 8,
+        max_seq_len: int = 384,
+        task_timeout: Optional[float] = 300.0,
+        max_restarts: int = 3
+    ):
+        """
+        Initialize the pool. Workers start on start().
+
+        Args:
+            model_manager: ModelManager used to resolve model precisions
+            num_workers: Number of processes, defaults to one per 4 cores
+            cores_per_worker: Cores pinned per worker, defaults to an even
+                split of the cores this process may run on
+            shared_dir: Directory for shared weight files, defaults to the
+                QA_SHARED_WEIGHTS_DIR environment variable or ~/.cache
+            batch_size: Number of token windows per forward pass
+            max_seq_len: Maximum tokens per window
+            task_timeout: Seconds PooledEngine waits for a task before
+                giving up, None to wait forever
+            max_restarts: Times each worker is restarted after dying
+                before it is removed from the pool
+        """
+        self.model_manager = model_manager
+        available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+        self.num_workers = num_workers or max(1, len(available) // 4)
+        cores_per_worker = cores_per_worker or max(1, len(available) // self.num_workers)
+        # Slices wrap around when there are more workers than cores
+        self.worker_cores = [
+            [available[(worker * cores_per_worker + i) % len(available)] for i in range(cores_per_worker)]
+            for worker in range(self.num_workers)
+        ]
+        self.shared_dir = shared_dir or os.environ.get("QA_SHARED_WEIGHTS_DIR", DEFAULT_SHARED_DIR)
+        self.engine_options = {"batch_size": batch_size, "max_seq_len": max_seq_len}
+        self.task_timeout = task_timeout
+        self.max_restarts = max_restarts
+
+        self._context = multiprocessing.get_context("spawn")  # Forking a process using torch threads is unsafe
+        self._task_queue = None
+        self._result_queue = None
+        self._workers = []
+        self._futures: Dict[int, Future] = {}
+        self._running: Dict[int, int] = {}  # task id -> worker id
+        self._restarts = [0] * self.num_workers
+        self._closing = False
+        self._task_ids = itertools.count()
+        self._tokenizers = {}
+        self._weights = {}
+        self._weight_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._collector = None
+
+    def start(self):
+        """Start the worker processes and the result collector thread."""
+        self._task_queue = self._context.Queue()
+        self._result_queue = self._context.Queue()
+        self._closing = False
+        self._workers = [self._start_worker(worker_id) for worker_id in range(self.num_workers)]
+        self._collector = threading.Thread(target=self._collect_results, name="qa-pool-results", daemon=True)
+        self._collector.start()
+        logger.info(f"Started {self.num_workers} inference workers pinned to {self.worker_cores}")
+
+    def _start_worker(self, worker_id: int) -> Any:
+        """Start the process of one worker on its cores."""
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, self.worker_cores[worker_id], self._task_queue, self._result_queue, self.engine_options),
+            name=f"qa-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def shutdown(self):
+        """Stop the workers and fail any request still waiting."""
+        with self._lock:
+            self._closing = True
+            workers = [process for process in self._workers if process is not None]
+        for _ in workers:
+            self._task_queue.put(None)
+        for process in workers:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._workers = []
+        if self._result_queue is not None:
+            self._result_queue.put(None)  # Stops the collector
+        with self._lock:
+            for future in self._futures.values():
+                if not future.done():
+                    future.set_exception(RuntimeError("Inference pool shut down"))
+            self._futures.clear()
+            self._running.clear()
+
+    def prepare_weights(self, model_spec: str) -> str:
+        """
+        Write a model's weights to its shared safetensors file if needed.
+
+        The model is loaded in this process only while the file is written,
+        and concurrent calls for one model spec write it once.
+
+        Returns:
+            Path of the weights file
+        """
+        with self._lock:
+            if model_spec in self._weights:
+                return self._weights[model_spec]
+            spec_lock = self._weight_locks.setdefault(model_spec, threading.Lock())
+
+        with spec_lock:
+            path = shared_weights_path(model_spec, self.shared_dir)
+            if not os.path.exists(path):
+                from safetensors.torch import save_model
+                model_id, precision = split_model_spec(model_spec)
+                if precision == "fp16":
+                    logger.warning(f"Workers run on the CPU, sharing {model_id} in fp32 instead of fp16")
+                logger.info(f"Writing shared weights for {model_spec} to {path}")
+                model = AutoModelForQuestionAnswering.from_pretrained(
+                    model_id,
+                    torch_dtype=TORCH_DTYPES.get(worker_precision(precision), torch.float32)
+                )
+                os.makedirs(self.shared_dir, exist_ok=True)
+                # Write to a file of our own then rename, so workers never
+                # map a partial file even if another process writes too
+                fd, tmp_path = tempfile.mkstemp(dir=self.shared_dir, prefix=os.path.basename(path) + ".", suffix=".tmp")
+                os.close(fd)
+                try:
+                    save_model(model, tmp_path)
+                    os.replace(tmp_path, path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                del model
+
+            with self._lock:
+                self._weights[model_spec] = path
+        return path
+
+    def tokenizer(self, model_spec: str) -> Any:
+        """Get the tokenizer of a model, which is all this process loads."""
+        with self._lock:
+            if model_spec not in self._tokenizers:
+                model_id, _ = split_model_spec(model_spec)
+                self._tokenizers[model_spec] = AutoTokenizer.from_pretrained(model_id)
+            return self._tokenizers[model_spec]
+
+    def engine(self, model_name: str, batch_size: int = 8, max_seq_len: int = 384) -> Optional["PooledEngine"]:
+        """
+        Get an engine that tokenizes here and runs the model in the pool.
+
+        Returns:
+            The engine, or None if the model has no fast tokenizer
+        """
+        model_spec = self.model_manager.resolve_model(model_name)
+        tokenizer = self.tokenizer(model_spec)
+        if not getattr(tokenizer, "is_fast", False):
+            return None
+        return PooledEngine(
+            self,
+            model_spec,
+            tokenizer,
+            batch_size=batch_size,
+            max_seq_len=max_seq_len,
+            tokenizer_lock=self.model_manager.tokenizer_lock(model_spec)
+        )
+
+    def submit(
+        self,
+        model_spec: str,
+        requests: Sequence[Tuple[str, List[str], List[EncodedContext]]]
+    ) -> Future:
+        """
+        Queue requests for the next free worker.
+
+        Args:
+            model_spec: Resolved model spec
+            requests: Arguments for BatchedChunkEngine.answer_batch
+
+        Returns:
+            Future resolving to the answer_batch result
+        """
+        if not any(process is not None and process.is_alive() for process in self._workers):
+            raise RuntimeError("Inference pool has no live workers")
+        weights_path = self.prepare_weights(model_spec)
+        future = Future()
+        task_id = next(self._task_ids)
+        with self._lock:
+            self._futures[task_id] = future
+        self._task_queue.put((task_id, model_spec, weights_path, list(requests)))
+        return future
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the pool layout and the number of requests in flight."""
+        with self._lock:
+            return {
+                "workers": len(self._workers),
+                "alive": sum(process is not None and process.is_alive() for process in self._workers),
+                "restarts": list(self._restarts),
+                "worker_cores": self.worker_cores,
+                "in_flight": len(self._futures),
+                "shared_weights": dict(self._weights),
+            }
+
+    def _collect_results(self):
+        """Thread target: resolve futures as workers report back and watch for dead workers."""
+        while True:
+            try:
+                message = self._result_queue.get(timeout=HEALTH_CHECK_INTERVAL)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if message is None:
+                break
+            task_id, status, payload = message
+            with self._lock:
+                if status == "started":
+                    if task_id in self._futures:
+                        self._running[task_id] = payload
+                    continue
+                self._running.pop(task_id, None)
+                future = self._futures.pop(task_id, None)
+            # Futures whose caller timed out are already cancelled
+            if future is None or future.done():
+                continue
+            if status == "ok":
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def _check_workers(self):
+        """Fail the tasks of workers that died and restart them."""
+        with self._lock:
+            if self._closing:
+                return
+            for worker_id, process in enumerate(self._workers):
+                if process is None or process.is_alive():
+                    continue
+                failed = [task_id for task_id, running_on in self._running.items() if running_on == worker_id]
+                logger.error(f"Worker {worker_id} exited with code {process.exitcode}, failing {len(failed)} tasks")
+                for task_id in failed:
+                    del self._running[task_id]
+                    future = self._futures.pop(task_id, None)
+                    if future is not None and not future.done():
+                        future.set_exception(RuntimeError(f"Worker {worker_id} exited with code {process.exitcode}"))
+
+                if self._restarts[worker_id] < self.max_restarts:
+                    self._restarts[worker_id] += 1
+                    self._workers[worker_id] = self._start_worker(worker_id)
+                    logger.info(f"Restarted worker {worker_id} ({self._restarts[worker_id]}/{self.max_restarts})")
+                    continue
+
+                # Out of restarts: remove the worker, and fail everything
+                # once no worker is left to take queued tasks
+                self._workers[worker_id] = None
+                logger.error(f"Worker {worker_id} removed after {self.max_restarts} restarts")
+                if all(worker is None for worker in self._workers):
+                    for future in self._futures.values():
+                        if not future.done():
+                            future.set_exception(RuntimeError("Every inference worker died"))
+                    self._futures.clear()
+                    self._running.clear()
+
+
+class PooledEngine(BatchedChunkEngine):
+    """
+    BatchedChunkEngine whose forward passes run in an InferencePool.
+
+    Contexts are tokenized in the calling process, so documents keep their
+    memoized encodings, and the chunks are split into one shard per worker.
+    """
+
+    def __init__(self, pool: InferencePool, model_spec: str, tokenizer: Any, **engine_options):
+        super().__init__(None, tokenizer, **engine_options)
+        self.pool = pool
+        self.model_spec = model_spec
+
+    def answer_batch(
+        self,
+        requests: Sequence[Tuple[str, List[str], Optional[List[EncodedContext]]]]
+    ) -> List[List[Dict[str, Any]]]:
+        """Answer requests in the pool, spread over all of its workers."""
+        items = []
+        for request_index, (question, chunks, encoded) in enumerate(requests):
+            if encoded is None:
+                encoded = self.encode_contexts(chunks)
+            items += [(request_index, question, chunk_index, chunks[chunk_index], encoded[chunk_index]) for chunk_index in range(len(chunks))]
+
+        # Contiguous shards, one per worker, each sent as one task
+        shard_size = max(1, -(-len(items) // self.pool.num_workers))
+        shards = [items[start:start + shard_size] for start in range(0, len(items), shard_size)]
+        futures = [
+            self.pool.submit(self.model_spec, [(question, [chunk], [encoded]) for _, question, _, chunk, encoded in shard])
+            for shard in shards
+        ]
+
+        # One deadline for the whole request, however many shards it has
+        deadline = None if self.pool.task_timeout is None else time.monotonic() + self.pool.task_timeout
+        results = [[] for _ in requests]
+        for shard, future in zip(shards, futures):
+            try:
+                shard_results = future.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                for pending in futures:
+                    pending.cancel()
+                raise RuntimeError(f"Inference pool did not answer within {self.pool.task_timeout} seconds")
+            for (request_index, _, chunk_index, _, _), chunk_results in zip(shard, shard_results):
+                for chunk_result in chunk_results:
+                    chunk_result["chunk_index"] = chunk_index
+                    results[request_index].append(chunk_result)
+        return results
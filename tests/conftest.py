@@ -0,0 +1,26 @@
+import pytest
+
+WORDS = ["what", "is", "the", "model", "exported", "to", "onnx", "a", "graph", "of", "weights", "runs", "on", "cpu", "."]
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    """A tiny randomly initialized BERT question answering checkpoint."""
+    import torch
+    from transformers import BertConfig, BertForQuestionAnswering, BertTokenizerFast
+
+    torch.manual_seed(0)
+    vocab_file = tmp_path / "vocab.txt"
+    vocab_file.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS) + "\n")
+    config = BertConfig(
+        vocab_size=5 + len(WORDS),
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        max_position_embeddings=512
+    )
+    path = tmp_path / "tiny-bert"
+    BertForQuestionAnswering(config).save_pretrained(path)
+    BertTokenizerFast(vocab_file=str(vocab_file)).save_pretrained(path)
+    return str(path)
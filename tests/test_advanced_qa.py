@@ -0,0 +1,37 @@
+import numpy as np
+
+from src.advanced_qa import AdvancedQA, get_advanced_qa
+from src.model_manager import ModelManager
+
+
+def test_shared_instance_keeps_documents():
+    advanced_qa = get_advanced_qa()
+    document = advanced_qa.documents.get("The answer is forty two.")
+
+    # A Streamlit rerun gets the same instance and the cached document
+    assert get_advanced_qa() is advanced_qa
+    assert get_advanced_qa().documents.get("The answer is forty two.") is document
+
+
+def test_chunked_answer_lists_alternates(checkpoint):
+    advanced_qa = AdvancedQA(ModelManager())
+    context = " ".join(["the model is exported to onnx . a graph of weights runs on the cpu ."] * 40)
+    result = advanced_qa.process_question("what runs on the cpu", context, model_name=checkpoint, strategy="chunked")
+
+    assert 0 < len(result["alternate_answers"]) <= 2
+    assert result["answer"] not in result["alternate_answers"]
+
+
+def test_cascade_keeps_the_higher_scoring_answer(monkeypatch):
+    advanced_qa = AdvancedQA(ModelManager())
+    advanced_qa.cascade_models = ["small", "large"]
+    answers = {"small": ("small answer", 0.4), "large": ("large answer", 0.2)}
+    monkeypatch.setattr(advanced_qa, "_chunk_spans", lambda question, document, model_name: np.array([[0, 12]]))
+    monkeypatch.setattr(advanced_qa, "_answer_chunks", lambda question, document, model_name, selected=None: [
+        {"answer": answers[model_name][0], "score": answers[model_name][1], "chunk_index": 0}
+    ])
+    monkeypatch.setattr(advanced_qa, "cascade_chunks", None)
+
+    result = advanced_qa.process_question("What is it?", "Some context.", strategy="cascade")
+    assert result["answer"] == "small answer" and result["cascade_tier"] == 0
+    assert [tier["model"] for tier in result["cascade_path"]] == ["small", "large"]
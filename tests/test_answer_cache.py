@@ -0,0 +1,57 @@
+import numpy as np
+
+from src.answer_cache import AnswerCache
+
+RESULT = {"answer": "Paris", "score": np.float32(0.75), "start": 0, "end": 5}
+
+
+def test_results_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.answer_cache.time.time", lambda: now[0])
+    cache = AnswerCache(ttl_seconds=60)
+    cache.put("key", RESULT)
+
+    now[0] += 59
+    assert cache.get("key")["answer"] == "Paris"
+    now[0] += 2
+    assert cache.get("key") is None
+    assert cache.get_stats()["expired"] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    db_path = str(tmp_path / "answers.db")
+    AnswerCache(db_path=db_path).put("key", RESULT)
+
+    restarted = AnswerCache(db_path=db_path)
+    assert restarted.get("key") == {"answer": "Paris", "score": 0.75, "start": 0, "end": 5}
+    assert restarted.get_stats()["disk_hits"] == 1
+    # Served from memory the second time
+    restarted.get("key")
+    assert restarted.get_stats()["memory_hits"] == 1
+
+
+def test_disk_tier_expires_and_is_capped(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.answer_cache.time.time", lambda: now[0])
+    db_path = str(tmp_path / "answers.db")
+    cache = AnswerCache(db_path=db_path, ttl_seconds=60, max_disk_entries=2)
+    for key in ("a", "b", "c"):
+        now[0] += 1
+        cache.put(key, RESULT)
+    assert cache.get_stats()["disk_entries"] == 2
+
+    now[0] += 120
+    assert AnswerCache(db_path=db_path, ttl_seconds=60).get("c") is None
+
+
+def test_lookups_are_copies():
+    cache = AnswerCache()
+    cache.put("key", RESULT)
+    cache.get("key")["answer"] = "changed"
+    assert cache.get("key")["answer"] == "Paris"
+
+
+def test_keys_normalize_whitespace_but_keep_case():
+    key = AnswerCache.make_key("model", "chunked", "Who is  the US president?", "context")
+    assert key == AnswerCache.make_key("model", "chunked", " Who is the US president ", "context")
+    assert key != AnswerCache.make_key("model", "chunked", "Who is the us president?", "context")
@@ -0,0 +1,97 @@
+import json
+
+from src.advanced_qa import AdvancedQA
+from src.batch_qa import completed_offsets, read_requests, run_batch, truncate_partial_line
+
+
+def write_requests(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+
+def read_output(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_questions_about_one_document_share_a_batch(tmp_path, monkeypatch):
+    calls = []
+
+    def process_questions(self, questions, context, model_name="", **kwargs):
+        calls.append((list(questions), context, model_name))
+        return {"results": [{"answer": f"answer to {question}", "score": 0.5} for question in questions]}
+
+    monkeypatch.setattr(AdvancedQA, "process_questions", process_questions)
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_requests(input_path, [
+        {"question": "q1", "context": "first document"},
+        {"question": "q2", "context": "second document"},
+        {"question": "q3", "context": "first document"},
+        {"context": "first document"}
+    ])
+
+    assert run_batch(str(input_path), str(output_path), model_name="m", strategy="chunked") == 4
+    assert sorted(calls) == [(["q1", "q3"], "first document", "m"), (["q2"], "second document", "m")]
+    by_offset = {record["offset"]: record for record in read_output(output_path)}
+    assert by_offset[2]["answer"] == "answer to q3"
+    assert by_offset[3]["error"] == "Missing question"
+
+
+def test_failed_request_does_not_stop_the_run(tmp_path, monkeypatch):
+    def process_question(self, question, context, **kwargs):
+        if question == "bad":
+            raise RuntimeError("model failed")
+        return {"answer": "fine", "score": 0.5}
+
+    monkeypatch.setattr(AdvancedQA, "process_question", process_question)
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_requests(input_path, [{"question": "bad", "context": "a"}, {"question": "good", "context": "b"}])
+
+    assert run_batch(str(input_path), str(output_path), strategy="direct") == 2
+    by_offset = {record["offset"]: record for record in read_output(output_path)}
+    assert by_offset[0]["error"] == "model failed"
+    assert by_offset[1]["answer"] == "fine"
+
+
+def test_read_requests_tags_offsets(tmp_path):
+    csv_path = tmp_path / "in.csv"
+    csv_path.write_text("id,question,context\na,Who?,Ann met Bob.\nb,Where?,In Paris.\n")
+    assert [(record["offset"], record["id"]) for record in read_requests(str(csv_path))] == [(0, "a"), (1, "b")]
+
+
+def test_truncate_partial_line(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_bytes(b'{"offset": 0}\n{"offset": 1}\n{"offs')
+    truncate_partial_line(str(path))
+    assert path.read_bytes() == b'{"offset": 0}\n{"offset": 1}\n'
+
+    # Complete files and files without any newline
+    truncate_partial_line(str(path))
+    assert path.read_bytes() == b'{"offset": 0}\n{"offset": 1}\n'
+    path.write_bytes(b'{"offs')
+    truncate_partial_line(str(path))
+    assert path.read_bytes() == b""
+
+
+def test_completed_offsets_retry_errors(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text('{"offset": 0, "answer": "a"}\n{"offset": 1, "error": "No answer found"}\nnot json\n')
+    assert completed_offsets(str(path)) == {0}
+    assert completed_offsets(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_resume_answers_only_missing_requests(tmp_path, monkeypatch):
+    answered = []
+
+    def process_question(self, question, context, **kwargs):
+        answered.append(question)
+        return {"answer": question.upper(), "score": 0.5}
+
+    monkeypatch.setattr(AdvancedQA, "process_question", process_question)
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_requests(input_path, [{"question": f"q{index}", "context": f"document {index}"} for index in range(4)])
+    # An interrupted run: one answer, one failure and a partial line
+    output_path.write_text('{"offset": 0, "answer": "Q0"}\n{"offset": 1, "error": "No answer found"}\n{"offset": 2, "ans')
+
+    assert run_batch(str(input_path), str(output_path), strategy="direct", resume=True) == 3
+    assert sorted(answered) == ["q1", "q2", "q3"]
+    records = read_output(output_path)
+    assert sorted(record["offset"] for record in records if "answer" in record) == [0, 1, 2, 3]
@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from src.chunking import TextIndex
+from src.improved_utils import OffsetMap, _normalize_text, iter_sentence_groups
+
+
+def random_text(rng, sentences=30):
+    """Sentences of varied length with irregular whitespace between words."""
+    words = ["alpha", "beta", "Gamma", "x", "delta,", "(eps)"]
+    text = []
+    for _ in range(rng.randint(0, sentences)):
+        sentence = [rng.choice(words) for _ in range(rng.choice([1, 2, 3, 5, 8, 13, 40]))]
+        sentence[0] = sentence[0].capitalize()
+        text.append(rng.choice([" ", "  ", "\n", " \t "]).join(sentence) + ".")
+    return rng.choice(["", "  ", "\n"]) + rng.choice([" ", "\n\n", "   "]).join(text) + rng.choice(["", " \n"])
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_chunks_share_overlap_words(seed):
+    rng = random.Random(seed)
+    index = TextIndex(OffsetMap(random_text(rng)).text)
+    max_words, overlap = rng.randint(1, 40), rng.randint(0, 45)
+    ranges = index.chunk_word_ranges(max_words, overlap).tolist()
+
+    if index.num_words == 0:
+        assert ranges == []
+        return
+    assert ranges[0][0] == 0 and ranges[-1][1] == index.num_words
+    for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+        assert 0 < end - start <= max_words
+        # Consecutive chunks overlap by overlap words, or all but one word
+        # of the previous chunk when it is shorter
+        assert end - next_start == min(overlap, max_words - 1, end - start - 1)
+        assert next_end > end
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_sentence_groups_match_text_index(seed):
+    rng = random.Random(seed)
+    index = TextIndex(OffsetMap(random_text(rng)).text)
+    max_words, overlap = rng.randint(1, 40), rng.randint(0, 45)
+
+    expected = index.slice(index.chunk_spans(max_words, overlap))
+    assert list(iter_sentence_groups(index.slice(index.sentence_spans()), max_words, overlap)) == expected
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_spans_round_trip_to_raw_text(seed):
+    rng = random.Random(seed)
+    raw = random_text(rng)
+    offset_map = OffsetMap(raw)
+    index = TextIndex(offset_map.text)
+    spans = index.chunk_spans(rng.randint(1, 40), rng.randint(0, 45))
+
+    chunks = index.slice(spans)
+    assert chunks == [offset_map.text[start:end] for start, end in spans.tolist()]
+    assert all(chunk.split() == chunk.split(" ") for chunk in chunks)
+    if len(spans) == 0:
+        return
+
+    # Chunks map back to raw spans that clean up to the same text
+    original = offset_map.spans_to_original(spans)
+    assert original.tolist() == [list(offset_map.span_to_original(start, end)) for start, end in spans.tolist()]
+    for chunk, (start, end) in zip(chunks, original.tolist()):
+        assert _normalize_text(raw[start:end]) == chunk
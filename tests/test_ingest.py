@@ -0,0 +1,28 @@
+import io
+import os
+
+import pytest
+
+from src.improved_utils import chunk_text_by_sentences
+from src.ingest import iter_chunks, iter_text_blocks
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "sample_context.txt")
+
+
+@pytest.fixture
+def text():
+    with open(SAMPLE, encoding="utf-8") as f:
+        return f.read() + " Café au lait — naïve.  \n\n  Über alles."
+
+
+@pytest.mark.parametrize("block_size", [1 << 20, 4096, 257, 64])
+def test_streamed_chunks_match_whole_text(text, block_size):
+    streamed = list(iter_chunks(io.BytesIO(text.encode("utf-8")), 60, 10, block_size=block_size))
+    assert streamed == chunk_text_by_sentences(text, 60, 10)
+
+
+def test_blocks_decode_characters_split_across_reads():
+    data = "naïve café".encode("utf-8")
+    assert "".join(iter_text_blocks(io.BytesIO(data), block_size=3)) == "naïve café"
+    # Invalid bytes are replaced instead of raising
+    assert "".join(iter_text_blocks(io.BytesIO(b"ok \xff"), block_size=2)) == "ok �"
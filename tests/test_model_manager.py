@@ -0,0 +1,43 @@
+from src.advanced_qa import AdvancedQA
+from src.answer_cache import AnswerCache
+from src.model_manager import ModelManager
+
+MODEL = "distilbert-base-uncased-distilled-squad"
+
+
+def test_answer_cache_model_tracks_precision_and_backend(monkeypatch):
+    monkeypatch.setenv("QA_MODEL_PRECISION", "fp32")
+    assert ModelManager(backend="torch").answer_cache_model(MODEL) == f"{MODEL}@fp32"
+    assert ModelManager(backend="torch").answer_cache_model(f"{MODEL}@int8") == f"{MODEL}@int8"
+    assert ModelManager(backend="onnx").answer_cache_model(MODEL) == f"{MODEL}@fp32+onnx"
+
+    monkeypatch.setenv("QA_MODEL_PRECISION", "int8")
+    assert ModelManager(backend="torch").answer_cache_model(MODEL) == f"{MODEL}@int8"
+
+
+def test_precision_change_misses_the_answer_cache(monkeypatch):
+    monkeypatch.setenv("QA_MODEL_PRECISION", "fp32")
+    manager = ModelManager(backend="torch")
+    cache = AnswerCache()
+    advanced_qa = AdvancedQA(manager, answer_cache=cache)
+    context = "The answer is forty two."
+    key = cache.make_key(manager.answer_cache_model(MODEL), advanced_qa._cache_strategy("direct"), "What is it?", context)
+    cache.put(key, {"answer": "forty two", "score": 0.9, "start": 14, "end": 23})
+
+    assert advanced_qa.process_question("What is it?", context, model_name=MODEL, strategy="direct")["cache_hit"]
+    # The same question at another precision is answered again
+    monkeypatch.setattr(advanced_qa, "_direct_qa", lambda question, context, model_name: {"answer": "recomputed"})
+    result = advanced_qa.process_question("What is it?", context, model_name=f"{MODEL}@int8", strategy="direct")
+    assert result["answer"] == "recomputed"
+
+
+def test_cascade_starts_with_the_requested_model():
+    manager = ModelManager()
+    assert manager.get_cascade_models() == [
+        MODEL, "deepset/roberta-base-squad2", "bert-large-uncased-whole-word-masking-finetuned-squad"
+    ]
+    assert manager.get_cascade_models("deepset/roberta-base-squad2@int8") == [
+        "deepset/roberta-base-squad2@int8", "bert-large-uncased-whole-word-masking-finetuned-squad"
+    ]
+    assert manager.get_cascade_models("google/electra-small-discriminator")[0] == "google/electra-small-discriminator"
+
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from src.model_manager import ModelManager
+
+
+def test_export_matches_torch_logits(checkpoint, tmp_path):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    import torch
+    from transformers import AutoModelForQuestionAnswering, AutoTokenizer
+
+    from src.onnx_backend import OnnxQAModel, export_onnx
+
+    tokenizer = AutoTokenizer.from_pretrained(checkpoint)
+    inputs = tokenizer(
+        ["what is exported", "what runs on the cpu"],
+        ["the model is exported to onnx .", "a graph of weights runs on the cpu ."],
+        padding=True,
+        return_tensors="pt"
+    )
+    model = AutoModelForQuestionAnswering.from_pretrained(checkpoint).eval()
+    with torch.inference_mode():
+        expected = model(**inputs)
+
+    onnx_model = OnnxQAModel(export_onnx(checkpoint, "fp32", cache_dir=str(tmp_path / "onnx")))
+    start_logits, end_logits = onnx_model.run_numpy({name: values.numpy() for name, values in inputs.items()})
+
+    np.testing.assert_allclose(start_logits, expected.start_logits.numpy(), atol=1e-4)
+    np.testing.assert_allclose(end_logits, expected.end_logits.numpy(), atol=1e-4)
+
+
+def test_failed_export_falls_back_to_torch(checkpoint, monkeypatch):
+    def failing_export(*args, **kwargs):
+        raise RuntimeError("unsupported operator")
+
+    monkeypatch.setattr(ModelManager, "_load_onnx", failing_export)
+    manager = ModelManager(backend="onnx")
+    model = manager._load_weights(checkpoint, "fp32")
+
+    assert not hasattr(model, "run_numpy")
+    assert next(model.parameters()).device.type == manager.device
+
+
+def test_onnx_backend_keeps_gpu_for_torch_fallback(monkeypatch):
+    import torch
+
+    monkeypatch.setattr(torch.cuda, "is_available", lambda: True)
+    assert ModelManager(backend="onnx").device == "cuda"
@@ -0,0 +1,33 @@
+from src.retrieval import BM25Index, tokenize_terms
+
+CHUNKS = [
+    "The river flows north through the valley.",
+    "Coal mining started in the region in 1850.",
+    "The valley is known for its orchards.",
+    "Miners dug coal by hand until the railway arrived.",
+    "Orchards produce apples and pears every autumn.",
+]
+
+
+def test_tokenize_terms_drops_stopwords_and_case():
+    assert tokenize_terms("When did the Coal mining start?") == ["coal", "mining", "start"]
+
+
+def test_top_k_returns_best_chunks_in_document_order():
+    index = BM25Index(CHUNKS)
+    assert index.top_k("When did coal mining start?", 2) == [1, 3]
+    assert index.top_k("apples and pears", 1) == [4]
+
+
+def test_top_k_falls_back_when_scores_are_flat():
+    index = BM25Index(CHUNKS)
+    # No question term is in any chunk
+    assert index.top_k("What about submarines?", 2) is None
+    # Every chunk matches equally
+    assert BM25Index(["coal one", "coal two", "coal three"]).top_k("coal", 1) is None
+    # Nothing to drop
+    assert index.top_k("coal", len(CHUNKS)) is None
+
+
+def test_top_k_skips_unmatched_chunks():
+    assert BM25Index(CHUNKS).top_k("railway", 3) == [3]
@@ -0,0 +1,78 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.advanced_qa import AdvancedQA
+from src.model_manager import ModelManager
+from src.server import MicroBatcher, QAServer, ServerMetrics
+
+CONTEXT = " ".join(
+    ["the model is exported to onnx ."] * 200
+    + ["a graph of weights runs on the cpu ."] * 10
+    + ["what is the model ."] * 200
+)
+
+
+def post_answers(server, payloads):
+    async def run():
+        async with TestClient(TestServer(server.make_app())) as client:
+            responses = [await client.post("/answer", json=payload) for payload in payloads]
+            return [await response.json() for response in responses]
+    return asyncio.run(run())
+
+
+def test_served_requests_use_retrieval(checkpoint):
+    advanced_qa = AdvancedQA(ModelManager(), retrieval_top_k=1)
+    server = QAServer(advanced_qa, default_model=checkpoint)
+    served, = post_answers(server, [{"question": "what runs on the cpu", "context": CONTEXT, "model": checkpoint}])
+
+    expected = advanced_qa.process_question("what runs on the cpu", CONTEXT, model_name=checkpoint, strategy="chunked")
+    assert served["chunks_processed"] == 1
+    assert (served["answer"], served["start"], served["end"]) == (expected["answer"], expected["start"], expected["end"])
+
+
+class EchoEngine:
+    """Answers every chunk with its own text and records batch sizes."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def answer_batch(self, requests):
+        self.batch_sizes.append(len(requests))
+        return [[{"answer": chunks[0], "score": 1.0}] for _, chunks, _ in requests]
+
+
+def submit(batcher, chunks):
+    return batcher.try_submit("question", chunks, [None] * len(chunks))
+
+
+def test_batcher_rejects_requests_beyond_the_queue():
+    async def run():
+        batcher = MicroBatcher("model", EchoEngine(), ServerMetrics(), max_queue=4)
+        assert submit(batcher, ["a", "b", "c"]) is not None
+        assert submit(batcher, ["d", "e"]) is None
+        assert submit(batcher, ["d"]) is not None
+        assert batcher.pending == 4
+
+        # A document larger than the queue still gets in when it is empty
+        empty = MicroBatcher("model", EchoEngine(), ServerMetrics(), max_queue=4)
+        assert len(submit(empty, list("abcdefgh"))) == 8
+        assert submit(empty, ["i"]) is None
+    asyncio.run(run())
+
+
+def test_batcher_answers_in_micro_batches():
+    async def run():
+        engine = EchoEngine()
+        metrics = ServerMetrics()
+        batcher = MicroBatcher("model", engine, metrics, max_batch_size=4, max_wait_ms=50, max_queue=16)
+        futures = submit(batcher, list("abcdef"))
+        batcher.start()
+        answers = await asyncio.gather(*futures)
+        await batcher.stop()
+        return engine, metrics, batcher, answers
+
+    engine, metrics, batcher, answers = asyncio.run(run())
+    assert [answer["answer"] for answer in answers] == list("abcdef")
+    assert engine.batch_sizes == [4, 2]
+    assert (metrics.batches, metrics.batch_items, batcher.pending) == (2, 6, 0)
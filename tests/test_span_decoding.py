@@ -0,0 +1,157 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from src.span_decoding import decode_windows, dedupe_spans, log_partition, top_k_answers
+
+
+def brute_force_spans(start_logits, end_logits, context_mask, cls_mask, max_answer_len, top_k):
+    """Score every (start, end) pair of one window the way the pipeline does."""
+    allowed = context_mask | cls_mask
+    start = np.where(allowed, start_logits, -10000.0).astype(np.float64)
+    end = np.where(allowed, end_logits, -10000.0).astype(np.float64)
+    start_probs = np.exp(start - start.max()) / np.exp(start - start.max()).sum()
+    end_probs = np.exp(end - end.max()) / np.exp(end - end.max()).sum()
+    spans = [
+        (start_probs[s] * end_probs[e], s, e)
+        for s, e in itertools.product(range(len(start)), repeat=2)
+        if context_mask[s] and context_mask[e] and s <= e < s + max_answer_len
+    ]
+    return sorted(spans, key=lambda span: -span[0])[:top_k]
+
+
+def random_windows(seed, windows=4, tokens=24):
+    rng = np.random.default_rng(seed)
+    start_logits = rng.normal(size=(windows, tokens)).astype(np.float32) * 3
+    end_logits = rng.normal(size=(windows, tokens)).astype(np.float32) * 3
+    context_mask = np.zeros((windows, tokens), dtype=bool)
+    for row in range(windows):
+        context_start = rng.integers(2, 8)
+        context_mask[row, context_start:rng.integers(context_start + 1, tokens)] = True
+    cls_mask = np.zeros((windows, tokens), dtype=bool)
+    cls_mask[:, 0] = True
+    return start_logits, end_logits, context_mask, cls_mask
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("max_answer_len,top_k", [(1, 1), (4, 3), (15, 5), (40, 10)])
+def test_decode_windows_matches_brute_force(seed, max_answer_len, top_k):
+    start_logits, end_logits, context_mask, cls_mask = random_windows(seed)
+    decoded = decode_windows(start_logits, end_logits, context_mask, cls_mask, max_answer_len, top_k)
+
+    for row in range(len(start_logits)):
+        expected = brute_force_spans(start_logits[row], end_logits[row], context_mask[row], cls_mask[row], max_answer_len, top_k)
+        valid = np.isfinite(decoded.span_logits[row])
+        assert valid.sum() == len(expected)
+        np.testing.assert_allclose(decoded.scores[row][valid], [score for score, _, _ in expected], rtol=1e-6)
+        assert list(zip(decoded.starts[row][valid].tolist(), decoded.ends[row][valid].tolist())) == [
+            (s, e) for _, s, e in expected
+        ]
+
+
+def brute_force_dedupe(starts, ends, limit=None, groups=None):
+    """Greedy pick of non-overlapping spans, comparing every pair."""
+    groups = [0] * len(starts) if groups is None else groups
+    picked = []
+    for index in range(len(starts)):
+        if limit is not None and len(picked) >= limit:
+            break
+        span = (starts[index], max(ends[index], starts[index] + 1))
+        if all(
+            groups[index] != groups[other] or span[1] <= starts[other] or max(ends[other], starts[other] + 1) <= span[0]
+            for other in picked
+        ):
+            picked.append(index)
+    return picked
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("limit", [None, 1, 3])
+def test_dedupe_spans_matches_brute_force(seed, limit):
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, 50, size=30)
+    ends = starts + rng.integers(0, 8, size=30)
+    groups = rng.integers(0, 3, size=30)
+
+    assert dedupe_spans(starts, ends, limit).tolist() == brute_force_dedupe(starts.tolist(), ends.tolist(), limit)
+    assert dedupe_spans(starts, ends, limit, groups).tolist() == brute_force_dedupe(
+        starts.tolist(), ends.tolist(), limit, groups.tolist()
+    )
+
+
+def chunk_results(start_logits, end_logits, context_mask, cls_mask, top_k=3):
+    """Chunk results shaped like BatchedChunkEngine's, one chunk per window."""
+    decoded = decode_windows(start_logits, end_logits, context_mask, cls_mask, 15, top_k)
+    results = []
+    for row in range(len(start_logits)):
+        offset = row * 1000  # Spans of different chunks never overlap
+        candidates = [
+            {"score": score, "start": offset + start, "end": offset + end + 1, "answer": f"{row}:{start}-{end}", "span_logit": logit}
+            for start, end, logit, score in zip(
+                decoded.starts[row].tolist(),
+                decoded.ends[row].tolist(),
+                decoded.span_logits[row].tolist(),
+                decoded.scores[row].tolist()
+            )
+            if np.isfinite(logit)
+        ]
+        results.append({
+            **candidates[0],
+            "chunk_index": row,
+            "candidates": candidates,
+            "start_lse": float(decoded.start_lse[row]),
+            "end_lse": float(decoded.end_lse[row])
+        })
+    return results
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_top_k_answers_orders_by_shared_normalization(seed):
+    start_logits, end_logits, context_mask, cls_mask = random_windows(seed, windows=6)
+    results = chunk_results(start_logits, end_logits, context_mask, cls_mask)
+    ranked = top_k_answers(results, top_k=4)
+
+    # Reference: every span of every window against the summed partitions
+    start_lse, end_lse = log_partition(results)
+    expected = []
+    for row in range(len(start_logits)):
+        for score, s, e in brute_force_spans(start_logits[row], end_logits[row], context_mask[row], cls_mask[row], 15, 3):
+            logit = float(start_logits[row][s]) + float(end_logits[row][e])
+            expected.append((np.exp(logit - start_lse - end_lse), score, f"{row}:{s}-{e}", row * 1000 + s, row * 1000 + e + 1))
+    expected.sort(key=lambda span: -span[0])
+    # Overlapping spans of a chunk count once
+    expected = [expected[index] for index in brute_force_dedupe([span[3] for span in expected], [span[4] for span in expected])]
+
+    assert [answer["answer"] for answer in ranked] == [span[2] for span in expected[:4]]
+    np.testing.assert_allclose([answer["doc_score"] for answer in ranked], [span[0] for span in expected[:4]], rtol=1e-6)
+    np.testing.assert_allclose([answer["score"] for answer in ranked], [span[1] for span in expected[:4]], rtol=1e-6)
+
+
+@pytest.mark.parametrize("windows", [1, 4, 16])
+def test_top_k_answers_keeps_window_confidence(windows):
+    # The same confident span in every window
+    start_logits = np.zeros((windows, 20), dtype=np.float32)
+    end_logits = np.zeros((windows, 20), dtype=np.float32)
+    start_logits[:, 5] = end_logits[:, 7] = 6.0
+    context_mask = np.zeros((windows, 20), dtype=bool)
+    context_mask[:, 3:19] = True
+    cls_mask = np.zeros((windows, 20), dtype=bool)
+    cls_mask[:, 0] = True
+
+    results = chunk_results(start_logits, end_logits, context_mask, cls_mask)
+    best = top_k_answers(results, top_k=1)[0]
+
+    assert best["score"] == pytest.approx(results[0]["score"])
+    assert best["score"] > 0.5
+    assert best["doc_score"] == pytest.approx(best["score"] / windows ** 2, rel=1e-6)
+
+
+def test_top_k_answers_takes_answers_without_candidates():
+    start_logits, end_logits, context_mask, cls_mask = random_windows(0, windows=3)
+    results = chunk_results(start_logits, end_logits, context_mask, cls_mask)
+    for result in results:
+        del result["candidates"]
+
+    ranked = top_k_answers(results, top_k=3)
+    assert sorted(answer["answer"] for answer in ranked) == sorted(result["answer"] for result in results)
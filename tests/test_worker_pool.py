@@ -0,0 +1,49 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from src.model_manager import ModelManager
+from src.worker_pool import InferencePool, PooledEngine, load_shared_model, shared_weights_path
+
+
+def test_concurrent_prepare_weights_writes_once(checkpoint, tmp_path):
+    shared_dir = tmp_path / "shared"
+    pool = InferencePool(ModelManager(), num_workers=1, shared_dir=str(shared_dir))
+    paths = []
+    threads = [threading.Thread(target=lambda: paths.append(pool.prepare_weights(checkpoint))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(paths)) == 1 and os.path.exists(paths[0])
+    # No temporary files are left next to the weights
+    assert os.listdir(shared_dir) == [os.path.basename(paths[0])]
+    load_shared_model(checkpoint, paths[0])
+
+
+def test_fp16_is_shared_as_fp32(tmp_path):
+    assert shared_weights_path("some/model@fp16", str(tmp_path)) == shared_weights_path("some/model@fp32", str(tmp_path))
+
+
+class StalledPool:
+    """A pool whose tasks never finish."""
+
+    num_workers = 4
+    task_timeout = 0.3
+
+    def submit(self, model_spec, requests):
+        return Future()
+
+
+def test_answer_batch_waits_for_one_deadline():
+    engine = PooledEngine(StalledPool(), "some/model", tokenizer=None)
+    requests = [("question", [f"chunk {index}"], [None]) for index in range(4)]
+
+    started = time.monotonic()
+    with pytest.raises(RuntimeError):
+        engine.answer_batch(requests)
+    assert time.monotonic() - started < 2 * StalledPool.task_timeout